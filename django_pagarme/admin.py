@@ -1,25 +1,163 @@
-from django.contrib import admin
+from datetime import datetime, time
+
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 
+from django_pagarme import facade
 from django_pagarme.models import (
-    PagarmeFormConfig, PagarmeItemConfig, PagarmeNotification, PagarmePayment, UserPaymentProfile, Plan, Subscription, SubscriptionNotification
+    PagarmeFormConfig, PagarmeItemConfig, PagarmeNotification, PagarmePayment, UserPaymentProfile, Plan, Subscription,
+    SubscriptionNotification, last_subscription_status_subquery, DailyStatusAggregate, ContactInfoEvent,
 )
+from django_pagarme.urls_cache import cached_reverse
+
+
+def _parse_day(value: str):
+    day = parse_date(value)
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _streaming_export(lines, file_name: str, export_format: str) -> StreamingHttpResponse:
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{file_name}.{export_format}"'
+    return response
+
+
+def export_payments_csv(modeladmin, request, queryset):
+    return _streaming_export(facade.export_payments(queryset, 'csv'), 'pagamentos', 'csv')
+
+
+export_payments_csv.short_description = 'Exportar pagamentos selecionados (CSV)'
+
+
+def export_payments_jsonl(modeladmin, request, queryset):
+    return _streaming_export(facade.export_payments(queryset, 'jsonl'), 'pagamentos', 'jsonl')
+
+
+export_payments_jsonl.short_description = 'Exportar pagamentos selecionados (JSON Lines)'
+
+
+def _confirm_action(modeladmin, request, queryset, action: str, title: str):
+    """
+    Intermediate page listing selected payments and their total amount, so gateway operations only happen after user
+    confirms them. Returns None once confirmed
+    """
+    if request.POST.get('post') == 'yes':
+        return None
+    queryset = queryset.select_related('user')
+    ctx = {
+        **modeladmin.admin_site.each_context(request),
+        'opts': modeladmin.model._meta,
+        'title': title,
+        'action': action,
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        'payments': queryset,
+        'total_amount': queryset.aggregate(total=Sum('amount'))['total'] or 0,
+    }
+    return TemplateResponse(request, 'admin/django_pagarme/pagarmepayment/confirm_action.html', ctx)
+
+
+def capture_payments(modeladmin, request, queryset):
+    confirmation = _confirm_action(modeladmin, request, queryset, 'capture_payments', 'Confirmar captura')
+    if confirmation is not None:
+        return confirmation
+    tokens_by_account = {}
+    for account, token in queryset.values_list('account', 'transaction_id'):
+        tokens_by_account.setdefault(account, []).append(token)
+    results = {}
+    for account, tokens in tokens_by_account.items():
+        results.update(facade.capture_many(tokens, account=account))
+    errors = {token: result for token, result in results.items() if isinstance(result, Exception)}
+    modeladmin.message_user(request, f'{len(results) - len(errors)} pagamento(s) processado(s)', messages.SUCCESS)
+    for token, error in errors.items():
+        modeladmin.message_user(request, f'Erro ao capturar transação {token}: {error!r}', messages.ERROR)
+
+
+capture_payments.short_description = 'Capturar pagamentos autorizados selecionados'
+capture_payments.allowed_permissions = ('change',)
+
+
+def refund_payments(modeladmin, request, queryset):
+    confirmation = _confirm_action(modeladmin, request, queryset, 'refund_payments', 'Confirmar estorno')
+    if confirmation is not None:
+        return confirmation
+    transactions_ids = queryset.values_list('transaction_id', flat=True)
+    results = facade.refund_many(transactions_ids)
+    errors = {transaction_id: result for transaction_id, result in results.items() if isinstance(result, Exception)}
+    modeladmin.message_user(request, f'{len(results) - len(errors)} estorno(s) solicitado(s)', messages.SUCCESS)
+    for transaction_id, error in errors.items():
+        modeladmin.message_user(request, f'Erro ao estornar transação {transaction_id}: {error!r}', messages.ERROR)
+
+
+refund_payments.short_description = 'Estornar pagamentos selecionados'
+refund_payments.allowed_permissions = ('refund',)
+
+
+def export_notifications_csv(modeladmin, request, queryset):
+    return _streaming_export(facade.export_notifications(queryset, 'csv'), 'notificacoes', 'csv')
+
+
+export_notifications_csv.short_description = 'Exportar notificações selecionadas (CSV)'
+
+
+def export_notifications_jsonl(modeladmin, request, queryset):
+    return _streaming_export(facade.export_notifications(queryset, 'jsonl'), 'notificacoes', 'jsonl')
+
+
+export_notifications_jsonl.short_description = 'Exportar notificações selecionadas (JSON Lines)'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using Postgres planner estimate as count for unfiltered big tables, avoiding a full COUNT(*).
+    Filtered querysets, small tables and other databases fall back to regular count
+    """
+    exact_count_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor == 'postgresql' and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [query.model._meta.db_table])
+                row = cursor.fetchone()
+            if row is not None and row[0] > self.exact_count_threshold:
+                return int(row[0])
+        return super().count
 
 
 @admin.register(PagarmeItemConfig)
 class PagarmeItemConfigAdmin(admin.ModelAdmin):
     list_display = (
-        'name', 'slug', 'price', 'tangible', 'default_config', 'contact_form', 'checkout', 'available_until')
-    list_filter = ('default_config',)
+        'name', 'slug', 'price', 'tangible', 'default_config', 'contact_form', 'checkout', 'available_until', 'account'
+    )
+    list_filter = ('default_config', 'account')
+    list_select_related = ('default_config',)
     prepopulated_fields = {'slug': ('name',)}
 
     def contact_form(self, pagarme_item_config: PagarmeItemConfig):
-        return mark_safe(f'<a href="{pagarme_item_config.get_absolute_url()}">Contact Form</a>')
+        url = cached_reverse('django_pagarme:contact_info', slug=pagarme_item_config.slug)
+        return mark_safe(f'<a href="{url}">Contact Form</a>')
 
     contact_form.short_description = 'contact form'
 
     def checkout(self, pagarme_item_config: PagarmeItemConfig):
-        return mark_safe(f'<a href="{pagarme_item_config.get_checkout_url()}">Checkout</a>')
+        url = cached_reverse('django_pagarme:pagarme', slug=pagarme_item_config.slug)
+        return mark_safe(f'<a href="{url}">Checkout</a>')
 
     checkout.short_description = 'checkout'
 
@@ -43,20 +181,59 @@ class PagarmePaymentAdmin(admin.ModelAdmin):
         'card_id',
         'card_last_digits',
         'boleto_url',
-        'installments'
+        'installments',
+        'account',
     )
     list_filter = ('payment_method', 'items')
+    list_select_related = ('user',)
     readonly_fields = list_display
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/django_pagarme/pagarmepayment/change_list.html'
+    actions = [capture_payments, refund_payments, export_payments_csv, export_payments_jsonl]
 
     def has_add_permission(self, request):
         return False
 
+    def has_refund_permission(self, request):
+        return request.user.has_perm(f'{self.opts.app_label}.refund_pagarmepayment')
+
+    def get_urls(self):
+        report_url = path(
+            'revenue_report/',
+            self.admin_site.admin_view(self.revenue_report_view),
+            name='django_pagarme_pagarmepayment_revenue_report'
+        )
+        return [report_url] + super().get_urls()
+
+    def revenue_report_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        group_by = [group for group in request.GET.getlist('group_by') if group in facade.REPORT_GROUPS] or ['status']
+        start = _parse_day(request.GET.get('start', ''))
+        end = _parse_day(request.GET.get('end', ''))
+        ctx = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Relatório de Faturamento',
+            'all_groups': list(facade.REPORT_GROUPS),
+            'group_by': group_by,
+            'start': start,
+            'end': end,
+            'rows': facade.revenue_report(group_by, start, end),
+        }
+        return TemplateResponse(request, 'admin/django_pagarme/pagarmepayment/revenue_report.html', ctx)
+
 
 @admin.register(PagarmeNotification)
 class PagarmeNotificationAdmin(admin.ModelAdmin):
     list_display = ('payment', 'status', 'creation')
+    list_select_related = ('payment',)
     search_fields = ('payment__transaction_id__exact',)
-    ordering = ('payment', '-creation')
+    ordering = ('-creation',)  # matches notification_payment_creation index
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [export_notifications_csv, export_notifications_jsonl]
 
     def has_delete_permission(self, request, obj=None):
         return False
@@ -71,6 +248,7 @@ class PagarmeNotificationAdmin(admin.ModelAdmin):
 @admin.register(UserPaymentProfile)
 class UserPaymentProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'name', 'email', 'phone')
+    list_select_related = ('user',)
     search_fields = ('email', 'user__email')
     autocomplete_fields = ['user']
 
@@ -90,6 +268,7 @@ class PlanAdmin(admin.ModelAdmin):
         'invoice_reminder',
         'pagarme_id',
         'payment_methods',
+        'account',
     )
 
     def has_add_permission(self, *args, **kwargs):
@@ -109,6 +288,10 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'card_last_digits',
         'status',
     )
+    list_select_related = ('user', 'plan')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(last_status=last_subscription_status_subquery())
 
     def has_add_permission(self, *args, **kwargs):
         return False
@@ -123,5 +306,50 @@ class SubscriptionAdmin(admin.ModelAdmin):
 @admin.register(SubscriptionNotification)
 class SubscriptionNotificationAdmin(admin.ModelAdmin):
     list_display = ('subscription', 'status', 'creation')
+    list_select_related = ('subscription',)
     search_fields = ('subscription__pagarme_id__exact',)
-    ordering = ('subscription', '-creation')
+    ordering = ('-creation',)  # matches notification_subscrip_creation index
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(DailyStatusAggregate)
+class DailyStatusAggregateAdmin(admin.ModelAdmin):
+    list_display = ('day', 'kind', 'item_slug', 'plan_slug', 'payment_method', 'status', 'count', 'amount')
+    list_filter = ('kind', 'status', 'payment_method')
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ContactInfoEvent)
+class ContactInfoEventAdmin(admin.ModelAdmin):
+    list_display = ('email', 'name', 'phone', 'payment_item_slug', 'creation', 'delivered_at', 'attempts')
+    list_filter = ('payment_item_slug',)
+    search_fields = ('email',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = dict(extra_context or {}, title=self._metrics_title())
+        return super().changelist_view(request, extra_context)
+
+    def _metrics_title(self):
+        metrics = facade.contact_info_metrics()
+        return (
+            f'Eventos de Contato: {metrics["queue_depth"]} pendentes, {metrics["failed"]} com falha, '
+            f'latência média de entrega {metrics["average_latency_seconds"]:.1f}s na última hora'
+        )
@@ -5,3 +5,19 @@ class DjangoPagarmeConfig(AppConfig):
     name = 'django_pagarme'
     verbose_name = "Dados do Pagarme"
     default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from django_pagarme.phone import preload_metadata
+        preload_metadata()
+        _register_baker_generators()
+
+
+def _register_baker_generators():
+    """
+    model_bakery doesn't know CachedPhoneNumberField, so a generator is registered for projects using it on tests
+    """
+    try:
+        from model_bakery import baker
+    except ImportError:
+        return
+    baker.generators.add('django_pagarme.models.CachedPhoneNumberField', lambda: '+5512999999999')
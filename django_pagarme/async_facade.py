@@ -0,0 +1,262 @@
+"""
+Async versions of facade functions, to be used on ASGI views and async services.
+Every public facade function touching database or Pagarme has an "a" prefixed equivalent here, raising the same
+exceptions. Functions only registering listeners or strategies (add_*, set_*) don't do I/O and must be called
+from facade itself.
+Pagarme gateway calls are done by async clients (gateway.get_async_client), so many calls can be in flight at the same
+time without blocking the event loop nor holding threads. Without httpx installed, they fall back to a thread pool.
+Database work runs through Django's thread sensitive sync_to_async, reusing the same logic of synchronous facade.
+"""
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List
+
+from asgiref.sync import sync_to_async
+from django.db.models import QuerySet
+
+from django_pagarme import facade
+from django_pagarme.gateway import DEFAULT_ACCOUNT, get_async_client, list_accounts
+from django_pagarme.models import (
+    CatalogVersion, DailyStatusAggregate, PagarmeItemConfig, PagarmeNotification, PagarmePayment, Plan, Subscription,
+    SubscriptionNotification, UserPaymentProfile,
+)
+
+PLANS_PAGE_SIZE = 100
+PLANS_CONCURRENT_PAGES = 5
+
+
+async def _iterate(lines: Iterator[str]) -> AsyncIterator[str]:
+    next_line = sync_to_async(next)
+    while True:
+        line = await next_line(lines, None)
+        if line is None:
+            return
+        yield line
+
+
+async def aget_payment_item(slug: str) -> PagarmeItemConfig:
+    return await sync_to_async(facade.get_payment_item)(slug)
+
+
+async def alist_payment_item_configs() -> List[PagarmeItemConfig]:
+    return await sync_to_async(facade.list_payment_item_configs)()
+
+
+async def afind_payment_item_config(slug: str) -> PagarmeItemConfig:
+    return await sync_to_async(facade.find_payment_item_config)(slug)
+
+
+async def aget_cached_payment_item(slug: str) -> PagarmeItemConfig:
+    return await sync_to_async(facade.get_cached_payment_item)(slug)
+
+
+async def ais_payment_config_item_available(payment_item_config: PagarmeItemConfig, request) -> bool:
+    # strategy is looked up on call, so one set by facade.set_available_payment_config_item_strategy is honored
+    return await sync_to_async(facade.is_payment_config_item_available)(payment_item_config, request)
+
+
+async def afind_account(slug: str) -> str:
+    return await sync_to_async(facade.find_account)(slug)
+
+
+async def acapture(token: str, django_user_id=None, account: str = DEFAULT_ACCOUNT) -> PagarmePayment:
+    client = get_async_client(account)
+    pagarme_transaction = await client.find_transaction(token)
+    payment, must_capture = await sync_to_async(facade._prepare_capture)(
+        token, pagarme_transaction, django_user_id, account
+    )
+    if not must_capture:
+        return payment
+    captured_transaction = await client.capture_transaction(token, {'amount': payment.amount})
+    return await sync_to_async(facade._finish_capture)(payment, captured_transaction)
+
+
+async def acapture_many(tokens: Iterable[str], max_workers: int = facade.CAPTURE_MANY_MAX_WORKERS,
+                        account: str = DEFAULT_ACCOUNT) -> Dict[str, object]:
+    return await sync_to_async(facade.capture_many)(tokens, max_workers, account)
+
+
+async def arefund(transaction_id: str, bank_account: dict = None) -> PagarmePayment:
+    return await sync_to_async(facade.refund)(transaction_id, bank_account)
+
+
+async def arefund_many(transactions_ids: Iterable[str], max_workers: int = facade.REFUND_MANY_MAX_WORKERS,
+                       bank_account: dict = None) -> Dict[str, object]:
+    return await sync_to_async(facade.refund_many)(transactions_ids, max_workers, bank_account)
+
+
+def arefund_payments(payments: QuerySet = None, batch_size: int = 100,
+                     max_workers: int = facade.REFUND_MANY_MAX_WORKERS) -> AsyncIterator[Dict[str, object]]:
+    """
+    Async iterator version of facade.refund_payments, yielding refund_many results for each batch
+    """
+    return _iterate(facade.refund_payments(payments, batch_size, max_workers))
+
+
+async def aone_click_buy(payment_item_config_slug: str, user, async_capture: bool = None) -> dict:
+    user_id = await sync_to_async(facade._to_user_id)(user)
+    item, payment_data = await sync_to_async(facade._one_click_payment_data)(
+        payment_item_config_slug, user_id, async_capture
+    )
+    pagarme_transaction = await get_async_client(item.account).create_transaction(payment_data)
+    await sync_to_async(facade._save_one_click_payment)(pagarme_transaction, payment_data, item, user_id)
+    return pagarme_transaction
+
+
+async def ahandle_notification(transaction_id: str, current_status: str, raw_body: str, expected_signature: str,
+                               pagarme_notification_dict, account: str = DEFAULT_ACCOUNT) -> PagarmeNotification:
+    return await sync_to_async(facade.handle_notification)(
+        transaction_id, current_status, raw_body, expected_signature, pagarme_notification_dict, account
+    )
+
+
+async def afind_payment_by_transaction(transaction_id: str) -> PagarmePayment:
+    return await sync_to_async(facade.find_payment_by_transaction)(transaction_id)
+
+
+async def afind_payment(payment_id: int) -> PagarmePayment:
+    return await sync_to_async(facade.find_payment)(payment_id)
+
+
+async def alist_user_payments(django_user_or_id, before_id: int = None, limit: int = 20) -> List[PagarmePayment]:
+    return await sync_to_async(facade.list_user_payments)(django_user_or_id, before_id, limit)
+
+
+async def avalidate_and_inform_contact_info(name, email, phone, payment_item_slug, user=None) -> dict:
+    return await sync_to_async(facade.validate_and_inform_contact_info)(name, email, phone, payment_item_slug, user)
+
+
+async def adeliver_contact_info_events(batch_size: int = 100) -> int:
+    return await sync_to_async(facade.deliver_contact_info_events)(batch_size)
+
+
+async def apurge_contact_info_events(retention_days: int = None) -> int:
+    return await sync_to_async(facade.purge_contact_info_events)(retention_days)
+
+
+async def acontact_info_metrics(since: datetime = None) -> dict:
+    return await sync_to_async(facade.contact_info_metrics)(since)
+
+
+async def aget_user_payment_profile(django_user_or_id) -> UserPaymentProfile:
+    return await sync_to_async(facade.get_user_payment_profile)(django_user_or_id)
+
+
+async def aget_user_checkout_profile(django_user_or_id) -> dict:
+    return await sync_to_async(facade.get_user_checkout_profile)(django_user_or_id)
+
+
+async def _fetch_plans_page(account: str, page: int, page_size: int) -> list:
+    return await get_async_client(account).find_plans({'page': page, 'count': page_size})
+
+
+async def asynchronize_plans(page_size: int = PLANS_PAGE_SIZE, concurrent_pages: int = PLANS_CONCURRENT_PAGES,
+                             account: str = None):
+    """
+    Same as facade.synchronize_plans, but fetching plans pages from Pagarme concurrently.
+    Pages are requested in rounds of concurrent_pages until a page not full is returned.
+    :param page_size: plans per page
+    :param concurrent_pages: number of pages requested at same time
+    :param account: Pagarme account to be synchronized, all configured accounts if None
+    """
+    accounts = list_accounts() if account is None else [account]
+    await asyncio.gather(*(_synchronize_account_plans(account, page_size, concurrent_pages) for account in accounts))
+
+
+async def _synchronize_account_plans(account: str, page_size: int, concurrent_pages: int):
+    plans_to_sync = []
+    first_page = 1
+    while True:
+        pages = await asyncio.gather(
+            *(_fetch_plans_page(account, page, page_size) for page in range(first_page, first_page + concurrent_pages))
+        )
+        for plans_page in pages:
+            plans_to_sync.extend(plans_page)
+        if any(len(plans_page) < page_size for plans_page in pages):
+            break
+        first_page += concurrent_pages
+    await sync_to_async(facade._synchronize_plans)(plans_to_sync, account)
+
+
+async def alist_plans() -> List[Plan]:
+    return await sync_to_async(facade.list_plans)()
+
+
+async def aget_plan(slug: str) -> Plan:
+    return await sync_to_async(facade.get_plan)(slug)
+
+
+async def aget_catalog_version() -> CatalogVersion:
+    return await sync_to_async(facade.get_catalog_version)()
+
+
+async def aget_catalog() -> dict:
+    return await sync_to_async(facade.get_catalog)()
+
+
+async def aget_catalog_etag() -> str:
+    return await sync_to_async(facade.get_catalog_etag)()
+
+
+async def aget_catalog_last_modified() -> datetime:
+    return await sync_to_async(facade.get_catalog_last_modified)()
+
+
+async def aget_catalog_item(slug: str) -> dict:
+    return await sync_to_async(facade.get_catalog_item)(slug)
+
+
+async def aget_catalog_plan(slug: str) -> dict:
+    return await sync_to_async(facade.get_catalog_plan)(slug)
+
+
+async def acreate_subscription(plan: Plan, checkout_payload: dict, django_user_id=None) -> PagarmePayment:
+    subscription_data = facade._subscription_request_data(plan, checkout_payload)
+    pagarme_subscription = await get_async_client(plan.account).create_subscription(subscription_data)
+    return await sync_to_async(facade._save_subscription)(plan, pagarme_subscription, django_user_id)
+
+
+async def afind_subscription_by_id(subscription_id: str) -> Subscription:
+    return await sync_to_async(facade.find_subscription_by_id)(subscription_id)
+
+
+async def ahandle_subscription_notification(
+        subscription_id: str, current_status: str, raw_body: str,
+        expected_signature: str, pagarme_notification_dict, account: str = DEFAULT_ACCOUNT,
+) -> SubscriptionNotification:
+    return await sync_to_async(facade.handle_subscription_notification)(
+        subscription_id, current_status, raw_body, expected_signature, pagarme_notification_dict, account
+    )
+
+
+async def arevenue_report(group_by: Iterable[str] = ('status',), start: datetime = None, end: datetime = None,
+                          statuses: Iterable[str] = None) -> List[dict]:
+    return await sync_to_async(facade.revenue_report)(group_by, start, end, statuses)
+
+
+def aexport_payments(payments: QuerySet = None, export_format: str = 'csv',
+                     chunk_size: int = 2000) -> AsyncIterator[str]:
+    """
+    Async iterator version of facade.export_payments, suitable for StreamingHttpResponse under ASGI
+    """
+    return _iterate(facade.export_payments(payments, export_format, chunk_size))
+
+
+def aexport_notifications(notifications: QuerySet = None, export_format: str = 'csv', chunk_size: int = 2000,
+                          include_archived: bool = False) -> AsyncIterator[str]:
+    """
+    Async iterator version of facade.export_notifications, suitable for StreamingHttpResponse under ASGI
+    """
+    return _iterate(facade.export_notifications(notifications, export_format, chunk_size, include_archived))
+
+
+async def alist_daily_aggregates(start=None, end=None, kind: str = None) -> List[DailyStatusAggregate]:
+    return await sync_to_async(facade.list_daily_aggregates)(start, end, kind)
+
+
+async def arebuild_daily_aggregates(batch_size: int = 10000) -> None:
+    await sync_to_async(facade.rebuild_daily_aggregates)(batch_size)
+
+
+async def aarchive_notifications(days: int, batch_size: int = 1000) -> int:
+    return await sync_to_async(facade.archive_notifications)(days, batch_size)
@@ -0,0 +1,28 @@
+"""
+Same urls from django_pagarme.urls, but using async views on capture, one click, notification and subscribe.
+Suitable for projects running under ASGI. Ex: path('checkout/', include('django_pagarme.async_urls'))
+"""
+from django.urls import path
+
+from django_pagarme import views
+
+app_name = 'django_pagarme'
+urlpatterns = [
+    path('capture/<slug:slug>/<str:token>', views.capture_async, name='capture'),
+    path('obrigado/<slug:slug>', views.thanks, name='thanks'),
+    path('indisponivel/<slug:slug>', views.unavailable, name='unavailable'),
+    path('one_click/<slug:slug>', views.one_click_async, name='one_click'),
+    path('notification/<slug:slug>', views.notification_async, name='notification'),
+    path('pagarme/<slug:slug>', views.pagarme, name='pagarme'),
+    path('api/catalogo', views.catalog, name='catalog'),
+    path('api/catalogo/itens/<slug:slug>', views.catalog_item, name='catalog_item'),
+    path('api/catalogo/planos/<slug:slug>', views.catalog_plan, name='catalog_plan'),
+    path('<slug:slug>', views.contact_info, name='contact_info'),
+    path('subscription/<slug:slug>', views.subscription, name='subscription'),
+    path('subscribe/<slug:slug>', views.subscribe_async, name='subscribe'),
+    path(
+        'subscription_payment_bank_slip/<int:transaction_id>',
+        views.subscription_payment_bank_slip,
+        name='subscription_payment_bank_slip'
+    ),
+]
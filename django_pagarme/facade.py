@@ -1,18 +1,37 @@
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import chain
 from logging import Logger
-from typing import Callable, List
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction as django_transaction
-from django.urls import reverse
-from pagarme import postback, transaction, authentication_key, plan, subscription
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction as django_transaction
+from django.db.models import (
+    Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, OuterRef, Q, QuerySet, Subquery, Sum,
+)
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 
-from django_pagarme.forms import ContactForm
+from django_pagarme.gateway import DEFAULT_ACCOUNT, encryption_key, get_client, list_accounts
 from django_pagarme.models import (
     AUTHORIZED, BOLETO, CREDIT_CARD, PAID, PENDING_REFUND, PROCESSING, PagarmeItemConfig, PagarmeNotification,
     PagarmePayment, PaymentViolation, REFUNDED, REFUSED, UserPaymentProfile, WAITING_PAYMENT, PagarmePaymentItem,
     Plan, Subscription, SubscriptionNotification, PENDING_PAYMENT, TRIALING, ENDED, CANCELED, UNPAID,
+    payment_profile_cache_key, last_payment_status_subquery,
+    first_payment_notification_subquery, DailyStatusAggregate, PAYMENT_AGGREGATE, SUBSCRIPTION_AGGREGATE,
+    ArchivedPagarmeNotification, ArchivedSubscriptionNotification, ContactInfoEvent, CatalogVersion, catalog_cache_key,
+    catalog_expirations_cache_key, payment_item_cache_key,
 )
+from django_pagarme.urls_cache import cached_reverse, postback_url
+
+if TYPE_CHECKING:
+    from django_pagarme.forms import ContactForm
 
 # It's here to be available on facade contract
 UserPaymentProfileDoesNotExist = UserPaymentProfile.DoesNotExist
@@ -41,7 +60,36 @@ __all__ = [
     'CREDIT_CARD',
 ]
 
-authentication_key(settings.CHAVE_PAGARME_API_PRIVADA)
+
+def __getattr__(name):
+    # ContactForm is kept on facade contract, but forms are only imported when contact info is validated
+    if name == 'ContactForm':
+        from django_pagarme.forms import ContactForm
+        return ContactForm
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _read_database() -> str:
+    """
+    Database alias used on read only queries: catalog, user payments listing and reports.
+    It can point to a replica through settings.DJANGO_PAGARME_READ_DATABASE. Captures, postbacks, payment profiles and
+    reads depending on data written on those flows always use default database
+    """
+    return getattr(settings, 'DJANGO_PAGARME_READ_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def find_account(slug: str) -> str:
+    """
+    Pagarme account of PagarmeItemConfig or Plan with given slug. Used to pick gateway client and keys of checkout,
+    capture and postback urls, which all contain the slug
+    :param slug: item or plan slug
+    :return: account name, default account if there is no item nor plan with slug
+    """
+    for model in (PagarmeItemConfig, Plan):
+        account = model.objects.using(_read_database()).filter(slug=slug).values_list('account', flat=True).first()
+        if account is not None:
+            return account
+    return DEFAULT_ACCOUNT
 
 
 def get_payment_item(slug: str) -> PagarmeItemConfig:
@@ -50,7 +98,7 @@ def get_payment_item(slug: str) -> PagarmeItemConfig:
     :param slug:
     :return: PagarmeItemConfig
     """
-    return PagarmeItemConfig.objects.filter(slug=slug).select_related('default_config').get()
+    return PagarmeItemConfig.objects.using(_read_database()).filter(slug=slug).select_related('default_config').get()
 
 
 def list_payment_item_configs() -> List[PagarmeItemConfig]:
@@ -58,7 +106,7 @@ def list_payment_item_configs() -> List[PagarmeItemConfig]:
     List PagarmeItemConfig ordered by slug
     :return: list of PagarmeItemConfig
     """
-    return list(PagarmeItemConfig.objects.filter().all())
+    return list(PagarmeItemConfig.objects.using(_read_database()).all())
 
 
 class TokenDifferentFromTransactionIdxception(Exception):
@@ -68,50 +116,394 @@ class TokenDifferentFromTransactionIdxception(Exception):
         self.token = token
 
 
-def capture(token: str, django_user_id=None) -> PagarmePayment:
-    pagarme_transaction = transaction.find_by_id(token)
+def capture(token: str, django_user_id=None, account: str = DEFAULT_ACCOUNT) -> PagarmePayment:
+    client = get_client(account)
+    pagarme_transaction = client.find_transaction(token)
+    payment, must_capture = _prepare_capture(token, pagarme_transaction, django_user_id, account)
+    if not must_capture:
+        return payment
+    captured_transaction = client.capture_transaction(token, {'amount': payment.amount})
+    return _finish_capture(payment, captured_transaction)
+
+
+def _prepare_capture(token: str, pagarme_transaction: dict, django_user_id=None, account: str = DEFAULT_ACCOUNT):
+    """
+    Find or create payment for pagarme transaction, saving user payment profile on creation
+    :return: tuple (PagarmePayment, bool indicating if payment must be captured)
+    """
     transaction_id = pagarme_transaction['id']
     if str(transaction_id) != token:
         raise TokenDifferentFromTransactionIdxception(token, transaction_id)
     try:
         payment = find_payment_by_transaction(transaction_id)
         if payment.status() != AUTHORIZED:  # only status capturing makes sense
-            return payment
+            return payment, False
     except PagarmePayment.DoesNotExist:
         payment, all_payments_items = PagarmePayment.from_pagarme_transaction(pagarme_transaction)
-        if django_user_id is None:
-            try:
-                user = _user_factory(pagarme_transaction)
-            except ImpossibleUserCreation:
-                pass
-            else:
-                django_user_id = user.id
-
-        if django_user_id is not None:
-            profile = UserPaymentProfile.from_pagarme_dict(django_user_id, pagarme_transaction)
-            profile.save()
-
-        payment.user_id = django_user_id
+        payment.user_id = _capture_user_id(pagarme_transaction, django_user_id)
+        payment.account = account
         with django_transaction.atomic():
             payment.save()
             payment.items.set(all_payments_items)
+    return payment, True
+
 
-    captured_transaction = transaction.capture(token, {'amount': payment.amount})
+def _capture_user_id(pagarme_transaction: dict, django_user_id=None):
+    """
+    Resolve user of a payment being captured, using user factory when no user is given, and save his payment profile
+    :return: django user id or None
+    """
+    if django_user_id is None:
+        try:
+            user = _user_factory(pagarme_transaction)
+        except ImpossibleUserCreation:
+            pass
+        else:
+            django_user_id = user.id
+
+    if django_user_id is not None:
+        profile = UserPaymentProfile.from_pagarme_dict(django_user_id, pagarme_transaction)
+        profile.upsert()
+    return django_user_id
+
+
+def _finish_capture(payment: PagarmePayment, captured_transaction: dict) -> PagarmePayment:
     payment.extract_boleto_data(captured_transaction)
     payment.save()
     _save_notification(payment.id, captured_transaction['status'])
     return payment
 
 
-def handle_notification(transaction_id: str, current_status: str, raw_body: str,
-                        expected_signature: str, pagarme_notification_dict) -> PagarmeNotification:
-    if not postback.validate(expected_signature, raw_body):
+CAPTURE_MANY_MAX_WORKERS = 10
+
+
+def capture_many(tokens: Iterable[str], max_workers: int = CAPTURE_MANY_MAX_WORKERS,
+                 account: str = DEFAULT_ACCOUNT) -> Dict[str, object]:
+    """
+    Capture several transactions at once. Transactions are fetched and captured on Pagarme concurrently, with at most
+    max_workers requests in flight, and payments, items and notifications are saved in batches.
+    Errors don't stop the batch: each one is returned for its token.
+    :param tokens: transactions tokens
+    :param max_workers: max number of concurrent requests to Pagarme
+    :param account: Pagarme account of transactions
+    :return: dict mapping each token to its PagarmePayment or to the exception raised while capturing it
+    """
+    client = get_client(account)
+    tokens = list(dict.fromkeys(str(token) for token in tokens))
+    results = {}
+    pagarme_transactions = {}
+    for token, pagarme_transaction in _call_concurrently(client.find_transaction, tokens, max_workers).items():
+        if isinstance(pagarme_transaction, Exception):
+            results[token] = pagarme_transaction
+        elif str(pagarme_transaction['id']) != token:
+            results[token] = TokenDifferentFromTransactionIdxception(token, pagarme_transaction['id'])
+        else:
+            pagarme_transactions[token] = pagarme_transaction
+
+    payments_to_capture = _prepare_captures(pagarme_transactions, results, account)
+
+    def capture_payment(token):
+        return client.capture_transaction(token, {'amount': payments_to_capture[token].amount})
+
+    captured_transactions = _call_concurrently(capture_payment, list(payments_to_capture), max_workers)
+    _finish_captures(payments_to_capture, captured_transactions, results)
+    return {token: results[token] for token in tokens}
+
+
+def _call_concurrently(function: Callable, arguments: list, max_workers: int) -> dict:
+    """
+    Call function for each argument on a thread pool
+    :return: dict mapping each argument to function result or to the exception raised
+    """
+    def call(argument):
+        try:
+            return function(argument)
+        except Exception as e:
+            return e
+
+    if not arguments:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(arguments, executor.map(call, arguments)))
+
+
+def _prepare_captures(pagarme_transactions: Dict[str, dict], results: dict,
+                      account: str = DEFAULT_ACCOUNT) -> Dict[str, PagarmePayment]:
+    """
+    Batch version of _prepare_capture. Payments which don't need capture are set on results
+    :return: dict mapping token to payment which must be captured
+    """
+    existing_payments = PagarmePayment.objects.filter(transaction_id__in=list(pagarme_transactions)).annotate(
+        last_status=last_payment_status_subquery()
+    )
+    existing_payments = {payment.transaction_id: payment for payment in existing_payments}
+    payments_to_capture = {}
+    new_payments = {}
+    new_payments_items = {}
+    for token, pagarme_transaction in pagarme_transactions.items():
+        payment = existing_payments.get(token)
+        if payment is None:
+            try:
+                payment, all_payments_items = PagarmePayment.from_pagarme_transaction(pagarme_transaction)
+                payment.user_id = _capture_user_id(pagarme_transaction)
+                payment.account = account
+            except Exception as e:
+                results[token] = e
+            else:
+                new_payments[token] = payment
+                new_payments_items[token] = all_payments_items or []
+        elif payment.status() == AUTHORIZED:
+            payments_to_capture[token] = payment
+        else:
+            results[token] = payment
+
+    try:
+        with django_transaction.atomic():
+            PagarmePayment.objects.bulk_create(new_payments.values())
+            _set_bulk_created_ids(new_payments.values())
+            PagarmePaymentItem.objects.bulk_create(
+                PagarmePaymentItem(payment_id=new_payments[token].id, item_id=item.id)
+                for token, items in new_payments_items.items() for item in items
+            )
+    except IntegrityError:
+        # Some payment was created by a postback meanwhile, so falling back to one by one creation. Users were already
+        # resolved, so prepared payments are reused instead of running user factory and profile upsert again
+        for token, payment in new_payments.items():
+            try:
+                payment, must_capture = _save_capture_payment(payment, new_payments_items[token])
+            except Exception as e:
+                results[token] = e
+            else:
+                if must_capture:
+                    payments_to_capture[token] = payment
+                else:
+                    results[token] = payment
+    else:
+        payments_to_capture.update(new_payments)
+    return payments_to_capture
+
+
+def _set_bulk_created_ids(payments: Iterable[PagarmePayment]) -> None:
+    """
+    bulk_create only sets primary keys on backends returning rows from bulk inserts (ex: Postgres). On the others
+    ids are fetched by transaction id
+    """
+    payments = [payment for payment in payments if payment.pk is None]
+    if not payments:
+        return
+    ids = dict(
+        PagarmePayment.objects.filter(transaction_id__in=[str(payment.transaction_id) for payment in payments])
+        .values_list('transaction_id', 'id')
+    )
+    for payment in payments:
+        payment.pk = ids[str(payment.transaction_id)]
+
+
+def _save_capture_payment(payment: PagarmePayment, items) -> tuple:
+    """
+    Save payment prepared for capture, or find it in case it was created meanwhile
+    :return: tuple (PagarmePayment, bool indicating if payment must be captured)
+    """
+    payment.pk = None
+    payment._state.adding = True
+    try:
+        with django_transaction.atomic():
+            payment.save()
+            payment.items.set(items)
+    except IntegrityError:
+        payment = find_payment_by_transaction(payment.transaction_id)
+        return payment, payment.status() == AUTHORIZED
+    return payment, True
+
+
+def _finish_captures(payments: Dict[str, PagarmePayment], captured_transactions: Dict[str, object],
+                     results: dict) -> None:
+    """
+    Batch version of _finish_capture, setting payments or errors on results
+    """
+    captured_payments = []
+    for token, payment in payments.items():
+        captured_transaction = captured_transactions[token]
+        if isinstance(captured_transaction, Exception):
+            results[token] = captured_transaction
+            continue
+        current_status = captured_transaction['status']
+        last_status = getattr(payment, 'last_status', None) or ''
+        if current_status in _impossible_states.get(last_status, {}):
+            results[token] = InvalidNotificationStatusTransition(
+                f'Invalid transition {last_status} -> {current_status}'
+            )
+            continue
+        payment.extract_boleto_data(captured_transaction)
+        payment.last_status = current_status
+        captured_payments.append((payment, current_status))
+        results[token] = payment
+
+    PagarmePayment.objects.bulk_update(
+        [payment for payment, _ in captured_payments if payment.payment_method == BOLETO],
+        ['boleto_barcode', 'boleto_url']
+    )
+    _bulk_save_notifications(captured_payments)
+
+
+def _bulk_save_notifications(payments_statuses: List[tuple]) -> None:
+    """
+    Batch version of _save_notification. Status transitions must be validated by caller
+    :param payments_statuses: list of (PagarmePayment, status) tuples
+    """
+    if not payments_statuses:
+        return
+    with django_transaction.atomic():
+        notifications = PagarmeNotification.objects.bulk_create(
+            PagarmeNotification(payment_id=payment.id, status=status) for payment, status in payments_statuses
+        )
+        django_transaction.on_commit(partial(_increment_payments_aggregates, notifications))
+    for payment, _ in payments_statuses:
+        for listener in _payment_status_changed_listeners:
+            listener(payment_id=payment.id)
+
+
+def _increment_payments_aggregates(notifications: List[PagarmeNotification]) -> None:
+    """
+    Batch version of _increment_payment_aggregate, incrementing each aggregate row once
+    """
+    payments_ids = [notification.payment_id for notification in notifications]
+    payments = PagarmePayment.objects.filter(id__in=payments_ids).values(
+        'id', 'amount', 'payment_method', 'subscription__plan__slug'
+    )
+    payments = {payment['id']: payment for payment in payments}
+    items_slugs = {}
+    for payment_id, item_slug in PagarmePaymentItem.objects.filter(payment_id__in=payments_ids).values_list(
+            'payment_id', 'item__slug'):
+        items_slugs.setdefault(payment_id, []).append(item_slug)
+
+    groups = {}
+    for notification in notifications:
+        payment = payments[notification.payment_id]
+        for item_slug in items_slugs.get(notification.payment_id) or ['']:
+            key = (
+                timezone.localdate(notification.creation), notification.status, payment['payment_method'], item_slug,
+                payment['subscription__plan__slug'] or ''
+            )
+            count, amount = groups.get(key, (0, 0))
+            groups[key] = (count + 1, amount + payment['amount'])
+    for (day, status, payment_method, item_slug, plan_slug), (count, amount) in groups.items():
+        DailyStatusAggregate.increment(
+            PAYMENT_AGGREGATE, day, status, payment_method, count, amount, item_slug=item_slug, plan_slug=plan_slug
+        )
+
+
+REFUNDABLE_STATUSES = (AUTHORIZED, PAID)
+
+
+class ImpossibleRefund(Exception):
+    pass
+
+
+def refund(transaction_id: str, bank_account: dict = None) -> PagarmePayment:
+    """
+    Refund a payment on Pagarme. A pending refund notification is saved right after Pagarme accepts the refund, so
+    payment status changes without waiting for postback. Pagarme postbacks reconcile it later: pending refund
+    repetitions are ignored as invalid transitions and refunded status is saved when it arrives
+    raise ImpossibleRefund in case payment status is not refundable
+    :param transaction_id: payment transaction id
+    :param bank_account: Pagarme bank account dict, required by Pagarme for boleto refunds
+    :return: PagarmePayment
+    """
+    result = refund_many([transaction_id], bank_account=bank_account)[str(transaction_id)]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+REFUND_MANY_MAX_WORKERS = 10
+
+
+def refund_many(transactions_ids: Iterable[str], max_workers: int = REFUND_MANY_MAX_WORKERS,
+                bank_account: dict = None) -> Dict[str, object]:
+    """
+    Batch version of refund. Refunds are requested on Pagarme concurrently, with at most max_workers requests in
+    flight, and notifications are saved in batch
+    :param transactions_ids: payments transactions ids
+    :param max_workers: max number of concurrent requests to Pagarme
+    :param bank_account: Pagarme bank account dict, required by Pagarme for boleto refunds
+    :return: dict mapping each transaction id to its PagarmePayment or to the exception raised while refunding it
+    """
+    transactions_ids = list(dict.fromkeys(str(transaction_id) for transaction_id in transactions_ids))
+    payments = PagarmePayment.objects.filter(transaction_id__in=transactions_ids).annotate(
+        last_status=last_payment_status_subquery()
+    )
+    payments = {payment.transaction_id: payment for payment in payments}
+    results = {}
+    payments_to_refund = {}
+    for transaction_id in transactions_ids:
+        payment = payments.get(transaction_id)
+        if payment is None:
+            results[transaction_id] = PagarmePayment.DoesNotExist(f'Payment {transaction_id} not found')
+        elif payment.status() not in REFUNDABLE_STATUSES:
+            results[transaction_id] = ImpossibleRefund(f'Payment {transaction_id} is {payment.status()}')
+        else:
+            payments_to_refund[transaction_id] = payment
+
+    refund_data = {} if bank_account is None else {'bank_account': bank_account}
+
+    def refund_payment(transaction_id):
+        return get_client(payments_to_refund[transaction_id].account).refund_transaction(transaction_id, refund_data)
+
+    refunded_payments = []
+    refunded_transactions = _call_concurrently(refund_payment, list(payments_to_refund), max_workers)
+    for transaction_id, refunded_transaction in refunded_transactions.items():
+        if isinstance(refunded_transaction, Exception):
+            results[transaction_id] = refunded_transaction
+            continue
+        payment = payments_to_refund[transaction_id]
+        refunded_payments.append((payment, PENDING_REFUND))
+        payment.last_status = PENDING_REFUND
+        if refunded_transaction['status'] == REFUNDED:
+            refunded_payments.append((payment, REFUNDED))
+            payment.last_status = REFUNDED
+        results[transaction_id] = payment
+    _bulk_save_notifications(refunded_payments)
+    return {transaction_id: results[transaction_id] for transaction_id in transactions_ids}
+
+
+def refund_payments(payments: QuerySet = None, batch_size: int = 100,
+                    max_workers: int = REFUND_MANY_MAX_WORKERS) -> Iterator[Dict[str, object]]:
+    """
+    Refund payments in batches, yielding refund_many results for each batch. Only payments with refundable status
+    are processed, so job can be interrupted and run again, resuming from payments not refunded yet.
+    Payments failing are retried only on next run.
+    :param payments: PagarmePayment queryset, all payments if None
+    :param batch_size: payments refunded per batch
+    :param max_workers: max number of concurrent requests to Pagarme
+    :return: generator of dicts mapping transaction id to PagarmePayment or exception
+    """
+    if payments is None:
+        payments = PagarmePayment.objects.all()
+    payments = payments.annotate(last_status=last_payment_status_subquery()).filter(
+        last_status__in=REFUNDABLE_STATUSES
+    ).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(payments.filter(id__gt=last_id).values_list('id', 'transaction_id')[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        yield refund_many([transaction_id for _, transaction_id in batch], max_workers)
+
+
+def handle_notification(transaction_id: str, current_status: str, raw_body: str, expected_signature: str,
+                        pagarme_notification_dict, account: str = DEFAULT_ACCOUNT) -> PagarmeNotification:
+    if not get_client(account).validate_postback(expected_signature, raw_body):
         raise PaymentViolation('')
     try:
-        payment_id = PagarmePayment.objects.values_list('id').get(transaction_id=transaction_id)[0]
+        payment_id, payment_account = PagarmePayment.objects.values_list('id', 'account').get(
+            transaction_id=transaction_id
+        )
     except PagarmePayment.DoesNotExist:
         transaction_dict = to_pagarme_transaction(pagarme_notification_dict)
         pagarme_payment, all_payments_items = PagarmePayment.from_pagarme_transaction(transaction_dict)
+        pagarme_payment.account = account
         try:
             user = _user_factory(transaction_dict)
         except ImpossibleUserCreation:
@@ -119,12 +511,16 @@ def handle_notification(transaction_id: str, current_status: str, raw_body: str,
         else:
             pagarme_payment.user_id = user.id
             profile = UserPaymentProfile.from_pagarme_dict(user.id, transaction_dict)
-            profile.save()
+            profile.upsert()
 
         with django_transaction.atomic():
             pagarme_payment.save()
             pagarme_payment.items.set(all_payments_items)
         payment_id = pagarme_payment.id
+    else:
+        # Postback signed by one account must not change payments of another one
+        if payment_account != account:
+            raise PaymentViolation(f'Transaction {transaction_id} does not belong to account {account!r}')
     return _save_notification(payment_id, current_status)
 
 
@@ -198,7 +594,7 @@ _impossible_states = {
     PROCESSING: {PROCESSING},
     AUTHORIZED: {REFUNDED, REFUSED},
     PAID: {PAID, AUTHORIZED, WAITING_PAYMENT},
-    REFUNDED: {REFUNDED, AUTHORIZED, PAID, WAITING_PAYMENT},
+    REFUNDED: {REFUNDED, PENDING_REFUND, AUTHORIZED, PAID, WAITING_PAYMENT},
     PENDING_REFUND: {PENDING_REFUND, PAID, WAITING_PAYMENT, AUTHORIZED},
     WAITING_PAYMENT: {WAITING_PAYMENT},
     REFUSED: {REFUSED},
@@ -207,20 +603,48 @@ _impossible_states = {
 
 def _save_notification(payment_id, current_status):
     """
-    Will save the notication depending on last status and current status
+    Will save the notication depending on last status and current status and call payment status changed listeners
     raise Invalid Current Status in case current status is incompatible with last status
     :param payment_id:
     :param current_status:
     :return:
     """
-    last_notification = PagarmeNotification.objects.filter(payment_id=payment_id).order_by('-creation').first()
+    notification = _create_notification(payment_id, current_status)
+    _notify_payment_status_changed(payment_id)
+    return notification
+
+
+def _create_notification(payment_id, current_status) -> PagarmeNotification:
+    """
+    Same as _save_notification, but without calling listeners, so callers saving more data on an outer transaction
+    can call them only after it commits
+    """
+    last_notification = PagarmeNotification.objects.filter(payment_id=payment_id).order_by('-creation', '-id').first()
     last_status = '' if last_notification is None else last_notification.status
     if current_status in _impossible_states.get(last_status, {}):
         raise InvalidNotificationStatusTransition(f'Invalid transition {last_status} -> {current_status}')
-    notification = PagarmeNotification(status=current_status, payment_id=payment_id).save()
+    with django_transaction.atomic():
+        notification = PagarmeNotification.objects.create(status=current_status, payment_id=payment_id)
+        # Aggregate rows are hot, so they're updated after commit, not holding row locks during notification transaction
+        django_transaction.on_commit(
+            partial(_increment_payment_aggregate, payment_id, current_status, timezone.localdate(notification.creation))
+        )
+    return notification
+
+
+def _notify_payment_status_changed(payment_id) -> None:
     for listener in _payment_status_changed_listeners:
         listener(payment_id=payment_id)
-    return notification
+
+
+def _increment_payment_aggregate(payment_id, status: str, day) -> None:
+    payment = PagarmePayment.objects.values('amount', 'payment_method', 'subscription__plan__slug').get(id=payment_id)
+    item_slugs = PagarmePaymentItem.objects.filter(payment_id=payment_id).values_list('item__slug', flat=True)
+    for item_slug in list(item_slugs) or ['']:
+        DailyStatusAggregate.increment(
+            PAYMENT_AGGREGATE, day, status, payment['payment_method'], 1, payment['amount'],
+            item_slug=item_slug, plan_slug=payment['subscription__plan__slug']
+        )
 
 
 def find_payment_by_transaction(transaction_id: str) -> PagarmePayment:
@@ -232,6 +656,23 @@ def find_payment(payment_id: int) -> PagarmePayment:
     return PagarmePayment.objects.get(id=payment_id)
 
 
+def list_user_payments(django_user_or_id, before_id: int = None, limit: int = 20) -> List[PagarmePayment]:
+    """
+    List user payments from newest to oldest with items and status prefetched, so looping over them calling
+    payment.status() and payment.items.all() does not hit database.
+    Pagination is done by keyset: use last payment id of a page as before_id to get next one
+    :param django_user_or_id: Django user or his id
+    :param before_id: only payments with id lower than this are returned
+    :param limit: max number of payments returned
+    :return: list of PagarmePayment
+    """
+    payments = PagarmePayment.objects.using(_read_database()).filter(user_id=_to_user_id(django_user_or_id))
+    if before_id is not None:
+        payments = payments.filter(id__lt=before_id)
+    payments = payments.annotate(last_status=last_payment_status_subquery()).prefetch_related('items')
+    return list(payments.order_by('-id')[:limit])
+
+
 class InvalidNotificationStatusTransition(Exception):
     pass
 
@@ -243,18 +684,40 @@ class InvalidContactData(Exception):
     to present them to user on templates or other interfaces
     """
 
-    def __init__(self, contact_form: ContactForm, *args: object) -> None:
+    def __init__(self, contact_form: 'ContactForm', *args: object) -> None:
         super().__init__(*args)
-        self.contact_form: ContactForm = contact_form
+        self.contact_form: 'ContactForm' = contact_form
 
 
 _contact_info_listeners = []
+_contact_info_batch_listeners = []
+
+CONTACT_INFO_SYNC = 'sync'
+CONTACT_INFO_ON_COMMIT = 'on_commit'
+CONTACT_INFO_WORKER = 'worker'
+CONTACT_INFO_MAX_ATTEMPTS = 5
+CONTACT_INFO_CLAIM_TIMEOUT = timedelta(minutes=10)
+CONTACT_INFO_RETENTION_DAYS = 30
 
 
 def add_contact_info_listener(callable: Callable):
     _contact_info_listeners.append(callable)
 
 
+def add_contact_info_batch_listener(callable: Callable):
+    """
+    Listener added with this function will be called receiving a list of contact info dicts, with the same keys
+    contact info listeners receive as parameters. Useful to send several leads on a single request to a CRM
+    :param callable:
+    :return: nothing
+    """
+    _contact_info_batch_listeners.append(callable)
+
+
+def _contact_info_delivery() -> str:
+    return getattr(settings, 'DJANGO_PAGARME_CONTACT_INFO_DELIVERY', CONTACT_INFO_SYNC)
+
+
 def validate_and_inform_contact_info(name, email, phone, payment_item_slug, user=None):
     """
     Validate contact info returning a dict containing normalized values.
@@ -264,6 +727,9 @@ def validate_and_inform_contact_info(name, email, phone, payment_item_slug, user
 
     This dict will also be passed to callables configured on add_contact_info_listener.
     Callables must declare parameters with names 'name', 'email', 'phone' and 'payment_item_slug'
+    If setting DJANGO_PAGARME_CONTACT_INFO_DELIVERY is 'on_commit' or 'worker', data is saved as a ContactInfoEvent
+    and listeners are called later by deliver_contact_info_events, respectively on a background thread after
+    transaction commit or by django_pagarme_deliver_contact_info command.
     raises InvalidContactData data in case data is invalid
     :param user: Django user
     :param name:
@@ -272,30 +738,205 @@ def validate_and_inform_contact_info(name, email, phone, payment_item_slug, user
     :param payment_item_slug: item slug
     :return: dict
     """
+    from django_pagarme.forms import ContactForm
+
     dct = {'name': name, 'email': email, 'phone': phone}
     form = ContactForm(dct)
     if not form.is_valid():
         raise InvalidContactData(contact_form=form)
     data = dict(form.cleaned_data)
-    for listener in _contact_info_listeners:
-        listener(payment_item_slug=payment_item_slug, user=user, **data)
+    delivery = _contact_info_delivery()
+    if delivery == CONTACT_INFO_SYNC:
+        for listener in _contact_info_listeners:
+            listener(payment_item_slug=payment_item_slug, user=user, **data)
+        for batch_listener in _contact_info_batch_listeners:
+            batch_listener([dict(data, payment_item_slug=payment_item_slug, user=user)])
+    else:
+        ContactInfoEvent.objects.create(payment_item_slug=payment_item_slug, user_id=getattr(user, 'pk', None), **data)
+        if delivery == CONTACT_INFO_ON_COMMIT:
+            django_transaction.on_commit(_schedule_contact_info_delivery)
     return data
 
 
+_contact_info_executor = None
+
+
+def _schedule_contact_info_delivery():
+    global _contact_info_executor
+    if _contact_info_executor is None:
+        # A single thread per process, so deliveries scheduled by concurrent requests don't compete for same events
+        _contact_info_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='django_pagarme_contact_info')
+    _contact_info_executor.submit(_deliver_contact_info_on_thread)
+
+
+def _deliver_contact_info_on_thread():
+    try:
+        while deliver_contact_info_events():
+            pass
+    except Exception:
+        logger.exception('Erro ao entregar eventos de contato')
+    finally:
+        connections.close_all()
+
+
+def deliver_contact_info_events(batch_size: int = 100) -> int:
+    """
+    Deliver a batch of pending contact info events to listeners, oldest first.
+    Events are claimed on a short transaction and listeners are called outside of it, so slow listeners don't hold
+    database locks. Events claimed by a worker which died are claimed again after CONTACT_INFO_CLAIM_TIMEOUT.
+    Events whose listeners raise are retried on next deliveries, up to CONTACT_INFO_MAX_ATTEMPTS times. A failing
+    batch listener makes all batch be retried, so listeners must tolerate receiving same contact more than once
+    :param batch_size: max number of events delivered
+    :return: number of events delivered
+    """
+    events = _claim_contact_info_events(batch_size)
+    users = get_user_model().objects.in_bulk({event.user_id for event in events if event.user_id is not None})
+    delivered = []
+    failed = []
+    for event in events:
+        event.user = users.get(event.user_id)
+        try:
+            for listener in _contact_info_listeners:
+                listener(**event.to_listener_kwargs())
+        except Exception:
+            logger.exception(f'Erro ao entregar evento de contato {event.id}')
+            failed.append(event)
+        else:
+            delivered.append(event)
+    if delivered:
+        try:
+            for batch_listener in _contact_info_batch_listeners:
+                batch_listener([event.to_listener_kwargs() for event in delivered])
+        except Exception:
+            logger.exception('Erro ao entregar lote de eventos de contato')
+            failed.extend(delivered)
+            delivered = []
+    ContactInfoEvent.objects.filter(id__in=[event.id for event in delivered]).update(delivered_at=timezone.now())
+    ContactInfoEvent.objects.filter(id__in=[event.id for event in failed]).update(claimed_at=None)
+    return len(delivered)
+
+
+def _claim_contact_info_events(batch_size: int) -> List[ContactInfoEvent]:
+    claimed_at = timezone.now()
+    with django_transaction.atomic():
+        claimable = ContactInfoEvent.objects.filter(
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=claimed_at - CONTACT_INFO_CLAIM_TIMEOUT),
+            delivered_at__isnull=True, attempts__lt=CONTACT_INFO_MAX_ATTEMPTS
+        )
+        events = claimable.order_by('id')
+        if connections[events.db].features.has_select_for_update_skip_locked:
+            events = events.select_for_update(skip_locked=True)
+        ids = list(events.values_list('id', flat=True)[:batch_size])
+        # Filtering claimable again, so events claimed by a concurrent worker on backends without row locks are skipped
+        claimable.filter(id__in=ids).update(claimed_at=claimed_at, attempts=F('attempts') + 1)
+    return list(ContactInfoEvent.objects.filter(id__in=ids, claimed_at=claimed_at).order_by('id'))
+
+
+def _contact_info_retention_days():
+    return getattr(settings, 'DJANGO_PAGARME_CONTACT_INFO_RETENTION_DAYS', CONTACT_INFO_RETENTION_DAYS)
+
+
+def purge_contact_info_events(retention_days: int = None) -> int:
+    """
+    Delete contact info events, which hold personal data, delivered or created before retention period.
+    Events still pending delivery are kept, unless they already reached CONTACT_INFO_MAX_ATTEMPTS
+    :param retention_days: days events are kept. Default is setting DJANGO_PAGARME_CONTACT_INFO_RETENTION_DAYS,
+    or CONTACT_INFO_RETENTION_DAYS. If None events are never purged
+    :return: number of events deleted
+    """
+    if retention_days is None:
+        retention_days = _contact_info_retention_days()
+    if retention_days is None:
+        return 0
+    limit = timezone.now() - timedelta(days=retention_days)
+    given_up = Q(delivered_at__isnull=True, attempts__gte=CONTACT_INFO_MAX_ATTEMPTS, creation__lt=limit)
+    deleted, _ = ContactInfoEvent.objects.filter(Q(delivered_at__lt=limit) | given_up).delete()
+    return deleted
+
+
+def contact_info_metrics(since: datetime = None) -> dict:
+    """
+    Metrics of contact info deferred delivery
+    :param since: delivery latency is calculated for events delivered after it. Default is last hour
+    :return: dict with queue_depth (events waiting delivery), failed (events which reached max attempts),
+    oldest_pending_seconds, delivered (number of events delivered since) and average_latency_seconds
+    """
+    if since is None:
+        since = timezone.now() - timedelta(hours=1)
+    pending = ContactInfoEvent.objects.using(_read_database()).filter(delivered_at__isnull=True)
+    oldest_pending = pending.filter(attempts__lt=CONTACT_INFO_MAX_ATTEMPTS).aggregate(oldest=Min('creation'))['oldest']
+    delivered = ContactInfoEvent.objects.using(_read_database()).filter(delivered_at__gte=since).aggregate(
+        delivered=Count('id'),
+        latency=Avg(ExpressionWrapper(F('delivered_at') - F('creation'), output_field=DurationField())),
+    )
+    return {
+        'queue_depth': pending.filter(attempts__lt=CONTACT_INFO_MAX_ATTEMPTS).count(),
+        'failed': pending.filter(attempts__gte=CONTACT_INFO_MAX_ATTEMPTS).count(),
+        'oldest_pending_seconds': 0 if oldest_pending is None else (timezone.now() - oldest_pending).total_seconds(),
+        'delivered': delivered['delivered'],
+        'average_latency_seconds': 0 if delivered['latency'] is None else delivered['latency'].total_seconds(),
+    }
+
+
 def get_user_payment_profile(django_user_or_id) -> UserPaymentProfile:
     """
     Get django user payment profile. Useful to avoid input of customer and billing address data on payment
     form when user
-    decides buying for a second time
+    decides buying for a second time.
+    Profile is read from default database since it may have been saved on a capture just before
     :param django_user_or_id: Django user or his id
     :return: UserPaymentProfile
     """
+    return UserPaymentProfile.objects.get(user_id=_to_user_id(django_user_or_id))
+
+
+def get_user_checkout_profile(django_user_or_id) -> dict:
+    """
+    Get customer and billing address dicts used to fill checkout forms for a user.
+    Dicts are cached by user and invalidated every time his UserPaymentProfile is saved, so cache hits do no query.
+    Profile is read from default database since it may have been saved on a capture just before
+    raises UserPaymentProfileDoesNotExist in case user has no profile
+    :param django_user_or_id: Django user or his id
+    :return: dict with 'customer' and 'address' keys
+    """
+    profile_data = _cached_payment_profile_data(django_user_or_id)
+    return {'customer': profile_data['customer'], 'address': profile_data['address']}
+
+
+def _cached_payment_profile_data(django_user_or_id) -> dict:
+    """
+    Data from user's UserPaymentProfile used on checkout forms and one click buy, cached on a single key by user
+    raises UserPaymentProfileDoesNotExist in case user has no profile
+    :param django_user_or_id: Django user or his id
+    :return: dict with 'customer', 'address', 'card_id', 'customer_api' and 'billing' keys
+    """
+    user_id = _to_user_id(django_user_or_id)
+    cache_key = payment_profile_cache_key(user_id)
+    profile_data = cache.get(cache_key)
+    if profile_data is None:
+        try:
+            profile = UserPaymentProfile.objects.get(user_id=user_id)
+        except UserPaymentProfile.DoesNotExist:
+            profile_data = {}  # caching absence of profile too, since saving one invalidates cache
+        else:
+            profile_data = {
+                'customer': profile.to_customer_dict(),
+                'address': profile.to_billing_address_dict(),
+                'card_id': profile.card_id,
+                'customer_api': profile.to_customer_api_dict(),
+                'billing': profile.to_billing_dict(),
+            }
+        cache.set(cache_key, profile_data)
+    if not profile_data:
+        raise UserPaymentProfileDoesNotExist()
+    return profile_data
+
+
+def _to_user_id(django_user_or_id):
     User = get_user_model()
     if isinstance(django_user_or_id, User):
-        user_id = django_user_or_id.pk
-    else:
-        user_id = django_user_or_id
-    return UserPaymentProfile.objects.get(user_id=user_id)
+        return django_user_or_id.pk
+    return django_user_or_id
 
 
 class ImpossibleUserCreation(Exception):
@@ -326,7 +967,22 @@ def set_user_factory(factory: Callable):
 
 
 def find_payment_item_config(slug: str) -> PagarmeItemConfig:
-    return PagarmeItemConfig.objects.get(slug=slug)
+    return PagarmeItemConfig.objects.using(_read_database()).get(slug=slug)
+
+
+def get_cached_payment_item(slug: str) -> PagarmeItemConfig:
+    """
+    Same as get_payment_item, but kept on cache until catalog changes, so cheap checks like conditional requests don't
+    need database access
+    :param slug:
+    :return: PagarmeItemConfig
+    """
+    cache_key = payment_item_cache_key(get_catalog_version().version, slug)
+    payment_item = cache.get(cache_key)
+    if payment_item is None:
+        payment_item = PagarmeItemConfig.objects.filter(slug=slug).select_related('default_config').get()
+        cache.set(cache_key, payment_item, CATALOG_CACHE_TIMEOUT)
+    return payment_item
 
 
 _payment_status_changed_listeners = []
@@ -342,32 +998,93 @@ def add_payment_status_changed(listener: Callable):
     return _payment_status_changed_listeners.append(listener)
 
 
-def one_click_buy(payment_item_config_slug: PagarmeItemConfig, user):
+def _one_click_payload(django_user_or_id) -> dict:
+    """
+    Return card, customer and billing data used on one click buy.
+    Data is cached by user and invalidated every time his UserPaymentProfile is saved.
+    Profile is read from default database since it may have been saved on a capture just before
+    raises UserPaymentProfileDoesNotExist in case user has no profile
+    :param django_user_or_id: Django user or his id
+    :return: dict
+    """
+    profile_data = _cached_payment_profile_data(django_user_or_id)
+    return {
+        'card_id': profile_data['card_id'],
+        'customer': profile_data['customer_api'],
+        'billing': profile_data['billing'],
+    }
+
+
+def one_click_buy(payment_item_config_slug: PagarmeItemConfig, user, async_capture: bool = None) -> dict:
     """
     Create Transaction
     https://docs.pagar.me/reference#criar-transacao
+
+    If async_capture is True, Pagarme answers right away with processing status and final status arrives
+    through postback. If it is None, settings.DJANGO_PAGARME_ONE_CLICK_ASYNC is used (default False)
+
+    Payment, its item and first notification are saved from Pagarme response, so later postbacks
+    find the payment already on database. It can be loaded with find_payment_by_transaction
+    :return: Pagarme transaction dict
+    """
+    item, payment_data = _one_click_payment_data(payment_item_config_slug, user, async_capture)
+    pagarme_transaction = get_client(item.account).create_transaction(payment_data)
+    _save_one_click_payment(pagarme_transaction, payment_data, item, _to_user_id(user))
+    return pagarme_transaction
+
+
+def _one_click_payment_data(payment_item_config_slug: str, user, async_capture: bool = None):
+    """
+    Build Pagarme transaction data for one click buy
+    :return: tuple (PagarmeItemConfig, dict)
     """
+    if async_capture is None:
+        async_capture = getattr(settings, 'DJANGO_PAGARME_ONE_CLICK_ASYNC', False)
     item = get_payment_item(payment_item_config_slug)
     form_config = item.default_config
-    profile = get_user_payment_profile(user)
-    domain = settings.ALLOWED_HOSTS[0]
-    notification_path = reverse('django_pagarme:notification', kwargs={'slug': item.slug})
-    postback_url = f'https://{domain}{notification_path}'
+    profile_payload = _one_click_payload(user)
     payment_data = {
         'amount': item.price,
-        'card_id': profile.card_id,
+        'card_id': profile_payload['card_id'],
         'payment_method': 'credit_card',
-        'postback_url': postback_url,
-        'async': False,
+        'postback_url': postback_url(item.slug),
+        'async': async_capture,
         'installments': form_config.max_installments,
         'soft_descriptor': 'pythopro',
         'capture': True,
-        'customer': profile.to_customer_api_dict(),
-        'billing': profile.to_billing_dict(),
+        'customer': profile_payload['customer'],
+        'billing': profile_payload['billing'],
         'items': [item.to_dict()]
     }
+    return item, payment_data
 
-    return transaction.create(payment_data)
+
+def _save_one_click_payment(pagarme_transaction: dict, payment_data: dict, item: PagarmeItemConfig,
+                            django_user_id) -> PagarmePayment:
+    """
+    Save payment created on one click buy without validating it again, since payment data was built locally.
+    In case a postback has already saved the payment, the existing one is returned.
+    Listeners are called only after payment is committed, so a failing listener can't roll back a charged payment
+    """
+    payment = PagarmePayment(
+        payment_method=CREDIT_CARD,
+        transaction_id=str(pagarme_transaction['id']),
+        amount=payment_data['amount'],
+        card_id=payment_data['card_id'],
+        card_last_digits=pagarme_transaction.get('card_last_digits'),
+        installments=pagarme_transaction['installments'],
+        user_id=django_user_id,
+        account=item.account,
+    )
+    try:
+        with django_transaction.atomic():
+            payment.save()
+            PagarmePaymentItem.objects.create(payment=payment, item_id=item.id)
+            _create_notification(payment.id, pagarme_transaction['status'])
+    except IntegrityError:
+        return find_payment_by_transaction(payment.transaction_id)
+    _notify_payment_status_changed(payment.id)
+    return payment
 
 
 def is_payment_config_item_available(payment_item_config: PagarmeItemConfig, request) -> bool:
@@ -395,58 +1112,225 @@ def _save_plan(instance: Plan, plan_in_pagarme: dict) -> Plan:
     return instance
 
 
-def _remove_orphan_plans(all_plans: list) -> None:
+def _remove_orphan_plans(all_plans: list, account: str = DEFAULT_ACCOUNT) -> None:
     plans_ids = [str(p['id']) for p in all_plans]
-    for p in Plan.objects.all():
+    for p in Plan.objects.filter(account=account):
         if p.pagarme_id not in plans_ids:
             p.delete()
 
 
-def synchronize_plans():
-    plans_to_sync = plan.find_all()
-    count = 0
+def synchronize_plans(account: str = None):
+    """
+    Create, update and remove plans according to plans registered on Pagarme
+    :param account: Pagarme account to be synchronized, all configured accounts if None
+    """
+    accounts = list_accounts() if account is None else [account]
+    for account in accounts:
+        _synchronize_plans(get_client(account).find_all_plans(), account)
+
+
+def _synchronize_plans(plans_to_sync: list, account: str = DEFAULT_ACCOUNT) -> None:
     total = len(plans_to_sync)
     logger.info('Iniciando sincronia de planos...')
     for n, p in enumerate(plans_to_sync):
         logger.info(f'Sincronizando plano {n + 1} de {total}...')
         try:
-            pagarme_plan = Plan.objects.get(pagarme_id=p['id'])
+            pagarme_plan = Plan.objects.get(pagarme_id=p['id'], account=account)
             logger.info(f'Plano {p["name"]} atualizado!')
         except Plan.DoesNotExist:
-            pagarme_plan = Plan()
+            pagarme_plan = Plan(account=account)
             logger.info(f'Plano {p["name"]} criado!')
         finally:
             _save_plan(pagarme_plan, p)
 
-    _remove_orphan_plans(plans_to_sync)
+    _remove_orphan_plans(plans_to_sync, account)
     logger.info('Sincronia de planos concluída!')
 
 
 def list_plans() -> List[Plan]:
-    return list(Plan.objects.filter().all())
+    return list(Plan.objects.using(_read_database()).all())
 
 
 def get_plan(slug: str) -> Plan:
-    return Plan.objects.filter(slug=slug).get()
+    return Plan.objects.using(_read_database()).filter(slug=slug).get()
+
+
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_catalog_version() -> CatalogVersion:
+    """
+    Current catalog version, changed whenever a payment item, payment config or plan is saved or deleted.
+    It's read from cache, so it can be checked on every request to answer conditional requests
+    :return: CatalogVersion with version number and modification datetime
+    """
+    return CatalogVersion.current()
+
+
+def get_catalog() -> dict:
+    """
+    Catalog of payment items, with their payment configs and installments, and plans, ready to be serialized as JSON
+    for headless checkout frontends. It's built once per catalog version and kept on cache. Items and plans whose
+    available_until has passed are left out.
+    Catalog is read from default database, so a lagging replica can't cache old data for a new version
+    :return: dict with keys version, items and plans
+    """
+    catalog = _cached_catalog(get_catalog_version())
+    now = timezone.now()
+    return {
+        'version': catalog['version'],
+        'items': [item for item in catalog['items'] if _is_catalog_entry_available(item, now)],
+        'plans': [plan for plan in catalog['plans'] if _is_catalog_entry_available(plan, now)],
+    }
+
+
+def get_catalog_etag() -> str:
+    """
+    ETag of catalog: its version and how many of its items and plans have expired, since expiration changes catalog
+    without changing its version. It only reads cache, so conditional requests can be answered without loading catalog
+    :return: str
+    """
+    catalog_version = get_catalog_version()
+    now = timezone.now()
+    expired = [expiration for expiration in _catalog_expirations(catalog_version) if expiration < now]
+    return f'{catalog_version.version}-{len(expired)}'
+
+
+def get_catalog_last_modified() -> datetime:
+    """
+    Last catalog change: its version modification or its last item or plan expiration
+    :return: datetime
+    """
+    catalog_version = get_catalog_version()
+    now = timezone.now()
+    expired = [expiration for expiration in _catalog_expirations(catalog_version) if expiration < now]
+    return max([catalog_version.modified, *expired])
+
+
+def _is_catalog_entry_available(entry: dict, now: datetime) -> bool:
+    return entry['available_until'] is None or now <= entry['available_until']
+
+
+def _cached_catalog(catalog_version: CatalogVersion) -> dict:
+    cache_key = catalog_cache_key(catalog_version.version)
+    catalog = cache.get(cache_key)
+    if catalog is None:
+        items = PagarmeItemConfig.objects.select_related('default_config', 'upsell').order_by('slug')
+        catalog = {
+            'version': catalog_version.version,
+            'items': [_catalog_item_dict(item) for item in items],
+            'plans': [_catalog_plan_dict(plan) for plan in Plan.objects.order_by('slug')],
+        }
+        cache.set(cache_key, catalog, CATALOG_CACHE_TIMEOUT)
+    return catalog
+
+
+def _catalog_expirations(catalog_version: CatalogVersion) -> List[datetime]:
+    """
+    available_until of all catalog items and plans, cached apart from catalog since it's read on every request
+    """
+    cache_key = catalog_expirations_cache_key(catalog_version.version)
+    expirations = cache.get(cache_key)
+    if expirations is None:
+        catalog = _cached_catalog(catalog_version)
+        expirations = sorted(
+            entry['available_until'] for entry in catalog['items'] + catalog['plans']
+            if entry['available_until'] is not None
+        )
+        cache.set(cache_key, expirations, CATALOG_CACHE_TIMEOUT)
+    return expirations
+
+
+def get_catalog_item(slug: str) -> dict:
+    """
+    Payment item of catalog
+    raise PagarmeItemConfig.DoesNotExist in case there is no item with slug
+    """
+    for item in get_catalog()['items']:
+        if item['slug'] == slug:
+            return item
+    raise PagarmeItemConfig.DoesNotExist(f'Item {slug} not found')
+
+
+def get_catalog_plan(slug: str) -> dict:
+    """
+    Plan of catalog
+    raise Plan.DoesNotExist in case there is no plan with slug
+    """
+    for plan in get_catalog()['plans']:
+        if plan['slug'] == slug:
+            return plan
+    raise Plan.DoesNotExist(f'Plan {slug} not found')
+
+
+def _catalog_item_dict(item: PagarmeItemConfig) -> dict:
+    form_config = item.default_config
+    return {
+        'slug': item.slug,
+        'name': item.name,
+        'price': item.price,
+        'tangible': item.tangible,
+        'available_until': item.available_until,
+        'upsell': item.upsell.slug if item.upsell is not None else None,
+        'encryption_key': encryption_key(item.account),
+        'checkout_url': item.get_checkout_url(),
+        'capture_url_prefix': cached_reverse('django_pagarme:capture', slug=item.slug, token='f')[:-1],
+        'postback_url': postback_url(item.slug),
+        'form_config': {
+            'max_installments': form_config.max_installments,
+            'default_installment': form_config.default_installment,
+            'free_installment': form_config.free_installment,
+            'interest_rate': form_config.interest_rate,
+            'payments_methods': form_config.payments_methods.split(','),
+        },
+        'installments': [
+            {'installments': installments, 'amount': amount, 'installment_amount': installment_amount}
+            for installments, amount, installment_amount in form_config.payment_plans(item.price)
+        ],
+    }
+
+
+def _catalog_plan_dict(plan: Plan) -> dict:
+    return {
+        'slug': plan.slug,
+        'name': plan.name,
+        'amount': plan.amount,
+        'days': plan.days,
+        'trial_days': plan.trial_days,
+        'charges': plan.charges,
+        'invoice_reminder': plan.invoice_reminder,
+        'available_until': plan.available_until,
+        'payment_methods': plan.payment_methods.split(','),
+        'encryption_key': encryption_key(plan.account),
+        'subscription_url': plan.get_absolute_url(),
+        'subscribe_url': cached_reverse('django_pagarme:subscribe', slug=plan.slug),
+        'postback_url': postback_url(plan.slug),
+    }
 
 
 def create_subscription(plan: Plan, checkout_payload: dict, django_user_id=None) -> PagarmePayment:
-    domain = settings.ALLOWED_HOSTS[0]
-    notification_path = reverse('django_pagarme:notification', kwargs={'slug': plan.slug})
-    postback_url = f'https://{domain}{notification_path}'
+    subscription_data = _subscription_request_data(plan, checkout_payload)
+    pagarme_subscription = get_client(plan.account).create_subscription(subscription_data)
+    return _save_subscription(plan, pagarme_subscription, django_user_id)
+
+
+def _subscription_request_data(plan: Plan, checkout_payload: dict) -> dict:
     subscription_data = {
         'plan_id': plan.pagarme_id,
         'customer': checkout_payload['customer'],
         'payment_method': checkout_payload['payment_method'],
-        'postback_url': postback_url,
+        'postback_url': postback_url(plan.slug),
     }
 
     if 'credit_card' in checkout_payload['payment_method']:
         subscription_data.update({'card_hash': checkout_payload['card_hash']})
+    return subscription_data
 
-    pagarme_subscription = subscription.create(subscription_data)
+
+def _save_subscription(plan: Plan, pagarme_subscription: dict, django_user_id=None) -> PagarmePayment:
     current_transaction = pagarme_subscription['current_transaction']
     payment = PagarmePayment.from_pagarme_subscription(pagarme_subscription)
+    payment.account = plan.account
 
     if django_user_id is None:
         try:
@@ -459,15 +1343,15 @@ def create_subscription(plan: Plan, checkout_payload: dict, django_user_id=None)
     if django_user_id is not None:
         current_transaction.update({'customer': pagarme_subscription['customer']})
         profile = UserPaymentProfile.from_pagarme_subscription(django_user_id, pagarme_subscription)
-        profile.save()
+        profile.upsert()
 
     payment.user_id = django_user_id
 
     subscription_data = {
         'initial_status': pagarme_subscription['status'],
         'pagarme_id': pagarme_subscription['id'],
-        'plan': plan,
-        'user': payment.user,
+        'plan_id': plan.id,
+        'user_id': payment.user_id,
         'payment_method': pagarme_subscription['payment_method'],
     }
     if pagarme_subscription['payment_method'] == CREDIT_CARD:
@@ -500,17 +1384,19 @@ def add_subscription_status_changed(listener: Callable):
 
 def find_subscription_by_id(subscription_id: str) -> Subscription:
     subscription_id = str(subscription_id)
-    return Subscription.objects.get(pagarme_id=subscription_id)
+    return Subscription.objects.select_related('plan').get(pagarme_id=subscription_id)
 
 
 def handle_subscription_notification(
         subscription_id: str, current_status: str, raw_body: str,
-        expected_signature: str, pagarme_notification_dict,
+        expected_signature: str, pagarme_notification_dict, account: str = DEFAULT_ACCOUNT,
 ) -> SubscriptionNotification:
-    if not postback.validate(expected_signature, raw_body):
+    if not get_client(account).validate_postback(expected_signature, raw_body):
         raise PaymentViolation('')
 
     subscription = find_subscription_by_id(subscription_id)
+    if subscription.plan.account != account:
+        raise PaymentViolation(f'Subscription {subscription_id} does not belong to account {account!r}')
     try:
         transaction_id = pagarme_notification_dict['subscription[current_transaction][id]']
         payment_id = PagarmePayment.objects.values_list('id').get(transaction_id=transaction_id)[0]
@@ -524,7 +1410,7 @@ def handle_subscription_notification(
         else:
             pagarme_payment.user_id = user.id
             profile = UserPaymentProfile.from_pagarme_subscription(user.id, subscription_dict)
-            profile.save()
+            profile.upsert()
 
     return _save_subscription_notification(subscription_id, current_status)
 
@@ -619,7 +1505,256 @@ def _save_subscription_notification(subscription_id, current_status):
     last_status = subscription.status
     if current_status in _impossible_subscription_states.get(last_status, {}):
         raise InvalidNotificationStatusTransition(f'Invalid transition {last_status} -> {current_status}')
-    notification = SubscriptionNotification(status=current_status, subscription=subscription).save()
+    with django_transaction.atomic():
+        notification = SubscriptionNotification.objects.create(status=current_status, subscription=subscription)
+        django_transaction.on_commit(partial(
+            DailyStatusAggregate.increment, SUBSCRIPTION_AGGREGATE, timezone.localdate(notification.creation),
+            current_status, subscription.payment_method, 1, subscription.plan.amount, plan_slug=subscription.plan.slug
+        ))
     for listener in _subscription_status_changed_listeners:
         listener(subscription_id=subscription.id)
     return notification
+
+
+REPORT_GROUPS = {
+    'item': 'items__slug',
+    'plan': 'subscription__plan__slug',
+    'payment_method': 'payment_method',
+    'status': 'last_status',
+}
+
+
+def revenue_report(group_by: Iterable[str] = ('status',), start: datetime = None, end: datetime = None,
+                   statuses: Iterable[str] = None) -> List[dict]:
+    """
+    Compute payments count and amount sum grouped by any of REPORT_GROUPS keys on a single query.
+    Ex:
+        >>> revenue_report(['item', 'status'], statuses=[PAID])
+        [{'item': 'pytools', 'status': 'paid', 'count': 2, 'amount': 79400}]
+
+    Payment date is its first notification creation and status is its last notification status.
+    Payments with more than one item are counted once for each item when grouping by item
+    :param group_by: keys from REPORT_GROUPS
+    :param start: payments created on or after this datetime
+    :param end: payments created before this datetime
+    :param statuses: only payments on these status are considered
+    :return: list of dicts containing group_by keys, count and amount
+    """
+    group_by = list(group_by)
+    invalid_groups = set(group_by) - REPORT_GROUPS.keys()
+    if invalid_groups:
+        raise ValueError(f'Invalid report groups: {", ".join(sorted(invalid_groups))}')
+    payments = PagarmePayment.objects.using(_read_database()).annotate(last_status=last_payment_status_subquery())
+    if start is not None or end is not None:
+        payments = payments.annotate(created=first_payment_notification_subquery())
+    if start is not None:
+        payments = payments.filter(created__gte=start)
+    if end is not None:
+        payments = payments.filter(created__lt=end)
+    if statuses is not None:
+        payments = payments.filter(last_status__in=list(statuses))
+    paths = [REPORT_GROUPS[group] for group in group_by]
+    rows = payments.order_by().values(*paths).annotate(count=Count('id'), amount=Sum('amount')).order_by(*paths)
+    return [
+        {**{group: row[path] for group, path in zip(group_by, paths)}, 'count': row['count'], 'amount': row['amount']}
+        for row in rows
+    ]
+
+
+PAYMENT_EXPORT_FIELDS = (
+    'id', 'transaction_id', 'payment_method', 'amount', 'installments', 'card_last_digits', 'boleto_url',
+    'user_id', 'subscription_id', 'item', 'status', 'created',
+)
+NOTIFICATION_EXPORT_FIELDS = ('id', 'payment_id', 'transaction_id', 'status', 'creation')
+ARCHIVED_NOTIFICATION_EXPORT_FIELDS = NOTIFICATION_EXPORT_FIELDS + ('archived',)
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+class _Echo:
+    """
+    File like object returning what is written, so csv.writer can be used to generate lines
+    """
+
+    def write(self, value):
+        return value
+
+
+def _export_lines(rows: Iterator[dict], fields: Iterable[str], export_format: str) -> Iterator[str]:
+    if export_format == 'csv':
+        return _csv_lines(rows, fields)
+    elif export_format == 'jsonl':
+        return (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+    raise ValueError(f'Invalid export format {export_format}. Choices: {", ".join(EXPORT_FORMATS)}')
+
+
+def _csv_lines(rows: Iterator[dict], fields: Iterable[str]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def export_payments(payments: QuerySet = None, export_format: str = 'csv', chunk_size: int = 2000) -> Iterator[str]:
+    """
+    Generate payments export lines with constant memory, fetching rows in chunks from server side cursor.
+    There is one line for each payment item, containing payment data, item slug, last status and creation
+    :param payments: PagarmePayment queryset to be exported. All payments are exported if it is None
+    :param export_format: csv or jsonl
+    :param chunk_size: number of rows fetched from database each time
+    :return: generator of str lines
+    """
+    if payments is None:
+        payments = PagarmePayment.objects.using(_read_database())
+    rows = payments.annotate(
+        item=F('items__slug'),
+        status=last_payment_status_subquery(),
+        created=first_payment_notification_subquery(),
+    ).order_by('id').values(*PAYMENT_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    return _export_lines(rows, PAYMENT_EXPORT_FIELDS, export_format)
+
+
+def export_notifications(notifications: QuerySet = None, export_format: str = 'csv', chunk_size: int = 2000,
+                         include_archived: bool = False) -> Iterator[str]:
+    """
+    Generate payment notifications export lines with constant memory, fetching rows in chunks from server side cursor.
+    Notifications moved by archive_notifications are only exported if include_archived is True. In that case they
+    come after notifications table rows, an extra archived column tells them apart, and their ids come from archive
+    table sequence
+    :param notifications: PagarmeNotification queryset to be exported. All notifications are exported if it is None
+    :param export_format: csv or jsonl
+    :param chunk_size: number of rows fetched from database each time
+    :param include_archived: export archived notifications too. If notifications is given, archived notifications of
+    same payments are exported
+    :return: generator of str lines
+    """
+    if notifications is None:
+        notifications = PagarmeNotification.objects.using(_read_database())
+        archived_notifications = ArchivedPagarmeNotification.objects.using(_read_database())
+    else:
+        archived_notifications = ArchivedPagarmeNotification.objects.using(notifications.db).filter(
+            payment_id__in=notifications.values('payment_id')
+        )
+    rows = _notification_export_rows(notifications, chunk_size)
+    if not include_archived:
+        return _export_lines(rows, NOTIFICATION_EXPORT_FIELDS, export_format)
+    archived_rows = _notification_export_rows(archived_notifications, chunk_size)
+    return _export_lines(
+        chain(
+            (dict(row, archived=False) for row in rows),
+            (dict(row, archived=True) for row in archived_rows),
+        ),
+        ARCHIVED_NOTIFICATION_EXPORT_FIELDS,
+        export_format
+    )
+
+
+def _notification_export_rows(notifications: QuerySet, chunk_size: int) -> Iterator[dict]:
+    return notifications.annotate(
+        transaction_id=F('payment__transaction_id')
+    ).order_by('id').values(*NOTIFICATION_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def list_daily_aggregates(start=None, end=None, kind: str = None) -> List[DailyStatusAggregate]:
+    """
+    List daily status aggregates, useful for dashboards since no notification table is scanned
+    :param start: first day, inclusive
+    :param end: last day, inclusive
+    :param kind: PAYMENT_AGGREGATE or SUBSCRIPTION_AGGREGATE. Both are listed if None
+    :return: list of DailyStatusAggregate
+    """
+    aggregates = DailyStatusAggregate.objects.using(_read_database())
+    if start is not None:
+        aggregates = aggregates.filter(day__gte=start)
+    if end is not None:
+        aggregates = aggregates.filter(day__lte=end)
+    if kind is not None:
+        aggregates = aggregates.filter(kind=kind)
+    return list(aggregates)
+
+
+def rebuild_daily_aggregates(batch_size: int = 10000) -> None:
+    """
+    Rebuild DailyStatusAggregate table from notifications history, aggregating notifications on database in batches
+    of batch_size ids. Notifications saved during rebuild may be counted twice, so it should run while postbacks are
+    not being processed
+    :param batch_size: number of notifications ids aggregated on each query
+    """
+    DailyStatusAggregate.objects.all().delete()
+    payment_groups = {
+        'item_slug': F('payment__items__slug'),
+        'plan_slug': F('payment__subscription__plan__slug'),
+        'payment_method': F('payment__payment_method'),
+    }
+    for notifications in [PagarmeNotification.objects.all(), ArchivedPagarmeNotification.objects.all()]:
+        _rebuild_aggregates(PAYMENT_AGGREGATE, notifications, payment_groups, 'payment__amount', batch_size)
+    subscription_groups = {
+        'plan_slug': F('subscription__plan__slug'),
+        'payment_method': F('subscription__payment_method'),
+    }
+    for notifications in [SubscriptionNotification.objects.all(), ArchivedSubscriptionNotification.objects.all()]:
+        _rebuild_aggregates(
+            SUBSCRIPTION_AGGREGATE, notifications, subscription_groups, 'subscription__plan__amount', batch_size
+        )
+
+
+def _rebuild_aggregates(kind: str, notifications: QuerySet, groups: dict, amount_path: str, batch_size: int) -> None:
+    max_id = notifications.aggregate(max_id=Max('id'))['max_id'] or 0
+    for first_id in range(0, max_id + 1, batch_size):
+        rows = notifications.filter(id__gte=first_id, id__lt=first_id + batch_size).annotate(
+            day=TruncDate('creation'), **groups
+        ).order_by().values('day', 'status', *groups).annotate(count=Count('id'), amount=Sum(amount_path))
+        with django_transaction.atomic():
+            for row in rows:
+                DailyStatusAggregate.increment(kind, **row)
+        logger.info(f'Agregados de {kind} reconstruídos até id {min(first_id + batch_size, max_id)} de {max_id}')
+
+
+PAYMENT_TERMINAL_STATUSES = (PAID, REFUNDED, REFUSED)
+SUBSCRIPTION_TERMINAL_STATUSES = (ENDED, CANCELED)
+
+
+def archive_notifications(days: int, batch_size: int = 1000) -> int:
+    """
+    Move notifications older than days to archive tables, for payments and subscriptions on terminal status.
+    First and last notifications of each payment and subscription are kept, so their creation dates and status
+    remain correct.
+    Each batch is moved on its own short transaction
+    :param days: notifications created before this number of days ago are archived
+    :param batch_size: max number of notifications moved on each transaction
+    :return: number of archived notifications
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    archived = _archive_notifications(
+        PagarmeNotification, ArchivedPagarmeNotification, 'payment', PAYMENT_TERMINAL_STATUSES, cutoff, batch_size
+    )
+    archived += _archive_notifications(
+        SubscriptionNotification, ArchivedSubscriptionNotification, 'subscription', SUBSCRIPTION_TERMINAL_STATUSES,
+        cutoff, batch_size
+    )
+    return archived
+
+
+def _archive_notifications(model, archive_model, fk_name: str, terminal_statuses, cutoff: datetime,
+                           batch_size: int) -> int:
+    fk_id = f'{fk_name}_id'
+    latest = model.objects.filter(**{fk_id: OuterRef(fk_id)}).order_by('-creation', '-id')
+    # first notification creation is used as payment creation date on reports and exports
+    earliest = model.objects.filter(**{fk_id: OuterRef(fk_id)}).order_by('creation', 'id')
+    candidates = model.objects.filter(creation__lt=cutoff).annotate(
+        latest_id=Subquery(latest.values('id')[:1]),
+        latest_status=Subquery(latest.values('status')[:1]),
+        earliest_id=Subquery(earliest.values('id')[:1]),
+    ).filter(latest_status__in=terminal_statuses).exclude(id=F('latest_id')).exclude(id=F('earliest_id')).order_by('id')
+    archived = 0
+    last_id = 0
+    while True:
+        ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return archived
+        with django_transaction.atomic():
+            notifications = model.objects.filter(id__in=ids).values('creation', 'status', fk_id)
+            archive_model.objects.bulk_create(archive_model(**notification) for notification in notifications)
+            model.objects.filter(id__in=ids).delete()
+        archived += len(ids)
+        last_id = ids[-1]
+        logger.info(f'{archived} notificações de {fk_name} arquivadas')
@@ -1,10 +1,24 @@
 from django import forms
+from django.core import validators
 from phonenumber_field.formfields import PhoneNumberField
 
+from django_pagarme.phone import to_phone_number
+
+
+class CachedPhoneNumberField(PhoneNumberField):
+    """
+    PhoneNumberField caching parsing of repeated inputs
+    """
+
+    def to_python(self, value):
+        if value in validators.EMPTY_VALUES:
+            return self.empty_value
+        return to_phone_number(forms.CharField.to_python(self, value), region=self.region)
+
 
 class ContactForm(forms.Form):
     name = forms.CharField(max_length=64, label='Nome Completo')
     email = forms.EmailField()
-    phone = PhoneNumberField(
+    phone = CachedPhoneNumberField(
         label='Celular. Ex: (12) 98765-4321 ',
         widget=forms.TextInput(attrs={'placeholder': '(XX) XXXXX-XXXX'}))
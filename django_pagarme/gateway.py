@@ -0,0 +1,243 @@
+"""
+Pagarme gateway clients, one per account.
+Default account ('') uses settings.CHAVE_PAGARME_API_PRIVADA and settings.CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA. Other
+accounts are configured on settings.DJANGO_PAGARME_ACCOUNTS, mapping account name to its keys:
+
+    DJANGO_PAGARME_ACCOUNTS = {
+        'loja2': {'CHAVE_PAGARME_API_PRIVADA': '...', 'CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA': '...'},
+    }
+
+Each client has its own authenticated HTTP session, so connections are pooled per account and no process wide api key
+is shared among accounts, as happens with pagarme SDK modules. The SDK is only imported when first client is created.
+
+Async clients (get_async_client) do the same requests with httpx, an optional dependency (pip install
+django_pagarme[async]). Without it, async clients run synchronous clients calls on a thread pool.
+"""
+import asyncio
+import hmac
+import re
+import threading
+import weakref
+from hashlib import sha1
+from typing import List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_ACCOUNT = ''
+GATEWAY_POOL_SIZE = 10
+API_URL = 'https://api.pagar.me/1'
+# Same retry policy of pagarme SDK session: connection errors are always retried, error statuses only on GET
+ASYNC_GATEWAY_RETRIES = 3
+ASYNC_GATEWAY_BACKOFF = 0.3
+ASYNC_GATEWAY_RETRY_STATUSES = (500, 502, 504)
+ASYNC_GATEWAY_TIMEOUT = 60
+
+API_KEY = 'CHAVE_PAGARME_API_PRIVADA'
+ENCRYPTION_KEY = 'CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA'
+# Optional, api key is used to validate postbacks signatures when it is absent
+POSTBACK_KEY = 'CHAVE_PAGARME_POSTBACK'
+
+_GATEWAY_SETTINGS = {
+    API_KEY, ENCRYPTION_KEY, POSTBACK_KEY, 'DJANGO_PAGARME_ACCOUNTS', 'DJANGO_PAGARME_GATEWAY_POOL_SIZE',
+}
+
+
+class PagarmeClient:
+    """
+    Pagarme API client bound to a single account
+    """
+
+    def __init__(self, api_key: str, postback_key: str = None, pool_size: int = GATEWAY_POOL_SIZE) -> None:
+        from pagarme.resources.handler_request import validate_response
+        from pagarme.resources.requests_retry import requests_retry_session
+        from requests.adapters import HTTPAdapter
+
+        self.postback_key = postback_key or api_key
+        self._validate_response = validate_response
+        session = requests_retry_session()
+        retry = session.get_adapter(API_URL).max_retries
+        session.mount('https://', HTTPAdapter(max_retries=retry, pool_maxsize=pool_size))
+        session.auth = (api_key, '')
+        self._session = session
+
+    def _request(self, method: str, path: str, data: dict = None):
+        response = self._session.request(method, f'{API_URL}/{path}', json={} if data is None else data)
+        return self._validate_response(response)
+
+    def find_transaction(self, transaction_id) -> dict:
+        return self._request('GET', f'transactions/{transaction_id}')
+
+    def create_transaction(self, data: dict) -> dict:
+        return self._request('POST', 'transactions', data)
+
+    def capture_transaction(self, transaction_id, data: dict) -> dict:
+        return self._request('POST', f'transactions/{transaction_id}/capture', data)
+
+    def refund_transaction(self, transaction_id, data: dict) -> dict:
+        return self._request('POST', f'transactions/{transaction_id}/refund', data)
+
+    def find_all_plans(self) -> list:
+        return self._request('GET', 'plans')
+
+    def find_plans(self, search_params: dict) -> list:
+        return self._request('GET', 'plans', search_params)
+
+    def create_subscription(self, data: dict) -> dict:
+        return self._request('POST', 'subscriptions', data)
+
+    def validate_postback(self, signature: str, payload: str) -> bool:
+        """
+        Check postback X-Hub-Signature header against HMAC SHA1 of payload signed with account key
+        """
+        if not self.postback_key:
+            raise ImproperlyConfigured('Missing Pagarme key to validate postbacks')
+        hashed = hmac.new(self.postback_key.encode(), payload.encode('utf-8'), sha1)
+        return hmac.compare_digest(hashed.hexdigest().encode(), re.sub('sha1=', '', signature).encode())
+
+
+class AsyncPagarmeClient:
+    """
+    Async Pagarme API client bound to a single account, with the same api methods of PagarmeClient as coroutines.
+    Requests are done by httpx, so in flight calls don't hold threads
+    """
+
+    def __init__(self, api_key: str, pool_size: int = GATEWAY_POOL_SIZE) -> None:
+        import httpx
+        from pagarme.resources.handler_request import error
+        from pagarme.resources.requests_retry import headers
+
+        self._error = error
+        self._client = httpx.AsyncClient(
+            auth=(api_key, ''), headers=headers(), timeout=ASYNC_GATEWAY_TIMEOUT, transport=self._transport(pool_size)
+        )
+
+    def _transport(self, pool_size: int):
+        import httpx
+
+        return httpx.AsyncHTTPTransport(retries=ASYNC_GATEWAY_RETRIES, limits=httpx.Limits(max_connections=pool_size))
+
+    async def _request(self, method: str, path: str, data: dict = None):
+        for attempt in range(ASYNC_GATEWAY_RETRIES + 1):
+            response = await self._client.request(method, f'{API_URL}/{path}', json={} if data is None else data)
+            if method != 'GET' or response.status_code not in ASYNC_GATEWAY_RETRY_STATUSES:
+                break
+            if attempt < ASYNC_GATEWAY_RETRIES:
+                await asyncio.sleep(ASYNC_GATEWAY_BACKOFF * 2 ** attempt)
+        if response.is_success:
+            return response.json()
+        return self._error(response.json())
+
+    async def find_transaction(self, transaction_id) -> dict:
+        return await self._request('GET', f'transactions/{transaction_id}')
+
+    async def create_transaction(self, data: dict) -> dict:
+        return await self._request('POST', 'transactions', data)
+
+    async def capture_transaction(self, transaction_id, data: dict) -> dict:
+        return await self._request('POST', f'transactions/{transaction_id}/capture', data)
+
+    async def refund_transaction(self, transaction_id, data: dict) -> dict:
+        return await self._request('POST', f'transactions/{transaction_id}/refund', data)
+
+    async def find_all_plans(self) -> list:
+        return await self._request('GET', 'plans')
+
+    async def find_plans(self, search_params: dict) -> list:
+        return await self._request('GET', 'plans', search_params)
+
+    async def create_subscription(self, data: dict) -> dict:
+        return await self._request('POST', 'subscriptions', data)
+
+
+class _ThreadedAsyncPagarmeClient:
+    """
+    Async client used when httpx isn't installed: PagarmeClient api methods run on a thread pool, not blocking event
+    loop, but each in flight call holds a pool thread
+    """
+
+    def __init__(self, client: PagarmeClient) -> None:
+        self._client = client
+
+    def __getattr__(self, name):
+        return sync_to_async(getattr(self._client, name), thread_sensitive=False)
+
+
+def list_accounts() -> List[str]:
+    """
+    List configured accounts names, default account first
+    """
+    accounts = getattr(settings, 'DJANGO_PAGARME_ACCOUNTS', {})
+    return [DEFAULT_ACCOUNT] + [account for account in accounts if account != DEFAULT_ACCOUNT]
+
+
+def _account_keys(account: str) -> dict:
+    if account == DEFAULT_ACCOUNT:
+        return {key: getattr(settings, key, None) for key in (API_KEY, ENCRYPTION_KEY, POSTBACK_KEY)}
+    try:
+        return getattr(settings, 'DJANGO_PAGARME_ACCOUNTS', {})[account]
+    except KeyError:
+        raise ImproperlyConfigured(f'Pagarme account {account!r} not found on settings.DJANGO_PAGARME_ACCOUNTS')
+
+
+def encryption_key(account: str = DEFAULT_ACCOUNT) -> str:
+    """
+    Public encryption key used by checkout javascript of account
+    """
+    return _account_keys(account)[ENCRYPTION_KEY]
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(account: str = DEFAULT_ACCOUNT) -> PagarmeClient:
+    """
+    Client of account, created on first use and reused afterwards
+    raises ImproperlyConfigured in case account is not configured
+    :param account: account name, default account if empty
+    :return: PagarmeClient
+    """
+    try:
+        return _clients[account]
+    except KeyError:
+        pass
+    with _clients_lock:
+        if account not in _clients:
+            keys = _account_keys(account)
+            pool_size = getattr(settings, 'DJANGO_PAGARME_GATEWAY_POOL_SIZE', GATEWAY_POOL_SIZE)
+            _clients[account] = PagarmeClient(keys[API_KEY], keys.get(POSTBACK_KEY), pool_size)
+        return _clients[account]
+
+
+# httpx connections are bound to the event loop they were opened on, so async clients are kept by loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client(account: str = DEFAULT_ACCOUNT):
+    """
+    Async client of account for running event loop, created on first use and reused afterwards
+    raises ImproperlyConfigured in case account is not configured
+    :param account: account name, default account if empty
+    :return: AsyncPagarmeClient, or a client running PagarmeClient on a thread pool if httpx isn't installed
+    """
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if account not in clients:
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            clients[account] = _ThreadedAsyncPagarmeClient(get_client(account))
+        else:
+            pool_size = getattr(settings, 'DJANGO_PAGARME_GATEWAY_POOL_SIZE', GATEWAY_POOL_SIZE)
+            clients[account] = AsyncPagarmeClient(_account_keys(account)[API_KEY], pool_size)
+    return clients[account]
+
+
+@receiver(setting_changed)
+def _clear_clients(setting, **kwargs):
+    if setting in _GATEWAY_SETTINGS:
+        _clients.clear()
+        _async_clients.clear()
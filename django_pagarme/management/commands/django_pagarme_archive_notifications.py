@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from django_pagarme.facade import archive_notifications
+
+
+class Command(BaseCommand):
+    help = 'Arquiva notificações antigas de pagamentos e assinaturas em status final'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Arquiva notificações mais antigas que esses dias')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Notificações movidas por transação')
+
+    def handle(self, *args, **options):
+        archived = archive_notifications(options['days'], options['batch_size'])
+        self.stdout.write(f'{archived} notificações arquivadas')
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_pagarme.facade import contact_info_metrics, deliver_contact_info_events, purge_contact_info_events
+
+
+class Command(BaseCommand):
+    help = 'Entrega eventos de contato pendentes aos listeners, em lotes, e apaga eventos antigos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Eventos entregues por lote')
+        parser.add_argument('--loop', action='store_true', help='Continua esperando novos eventos')
+        parser.add_argument('--interval', type=float, default=5, help='Segundos entre verificações com --loop')
+        parser.add_argument(
+            '--retention-days', type=int, default=None,
+            help='Dias que eventos entregues são mantidos. Padrão é DJANGO_PAGARME_CONTACT_INFO_RETENTION_DAYS'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = 0
+            while True:
+                batch_delivered = deliver_contact_info_events(options['batch_size'])
+                delivered += batch_delivered
+                if batch_delivered < options['batch_size']:
+                    break
+            purged = purge_contact_info_events(options['retention_days'])
+            metrics = contact_info_metrics()
+            self.stdout.write(
+                f'{delivered} eventos entregues, {metrics["queue_depth"]} pendentes, {metrics["failed"]} com falha, '
+                f'{purged} apagados, latência média {metrics["average_latency_seconds"]:.1f}s'
+            )
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from django_pagarme.facade import EXPORT_FORMATS, export_notifications, export_payments
+
+_EXPORTERS = {
+    'payments': export_payments,
+    'notifications': export_notifications,
+}
+
+
+class Command(BaseCommand):
+    help = 'Exporta pagamentos ou notificações em CSV ou JSON Lines com uso de memória constante'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(_EXPORTERS), help='Dados a serem exportados')
+        parser.add_argument('--format', default='csv', choices=EXPORT_FORMATS, dest='export_format')
+        parser.add_argument('--output', help='Arquivo de saída. Se omitido, a saída padrão é usada')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Linhas buscadas do banco por vez')
+        parser.add_argument(
+            '--include-archived', action='store_true',
+            help='Exporta também as notificações arquivadas. Válido apenas para notifications'
+        )
+
+    def handle(self, *args, **options):
+        kwargs = {'export_format': options['export_format'], 'chunk_size': options['chunk_size']}
+        if options['kind'] == 'notifications':
+            kwargs['include_archived'] = options['include_archived']
+        lines = _EXPORTERS[options['kind']](**kwargs)
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
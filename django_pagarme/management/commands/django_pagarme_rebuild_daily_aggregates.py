@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from django_pagarme.facade import rebuild_daily_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói agregados diários de pagamentos e assinaturas a partir do histórico de notificações'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Ids de notificações agregados por vez')
+
+    def handle(self, *args, **options):
+        rebuild_daily_aggregates(options['batch_size'])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_pagarme.facade import REFUND_MANY_MAX_WORKERS, refund_payments
+from django_pagarme.models import PagarmePayment
+
+
+class Command(BaseCommand):
+    help = (
+        'Estorna pagamentos em lotes. Só pagamentos autorizados ou pagos são processados, então o comando pode ser '
+        'interrompido e executado novamente, continuando de onde parou'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--item', help='Slug do item de pagamento cujos pagamentos serão estornados')
+        parser.add_argument('--transactions', nargs='+', help='Ids de transação dos pagamentos a serem estornados')
+        parser.add_argument(
+            '--all', action='store_true', help='Estorna todos os pagamentos. Obrigatório sem --item e --transactions'
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='Pagamentos estornados por lote')
+        parser.add_argument(
+            '--max-workers', type=int, default=REFUND_MANY_MAX_WORKERS, help='Requisições simultâneas ao Pagarme'
+        )
+
+    def handle(self, *args, **options):
+        if not (options['item'] or options['transactions'] or options['all']):
+            raise CommandError('Informe --item, --transactions ou --all para estornar todos os pagamentos')
+        payments = PagarmePayment.objects.all()
+        if options['item']:
+            payments = payments.filter(items__slug=options['item'])
+        if options['transactions']:
+            payments = payments.filter(transaction_id__in=options['transactions'])
+        refunded = errors = 0
+        for results in refund_payments(payments, options['batch_size'], options['max_workers']):
+            for transaction_id, result in results.items():
+                if isinstance(result, Exception):
+                    errors += 1
+                    self.stderr.write(f'Erro ao estornar transação {transaction_id}: {result!r}')
+                else:
+                    refunded += 1
+            self.stdout.write(f'{refunded} estornos solicitados, {errors} erros')
@@ -0,0 +1,33 @@
+import csv
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from django_pagarme.facade import REPORT_GROUPS, revenue_report
+
+
+def _aware_datetime(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+class Command(BaseCommand):
+    help = 'Gera relatório CSV de faturamento agrupado por item, plano, meio de pagamento e/ou status'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group-by', nargs='+', default=['status'], choices=list(REPORT_GROUPS), help='Agrupamentos do relatório'
+        )
+        parser.add_argument('--start', type=_aware_datetime, help='Data inicial inclusiva. Ex: 2020-01-01')
+        parser.add_argument('--end', type=_aware_datetime, help='Data final exclusiva. Ex: 2020-02-01')
+        parser.add_argument('--status', nargs='+', dest='statuses', help='Considerar apenas esses status')
+
+    def handle(self, *args, **options):
+        group_by = options['group_by']
+        rows = revenue_report(group_by, options['start'], options['end'], options['statuses'])
+        writer = csv.DictWriter(self.stdout, fieldnames=group_by + ['count', 'amount'])
+        writer.writeheader()
+        writer.writerows(rows)
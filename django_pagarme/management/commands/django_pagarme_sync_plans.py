@@ -6,5 +6,10 @@ from django_pagarme.facade import synchronize_plans
 class Command(BaseCommand):
     help = 'Sincroniza planos cadastrados no Pagar.me'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account', default=None, help='Conta Pagar.me a ser sincronizada. Todas as contas configuradas se omitida'
+        )
+
     def handle(self, *args, **options):
-        synchronize_plans()
+        synchronize_plans(options['account'])
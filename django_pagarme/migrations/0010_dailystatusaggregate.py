@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pagarme', '0009_auto_20201007_1309'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStatusAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('payment', 'Pagamento'), ('subscription', 'Assinatura')], max_length=12)),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('item_slug', models.CharField(blank=True, default='', max_length=128, verbose_name='Item')),
+                ('plan_slug', models.CharField(blank=True, default='', max_length=128, verbose_name='Plano')),
+                ('payment_method', models.CharField(blank=True, default='', max_length=11)),
+                ('status', models.CharField(max_length=30)),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Quantidade')),
+                ('amount', models.BigIntegerField(default=0, verbose_name='Valor em Centavos')),
+            ],
+            options={
+                'verbose_name': 'Agregado Diário',
+                'verbose_name_plural': 'Agregados Diários',
+                'ordering': ('-day',),
+                'unique_together': {('kind', 'day', 'item_slug', 'plan_slug', 'payment_method', 'status')},
+            },
+        ),
+    ]
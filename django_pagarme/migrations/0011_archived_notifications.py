@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pagarme', '0010_dailystatusaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPagarmeNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation', models.DateTimeField()),
+                ('status', models.CharField(max_length=30)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to='django_pagarme.PagarmePayment')),
+            ],
+            options={
+                'verbose_name': 'Notificação de Pagamento Arquivada',
+                'verbose_name_plural': 'Notificações de Pagamento Arquivadas',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSubscriptionNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation', models.DateTimeField()),
+                ('status', models.CharField(max_length=30)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to='django_pagarme.Subscription')),
+            ],
+            options={
+                'verbose_name': 'Notificação de Assinatura Arquivada',
+                'verbose_name_plural': 'Notificações de Assinatura Arquivadas',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyOnPostgres(migrations.AddIndex):
+    """
+    Index built with CREATE INDEX CONCURRENTLY on Postgres, so writes on big notification tables aren't locked while
+    it's built. Other databases get a regular index creation. django.contrib.postgres is only imported on Postgres,
+    since it requires psycopg
+    """
+
+    def _operation(self, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            from django.contrib.postgres.operations import AddIndexConcurrently
+            return AddIndexConcurrently(self.model_name, self.index)
+        return migrations.AddIndex(self.model_name, self.index)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._operation(schema_editor).database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._operation(schema_editor).database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('django_pagarme', '0011_archived_notifications'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='pagarmenotification',
+            index=models.Index(fields=['payment', '-creation', '-id'], name='notification_payment_last'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='subscriptionnotification',
+            index=models.Index(fields=['subscription', '-creation', '-id'], name='notification_subscrip_last'),
+        ),
+    ]
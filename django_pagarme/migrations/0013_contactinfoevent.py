@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('django_pagarme', '0012_notification_last_status_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactInfoEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128)),
+                ('email', models.CharField(max_length=64)),
+                ('phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region=None)),
+                ('payment_item_slug', models.CharField(max_length=128)),
+                ('creation', models.DateTimeField(auto_now_add=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Entregue em')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Evento de Contato',
+                'verbose_name_plural': 'Eventos de Contato',
+                'ordering': ('-id',),
+                'indexes': [models.Index(fields=['delivered_at', 'id'], name='contact_event_pending')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+import django_pagarme.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pagarme', '0013_contactinfoevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userpaymentprofile',
+            name='phone',
+            field=django_pagarme.models.CachedPhoneNumberField(max_length=128, region=None),
+        ),
+        migrations.AlterField(
+            model_name='contactinfoevent',
+            name='phone',
+            field=django_pagarme.models.CachedPhoneNumberField(max_length=128, region=None),
+        ),
+    ]
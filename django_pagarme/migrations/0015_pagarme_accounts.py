@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pagarme', '0014_cached_phone_number_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagarmeitemconfig',
+            name='account',
+            field=models.CharField(
+                blank=True, default='',
+                help_text='Vazio para a conta padrão. Demais contas são configuradas em settings.DJANGO_PAGARME_ACCOUNTS',
+                max_length=64, verbose_name='Conta Pagar.me'
+            ),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='account',
+            field=models.CharField(
+                blank=True, default='',
+                help_text='Vazio para a conta padrão. Demais contas são configuradas em settings.DJANGO_PAGARME_ACCOUNTS',
+                max_length=64, verbose_name='Conta Pagar.me'
+            ),
+        ),
+        migrations.AddField(
+            model_name='pagarmepayment',
+            name='account',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Conta Pagar.me'),
+        ),
+    ]
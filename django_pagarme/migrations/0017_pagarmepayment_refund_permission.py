@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pagarme', '0016_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='pagarmepayment',
+            options={
+                'ordering': ('-id',),
+                'permissions': [('refund_pagarmepayment', 'Pode estornar pagamento')],
+                'verbose_name': 'Pagamento',
+                'verbose_name_plural': 'Pagamentos',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_pagarme', '0017_pagarmepayment_refund_permission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactinfoevent',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Reservado em'),
+        ),
+    ]
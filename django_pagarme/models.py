@@ -2,12 +2,41 @@ from math import ceil
 from types import GeneratorType
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
-from phonenumber_field.modelfields import PhoneNumberField
+from phonenumber_field.modelfields import PhoneNumberDescriptor, PhoneNumberField
+
+from django_pagarme.phone import to_phone_number
+
+
+class _CachedPhoneNumberDescriptor(PhoneNumberDescriptor):
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.name] = to_phone_number(value, region=self.field.region)
+
+
+class CachedPhoneNumberField(PhoneNumberField):
+    """
+    PhoneNumberField caching parsing of repeated values, both assigned and loaded from database.
+    Stored values are the same as PhoneNumberField ones
+    """
+    descriptor_class = _CachedPhoneNumberDescriptor
+
+    def from_db_value(self, value, expression, connection):
+        return to_phone_number(value)
+
+    def formfield(self, **kwargs):
+        from django_pagarme.forms import CachedPhoneNumberField as CachedPhoneNumberFormField
+
+        kwargs.setdefault('form_class', CachedPhoneNumberFormField)
+        return super().formfield(**kwargs)
+
 
 one_year_installments_validators = [MaxValueValidator(12), MinValueValidator(1)]
 
@@ -17,6 +46,25 @@ CREDIT_CARD_AND_BOLETO = f'{CREDIT_CARD},{BOLETO}'
 NORMALIZED_BRAZIL_CODE = {'Brasil': 'br'}
 
 
+def payment_profile_cache_key(user_id) -> str:
+    return f'django_pagarme:payment_profile:{user_id}'
+
+
+CATALOG_VERSION_CACHE_KEY = 'django_pagarme:catalog_version'
+
+
+def catalog_cache_key(version: int) -> str:
+    return f'django_pagarme:catalog:{version}'
+
+
+def catalog_expirations_cache_key(version: int) -> str:
+    return f'django_pagarme:catalog:{version}:expirations'
+
+
+def payment_item_cache_key(version: int, slug: str) -> str:
+    return f'django_pagarme:catalog:{version}:item:{slug}'
+
+
 class PagarmeFormConfig(models.Model):
     name = models.CharField(max_length=128)
     max_installments = models.IntegerField(default=12, validators=one_year_installments_validators)
@@ -78,6 +126,10 @@ class PagarmeItemConfig(models.Model):
     default_config = models.ForeignKey(PagarmeFormConfig, on_delete=models.CASCADE, related_name='payment_items')
     upsell = models.ForeignKey('self', on_delete=models.DO_NOTHING, null=True, default=None, blank=True)
     available_until = models.DateTimeField('Desativado em', default=None, null=True, blank=True)
+    account = models.CharField(
+        'Conta Pagar.me', max_length=64, blank=True, default='',
+        help_text='Vazio para a conta padrão. Demais contas são configuradas em settings.DJANGO_PAGARME_ACCOUNTS'
+    )
 
     def to_dict(self, quantity=1):
         return {
@@ -137,6 +189,10 @@ class Plan(models.Model):
     invoice_reminder = models.IntegerField('Dias para aviso do vencimento do boleto', null=True, blank=True)
     available_until = models.DateTimeField('Desativado em', default=None, null=True, blank=True)
     pagarme_id = models.CharField('Id do plano no Pagar.me', max_length=255, null=True, blank=True)
+    account = models.CharField(
+        'Conta Pagar.me', max_length=64, blank=True, default='',
+        help_text='Vazio para a conta padrão. Demais contas são configuradas em settings.DJANGO_PAGARME_ACCOUNTS'
+    )
     payment_methods = models.CharField(
         'Formas de pagamento',
         max_length=len('credit_card,boleto'),
@@ -217,14 +273,17 @@ class Subscription(models.Model):
     @property
     def status(self) -> str:
         """
-        Get status from subscriptions notifications
+        Get status from subscriptions notifications.
+        If subscription was fetched with last_status annotation (see last_subscription_status_subquery)
+        no query is done
         :return: str
         """
         try:
-            current_status = self.notifications.order_by('-creation').values('status').first()['status']
-        except:
-            current_status = self.initial_status
-        return current_status
+            current_status = self.last_status
+        except AttributeError:
+            dct = self.notifications.order_by('-creation', '-id').values('status').first()
+            current_status = None if dct is None else dct['status']
+        return self.initial_status if current_status is None else current_status
 
 
 class SubscriptionNotification(models.Model):
@@ -245,11 +304,40 @@ class SubscriptionNotification(models.Model):
 
     class Meta:
         ordering = ('-creation',)
-        indexes = [models.Index(fields=('-creation', 'subscription'), name='notification_subscrip_creation')]
+        indexes = [
+            models.Index(fields=('-creation', 'subscription'), name='notification_subscrip_creation'),
+            # Used to get subscription last status
+            models.Index(fields=('subscription', '-creation', '-id'), name='notification_subscrip_last'),
+        ]
         verbose_name = 'Notificação de Assinatura'
         verbose_name_plural = 'Notificações de Assinatura'
 
 
+class ArchivedSubscriptionNotification(models.Model):
+    """
+    Old SubscriptionNotification moved out of notifications table by archival. Last notification of each subscription
+    is never archived, so Subscription.status keeps working on SubscriptionNotification only
+    """
+    creation = models.DateTimeField()
+    status = models.CharField(max_length=30)
+    subscription = models.ForeignKey(
+        Subscription, db_index=True, on_delete=models.CASCADE, related_name='archived_notifications'
+    )
+
+    class Meta:
+        verbose_name = 'Notificação de Assinatura Arquivada'
+        verbose_name_plural = 'Notificações de Assinatura Arquivadas'
+
+
+def last_subscription_status_subquery() -> Subquery:
+    """
+    Subquery to be used on Subscription querysets annotations to fetch each subscription status on same query
+    Ex: Subscription.objects.annotate(last_status=last_subscription_status_subquery())
+    """
+    notifications = SubscriptionNotification.objects.filter(subscription_id=OuterRef('pk')).order_by('-creation', '-id')
+    return Subquery(notifications.values('status')[:1])
+
+
 class PagarmePaymentItem(models.Model):
     class Meta:
         unique_together = [['payment', 'item']]
@@ -280,6 +368,7 @@ class PagarmePayment(models.Model):
     items = models.ManyToManyField(PagarmeItemConfig, through=PagarmePaymentItem, related_name='payments')
     user = models.ForeignKey(get_user_model(), db_index=True, on_delete=models.DO_NOTHING, null=True)
     subscription = models.ForeignKey(Subscription, db_index=True, on_delete=models.DO_NOTHING, null=True, related_name='payments')
+    account = models.CharField('Conta Pagar.me', max_length=64, blank=True, default='')
 
     class Meta:
         ordering = ('-id',)
@@ -288,17 +377,22 @@ class PagarmePayment(models.Model):
         ]
         verbose_name = 'Pagamento'
         verbose_name_plural = 'Pagamentos'
+        permissions = [('refund_pagarmepayment', 'Pode estornar pagamento')]
 
     def __str__(self):
         return self.transaction_id
 
     def status(self) -> str:
         """
-        Get status from payment notifications
+        Get status from payment notifications.
+        If payment was fetched with last_status annotation (see last_payment_status_subquery) no query is done
         :return: str
         """
-        dct = self.notifications.order_by('-creation').values('status').first()
-        return dct['status']
+        try:
+            return self.last_status
+        except AttributeError:
+            dct = self.notifications.order_by('-creation', '-id').values('status').first()
+            return dct['status']
 
     @classmethod
     def from_pagarme_transaction(cls, pagarme_json):
@@ -422,12 +516,52 @@ class PagarmeNotification(models.Model):
     class Meta:
         ordering = ('-creation',)
         indexes = [
-            models.Index(fields=('-creation', 'payment'), name='notification_payment_creation')
+            models.Index(fields=('-creation', 'payment'), name='notification_payment_creation'),
+            # Used to get payment last status
+            models.Index(fields=('payment', '-creation', '-id'), name='notification_payment_last'),
         ]
         verbose_name = 'Notificação de Pagamento'
         verbose_name_plural = 'Notificações de Pagamento'
 
 
+class ArchivedPagarmeNotification(models.Model):
+    """
+    Old PagarmeNotification moved out of notifications table by archival. Last notification of each payment is never
+    archived, so PagarmePayment.status() keeps working on PagarmeNotification only
+    """
+    creation = models.DateTimeField()
+    status = models.CharField(max_length=30)
+    payment = models.ForeignKey(
+        PagarmePayment, db_index=True, on_delete=models.CASCADE, related_name='archived_notifications'
+    )
+
+    class Meta:
+        verbose_name = 'Notificação de Pagamento Arquivada'
+        verbose_name_plural = 'Notificações de Pagamento Arquivadas'
+
+
+def last_payment_status_subquery() -> Subquery:
+    """
+    Subquery to be used on PagarmePayment querysets annotations to fetch each payment status on same query
+    Ex: PagarmePayment.objects.annotate(last_status=last_payment_status_subquery())
+    """
+    notifications = PagarmeNotification.objects.filter(payment_id=OuterRef('pk')).order_by('-creation', '-id')
+    return Subquery(notifications.values('status')[:1])
+
+
+def first_payment_notification_subquery() -> Subquery:
+    """
+    Subquery to be used on PagarmePayment querysets annotations to fetch each payment creation date,
+    which is its first notification creation
+    """
+    notifications = PagarmeNotification.objects.filter(payment_id=OuterRef('pk')).order_by('creation', 'id')
+    return Subquery(notifications.values('creation')[:1])
+
+
+def _prep_value(field, instance):
+    return field.get_prep_value(field.value_from_object(instance))
+
+
 class UserPaymentProfile(models.Model):
     user = models.OneToOneField(get_user_model(), primary_key=True, on_delete=models.CASCADE)
 
@@ -439,7 +573,7 @@ class UserPaymentProfile(models.Model):
     document_type = models.CharField(max_length=64, db_index=False)
     name = models.CharField(max_length=128, db_index=False)
     email = models.CharField(max_length=64, db_index=False)
-    phone = PhoneNumberField(db_index=False)
+    phone = CachedPhoneNumberField(db_index=False)
 
     # Billing Address Data
     street = models.CharField(max_length=128, db_index=False)
@@ -456,6 +590,38 @@ class UserPaymentProfile(models.Model):
         verbose_name = 'Perfil de Pagamento '
         verbose_name_plural = 'Perfis de Pagamento'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache_key = payment_profile_cache_key(self.user_id)
+        cache.delete(cache_key)
+        # Deleting again after commit, since a concurrent request may have cached the old profile before commit
+        transaction.on_commit(lambda: cache.delete(cache_key), using=self._state.db)
+
+    def upsert(self) -> bool:
+        """
+        Save profile comparing it with existing row: only changed fields are updated and nothing is written when data
+        is identical. Profile is inserted if user has none.
+        :return: True if profile was written, False otherwise
+        """
+        cls = type(self)
+        try:
+            existing = cls.objects.get(pk=self.pk)
+        except cls.DoesNotExist:
+            try:
+                with transaction.atomic():
+                    self.save(force_insert=True)
+                return True
+            except IntegrityError:  # Profile inserted concurrently, so falling back to update
+                existing = cls.objects.get(pk=self.pk)
+        changed_fields = [
+            field.attname for field in cls._meta.concrete_fields
+            if not field.primary_key and _prep_value(field, self) != _prep_value(field, existing)
+        ]
+        if not changed_fields:
+            return False
+        self.save(update_fields=changed_fields)
+        return True
+
     def to_customer_dict(self):
         phone_str = str(self.phone)
         return {
@@ -561,3 +727,139 @@ class UserPaymentProfile(models.Model):
             address_country=NORMALIZED_BRAZIL_CODE.get(address['country'], address['country']),
             card_id=card_id
         )
+
+
+PAYMENT_AGGREGATE = 'payment'
+SUBSCRIPTION_AGGREGATE = 'subscription'
+
+
+class DailyStatusAggregate(models.Model):
+    """
+    Number of payments or subscriptions reaching each status per day, item or plan and payment method.
+    It is incrementally updated every time a notification is saved and can be rebuilt from notifications history with
+    django_pagarme_rebuild_daily_aggregates command
+    """
+    kind = models.CharField(
+        max_length=max(len(PAYMENT_AGGREGATE), len(SUBSCRIPTION_AGGREGATE)),
+        choices=[
+            (PAYMENT_AGGREGATE, 'Pagamento'),
+            (SUBSCRIPTION_AGGREGATE, 'Assinatura'),
+        ]
+    )
+    day = models.DateField('Dia')
+    item_slug = models.CharField('Item', max_length=128, blank=True, default='')
+    plan_slug = models.CharField('Plano', max_length=128, blank=True, default='')
+    payment_method = models.CharField(max_length=max(len(CREDIT_CARD), len(BOLETO)), blank=True, default='')
+    status = models.CharField(max_length=30)
+    count = models.PositiveIntegerField('Quantidade', default=0)
+    amount = models.BigIntegerField('Valor em Centavos', default=0)
+
+    class Meta:
+        ordering = ('-day',)
+        unique_together = [['kind', 'day', 'item_slug', 'plan_slug', 'payment_method', 'status']]
+        verbose_name = 'Agregado Diário'
+        verbose_name_plural = 'Agregados Diários'
+
+    def __str__(self):
+        return f'{self.day} {self.kind} {self.item_slug or self.plan_slug} {self.status}'
+
+    @classmethod
+    def increment(cls, kind: str, day, status: str, payment_method: str, count: int, amount: int,
+                  item_slug: str = '', plan_slug: str = '') -> None:
+        """
+        Add count and amount to respective aggregate row, creating it if needed. Update is done on database to
+        avoid lost increments on concurrent notifications
+        """
+        aggregate, _ = cls.objects.get_or_create(
+            kind=kind, day=day, status=status, payment_method=payment_method or '', item_slug=item_slug or '',
+            plan_slug=plan_slug or ''
+        )
+        cls.objects.filter(pk=aggregate.pk).update(count=F('count') + count, amount=F('amount') + amount)
+
+
+class ContactInfoEvent(models.Model):
+    """
+    Validated contact info waiting to be delivered to contact info listeners, when their execution is deferred.
+    Events are kept after delivery, so delivery latency can be measured, until purged by purge_contact_info_events
+    """
+    name = models.CharField(max_length=128)
+    email = models.CharField(max_length=64)
+    phone = CachedPhoneNumberField()
+    payment_item_slug = models.CharField(max_length=128)
+    user = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True, blank=True)
+    creation = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField('Entregue em', null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    claimed_at = models.DateTimeField('Reservado em', null=True, blank=True)
+
+    class Meta:
+        ordering = ('-id',)
+        indexes = [models.Index(fields=['delivered_at', 'id'], name='contact_event_pending')]
+        verbose_name = 'Evento de Contato'
+        verbose_name_plural = 'Eventos de Contato'
+
+    def __str__(self):
+        return f'{self.email} {self.payment_item_slug}'
+
+    def to_listener_kwargs(self) -> dict:
+        return {
+            'name': self.name,
+            'email': self.email,
+            'phone': self.phone,
+            'payment_item_slug': self.payment_item_slug,
+            'user': self.user,
+        }
+
+
+class CatalogVersion(models.Model):
+    """
+    Single row counting changes on catalog: payment items, payment configs and plans. It's used to build ETag and
+    Last-Modified of catalog responses, so they can be checked without loading catalog itself
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Versão do Catálogo'
+        verbose_name_plural = 'Versão do Catálogo'
+
+    def __str__(self):
+        return f'{self.version}'
+
+    @classmethod
+    def current(cls) -> 'CatalogVersion':
+        """
+        Current catalog version, read from cache and from database only after it changes
+        """
+        catalog_version = cache.get(CATALOG_VERSION_CACHE_KEY)
+        if catalog_version is None:
+            catalog_version, _ = cls.objects.get_or_create(pk=1)
+            cache.set(CATALOG_VERSION_CACHE_KEY, catalog_version)
+        return catalog_version
+
+    @classmethod
+    def increment(cls) -> None:
+        """
+        Increment version with an update query, so concurrent changes are never lost
+        """
+        updated = cls.objects.filter(pk=1).update(version=F('version') + 1, modified=timezone.now())
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(pk=1, version=1)
+            except IntegrityError:  # created concurrently
+                cls.increment()
+                return
+        cache.delete(CATALOG_VERSION_CACHE_KEY)
+        # Deleting again after commit, since a concurrent request may have cached the version before commit
+        transaction.on_commit(lambda: cache.delete(CATALOG_VERSION_CACHE_KEY))
+
+
+@receiver(post_save, sender=PagarmeItemConfig)
+@receiver(post_delete, sender=PagarmeItemConfig)
+@receiver(post_save, sender=PagarmeFormConfig)
+@receiver(post_delete, sender=PagarmeFormConfig)
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def _increment_catalog_version(sender, **kwargs):
+    CatalogVersion.increment()
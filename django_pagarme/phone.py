@@ -0,0 +1,43 @@
+"""
+Memoized phone number normalization. Parsing with phonenumbers is expensive and the same numbers are parsed over and
+over, on every contact form submit and every payment profile loaded from database.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from phonenumber_field.phonenumber import PhoneNumber, to_python
+from phonenumbers.phonemetadata import PhoneMetadata
+
+PARSED_PHONES_CACHE_SIZE = 4096
+
+
+def _default_region() -> str:
+    return getattr(settings, 'PHONENUMBER_DEFAULT_REGION', None) or 'BR'
+
+
+def preload_metadata(region: str = None) -> None:
+    """
+    Load metadata of region, so first parsing doesn't pay for it. Other regions keep being loaded lazily by
+    phonenumbers, only when a number from them is parsed
+    """
+    PhoneMetadata.metadata_for_region(region or _default_region())
+
+
+@lru_cache(maxsize=PARSED_PHONES_CACHE_SIZE)
+def _parse(value: str, region: str) -> PhoneNumber:
+    return to_python(value, region=region)
+
+
+def to_phone_number(value, region: str = None):
+    """
+    Same as phonenumber_field.phonenumber.to_python, but caching strings parsing results.
+    A copy is returned, so callers can't change cached numbers
+    :param value: str, PhoneNumber or None
+    :param region: region used for numbers without country code. Default is PHONENUMBER_DEFAULT_REGION setting
+    :return: PhoneNumber
+    """
+    if not isinstance(value, str) or not value:
+        return to_python(value, region=region)
+    phone_number = PhoneNumber()
+    phone_number.merge_from(_parse(value, region or getattr(settings, 'PHONENUMBER_DEFAULT_REGION', None)))
+    return phone_number
@@ -0,0 +1,32 @@
+"""
+Database router for projects reading django_pagarme data from a replica, through settings.DJANGO_PAGARME_READ_DATABASE.
+Instances loaded from read database remember it, so without this router their saves and related writes would go to
+the replica. Add it to settings:
+
+    DATABASE_ROUTERS = ['django_pagarme.routers.DefaultDatabaseWriteRouter']
+"""
+from django.db import DEFAULT_DB_ALIAS
+
+APP_LABEL = 'django_pagarme'
+
+
+class DefaultDatabaseWriteRouter:
+    """
+    Route every django_pagarme write to default database and allow relations among instances read from default and
+    read databases. Other apps models are left to next routers
+    """
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if APP_LABEL not in {obj1._meta.app_label, obj2._meta.app_label}:
+            return None
+        from django_pagarme.facade import _read_database
+
+        databases = {DEFAULT_DB_ALIAS, _read_database()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
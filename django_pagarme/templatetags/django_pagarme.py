@@ -1,34 +1,47 @@
 from django import template
-from django.conf import settings
-from django.urls import reverse
 
+from django_pagarme.gateway import encryption_key
 from django_pagarme.models import PagarmeItemConfig, Plan
+from django_pagarme.urls_cache import cached_reverse, postback_url
 
 register = template.Library()
 
 
+def _checkout_urls(slug: str) -> dict:
+    """
+    Urls used by checkout javascript of item or plan slug. They are reversed once per slug instead of on every render
+    """
+    return {
+        'postback_url': postback_url(slug),
+        'capture_url_prefix': cached_reverse('django_pagarme:capture', slug=slug, token='f')[:-1],
+        'subscribe_url': cached_reverse('django_pagarme:subscribe', slug=slug),
+    }
+
+
 @register.inclusion_tag('django_pagarme/pagarme_js_form.html')
 def show_pagarme(payment_item: PagarmeItemConfig = None, customer: dict = None, address=None, open_modal: bool = False,
                  review_informations: bool = True, plan: Plan = None):
     if payment_item is not None:
-        kwargs = {'slug': payment_item.slug}
+        slug = payment_item.slug
+        account = payment_item.account
     elif plan is not None:
-        kwargs = {'slug': plan.slug}
-    notification_path = reverse('django_pagarme:notification', kwargs=kwargs)
-    domain = settings.ALLOWED_HOSTS[0]
+        slug = plan.slug
+        account = plan.account
     return {
+        **_checkout_urls(slug),
         'payment_item': payment_item,
         'plan': plan,
         'open_modal': open_modal,
         'review_informations': review_informations,
         'customer': customer,
         'address': address,
-        'postback_url': f'https://{domain}{notification_path}',
-        'CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA': settings.CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA
+        'CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA': encryption_key(account)
     }
 
 
 def interest_rate(value):
+    if type(value) is float:  # fast path: FloatField values
+        return f'{value:.2f}'
     try:
         value = float(value)
     except ValueError:
@@ -37,15 +50,46 @@ def interest_rate(value):
         return f'{value:.2f}'
 
 
+_CENTS_SUFFIXES = tuple(f',{cents:02d}' for cents in range(100))
+
+
+def _format_cents(cents: int) -> str:
+    # Integer only formatting: no float rounding, so any amount is exact
+    sign = ''
+    if cents < 0:
+        sign, cents = '-', -cents
+    reais, cents = divmod(cents, 100)
+    if reais < 1000:
+        return 'R$ ' + sign + str(reais) + _CENTS_SUFFIXES[cents]
+    return 'R$ ' + sign + f'{reais:_}'.replace('_', '.') + _CENTS_SUFFIXES[cents]
+
+
 def cents_to_brl(value):
-    try:
-        value = int(value)
-    except ValueError:
-        return ''
-    else:
-        value /= 100  # to brl
-        return f'R$ {value:,.2f}'.replace('.', '@').replace(',', '.').replace('@', ',')
+    if type(value) is not int:
+        try:
+            value = int(value)
+        except ValueError:
+            return ''
+    return _format_cents(value)
+
+
+def cents_to_brl_many(values) -> list:
+    """
+    Format several amounts in cents at once, formatting repeated amounts only once.
+    Ex: {% for amount in amounts|cents_to_brl_many %}
+    :param values: iterable of amounts in cents
+    :return: list of formatted amounts, empty string for invalid ones
+    """
+    formatted = {}
+    result = []
+    for value in values:
+        text = formatted.get(value)
+        if text is None:
+            text = formatted[value] = cents_to_brl(value)
+        result.append(text)
+    return result
 
 
 register.filter('interest_rate', interest_rate)
 register.filter('cents_to_brl', cents_to_brl)
+register.filter('cents_to_brl_many', cents_to_brl_many)
@@ -10,6 +10,9 @@ urlpatterns = [
     path('one_click/<slug:slug>', views.one_click, name='one_click'),
     path('notification/<slug:slug>', views.notification, name='notification'),
     path('pagarme/<slug:slug>', views.pagarme, name='pagarme'),
+    path('api/catalogo', views.catalog, name='catalog'),
+    path('api/catalogo/itens/<slug:slug>', views.catalog_item, name='catalog_item'),
+    path('api/catalogo/planos/<slug:slug>', views.catalog_plan, name='catalog_plan'),
     path('<slug:slug>', views.contact_info, name='contact_info'),
     path('subscription/<slug:slug>', views.subscription, name='subscription'),
     path('subscribe/<slug:slug>', views.subscribe, name='subscribe'),
@@ -0,0 +1,44 @@
+"""
+Memoized url reversing. Admin rows and checkout pages link to the same views over and over, changing only the slug, and
+reversing is expensive. Urls are cached by current script prefix and urlconf too, so deployments under a sub path and
+requests with their own urlconf get their own urls.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf, reverse
+
+REVERSED_URLS_CACHE_SIZE = 1024
+
+
+def cached_reverse(view_name: str, **kwargs) -> str:
+    """
+    Same as django.urls.reverse, but cached
+    :param view_name: view name, including namespace
+    :param kwargs: url kwargs
+    :return: url path
+    """
+    return _reverse(view_name, get_script_prefix(), get_urlconf(), **kwargs)
+
+
+def postback_url(slug: str) -> str:
+    """
+    Absolute url Pagarme notifies about transactions and subscriptions of item or plan slug
+    :param slug: item or plan slug
+    :return: url on first host from settings.ALLOWED_HOSTS
+    """
+    return f'https://{settings.ALLOWED_HOSTS[0]}{cached_reverse("django_pagarme:notification", slug=slug)}'
+
+
+@lru_cache(maxsize=REVERSED_URLS_CACHE_SIZE)
+def _reverse(view_name: str, script_prefix: str, urlconf, **kwargs) -> str:
+    # script_prefix is only part of cache key: reverse reads it on its own
+    return reverse(view_name, urlconf=urlconf, kwargs=kwargs)
+
+
+@receiver(setting_changed)
+def _clear_reversed_urls(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        _reverse.cache_clear()
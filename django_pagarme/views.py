@@ -1,14 +1,20 @@
 import json
 from collections import ChainMap
+from functools import wraps
+from hashlib import sha1
 from logging import Logger
 
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, Http404
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, Http404, JsonResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
-from django.utils.http import urlencode
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, urlencode
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_safe
 
-from django_pagarme import facade
+from django_pagarme import async_facade, facade
 from django_pagarme.facade import InvalidNotificationStatusTransition
 from django_pagarme.models import PaymentViolation, Plan, PagarmeItemConfig
 
@@ -23,12 +29,12 @@ def contact_info(request, slug):
         user = request.user
         if user.is_authenticated:
             try:
-                payment_profile = facade.get_user_payment_profile(user.id)
+                customer = facade.get_user_checkout_profile(user.id)['customer']
             except facade.UserPaymentProfileDoesNotExist:
                 form = facade.ContactForm({'name': user.first_name, 'email': user.email})
             else:
                 form = facade.ContactForm(
-                    {'name': payment_profile.name, 'email': payment_profile.email, 'phone': payment_profile.phone}
+                    {'name': customer['name'], 'email': customer['email'], 'phone': customer['phone']}
                 )
         else:
             form = facade.ContactForm()
@@ -52,7 +58,7 @@ def contact_info(request, slug):
 
 def capture(request, slug, token):
     try:
-        payment = facade.capture(token, request.user.id)
+        payment = facade.capture(token, request.user.id, facade.find_account(slug))
     except facade.PaymentViolation as e:
         logger.exception(str(e))
         return HttpResponseBadRequest()
@@ -62,19 +68,82 @@ def capture(request, slug, token):
             permanent=True
         )
     else:
-        if payment.payment_method == facade.BOLETO:
-            ctx = {'payment': payment, 'upsell': facade.get_payment_item(slug).upsell}
-            suffix = slug.replace('-', '_')
-            templates = [
-                f'django_pagarme/show_boleto_data_{suffix}.html',
-                'django_pagarme/show_boleto_data.html'
-            ]
-
-            return render(request, templates, ctx)
-        else:
-            return redirect(reverse('django_pagarme:thanks', kwargs={'slug': slug}))
+        return _captured_payment_response(request, slug, payment)
 
 
+async def capture_async(request, slug, token):
+    django_user_id = await _request_user_id(request)
+    try:
+        payment = await async_facade.acapture(token, django_user_id, await async_facade.afind_account(slug))
+    except facade.PaymentViolation as e:
+        logger.exception(str(e))
+        return HttpResponseBadRequest()
+    except facade.TokenDifferentFromTransactionIdxception as e:
+        return redirect(
+            reverse('django_pagarme:capture', kwargs={'slug': slug, 'token': e.transaction_id}),
+            permanent=True
+        )
+    else:
+        return await sync_to_async(_captured_payment_response)(request, slug, payment)
+
+
+def _captured_payment_response(request, slug, payment):
+    if payment.payment_method == facade.BOLETO:
+        ctx = {'payment': payment, 'upsell': facade.get_payment_item(slug).upsell}
+        suffix = slug.replace('-', '_')
+        templates = [
+            f'django_pagarme/show_boleto_data_{suffix}.html',
+            'django_pagarme/show_boleto_data.html'
+        ]
+
+        return render(request, templates, ctx)
+    else:
+        return redirect(reverse('django_pagarme:thanks', kwargs={'slug': slug}))
+
+
+@sync_to_async
+def _request_user(request):
+    user = request.user
+    user.is_authenticated  # forces lazy user loading out of event loop
+    return user
+
+
+async def _request_user_id(request):
+    user = await _request_user(request)
+    return user.id
+
+
+def _page_etag(request, slug) -> str:
+    """
+    ETag of pages rendered only from catalog data. CSRF secret is part of it because pages embed CSRF tokens.
+    Setting DJANGO_PAGARME_PAGES_VERSION is part of it too, so deploys changing templates can invalidate cached pages
+    """
+    pages_version = getattr(settings, 'DJANGO_PAGARME_PAGES_VERSION', '')
+    raw = f'{pages_version}:{facade.get_catalog_version().version}:{slug}:{request.META.get("CSRF_COOKIE", "")}'
+    return quote_etag(sha1(raw.encode()).hexdigest())
+
+
+def _conditional_page(view):
+    """
+    Answer anonymous requests with 304 while catalog doesn't change, without calling view. Authenticated users always
+    get the page rendered, since overridden templates may show user data
+    """
+    @wraps(view)
+    def wrapper(request, slug):
+        if request.user.is_authenticated:
+            return view(request, slug)
+        response = get_conditional_response(request, etag=_page_etag(request, slug))
+        if response is None:
+            response = view(request, slug)
+            if response.status_code == 200:
+                # Computed after rendering because a CSRF secret may have been created for the page
+                response['ETag'] = _page_etag(request, slug)
+        return response
+
+    return wrapper
+
+
+@_conditional_page
 def thanks(request, slug):
     suffix = slug.replace('-', '_')
     try:
@@ -105,6 +174,18 @@ def one_click(request, slug):
         return redirect(reverse('django_pagarme:thanks', kwargs={'slug': slug}))
 
 
+async def one_click_async(request, slug):
+    if request.method != 'POST':
+        return redirect(reverse('django_pagarme:pagarme', kwargs={'slug': slug}))
+    try:
+        await async_facade.aone_click_buy(slug, await _request_user(request))
+    except Exception:
+        path = reverse('django_pagarme:pagarme', kwargs={'slug': slug})
+        return redirect(f'{path}?open_modal=true&review_informations=false')
+    else:
+        return redirect(reverse('django_pagarme:thanks', kwargs={'slug': slug}))
+
+
 @csrf_exempt
 def notification(request, slug):
     if request.method != 'POST':
@@ -114,11 +195,44 @@ def notification(request, slug):
     expected_signature = request.headers.get('X-Hub-Signature', '')
     current_status = request.POST['current_status']
     event = request.POST['event']
+    account = facade.find_account(slug)
     if event == 'subscription_status_changed':
         subscription_id = request.POST['subscription[id]']
         try:
             facade.handle_subscription_notification(
-               subscription_id, current_status, raw_body, expected_signature, request.POST
+               subscription_id, current_status, raw_body, expected_signature, request.POST, account
+            )
+        except Exception:
+            return HttpResponseBadRequest()
+
+    else:
+        transaction_id = request.POST['transaction[id]']
+        try:
+            facade.handle_notification(
+                transaction_id, current_status, raw_body, expected_signature, request.POST, account
+            )
+        except PaymentViolation:
+            return HttpResponseBadRequest()
+        except InvalidNotificationStatusTransition:
+            pass
+
+    return HttpResponse()
+
+
+async def notification_async(request, slug):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed([request.method])
+
+    raw_body = request.body.decode('utf8')
+    expected_signature = request.headers.get('X-Hub-Signature', '')
+    current_status = request.POST['current_status']
+    event = request.POST['event']
+    account = await async_facade.afind_account(slug)
+    if event == 'subscription_status_changed':
+        subscription_id = request.POST['subscription[id]']
+        try:
+            await async_facade.ahandle_subscription_notification(
+               subscription_id, current_status, raw_body, expected_signature, request.POST, account
             )
         except Exception:
             return HttpResponseBadRequest()
@@ -126,7 +240,9 @@ def notification(request, slug):
     else:
         transaction_id = request.POST['transaction[id]']
         try:
-            facade.handle_notification(transaction_id, current_status, raw_body, expected_signature, request.POST)
+            await async_facade.ahandle_notification(
+                transaction_id, current_status, raw_body, expected_signature, request.POST, account
+            )
         except PaymentViolation:
             return HttpResponseBadRequest()
         except InvalidNotificationStatusTransition:
@@ -135,25 +251,35 @@ def notification(request, slug):
     return HttpResponse()
 
 
+# csrf_exempt decorator returns a sync wrapper for coroutines before Django 5.0, so the flag is set directly
+notification_async.csrf_exempt = True
+
+
 def pagarme(request, slug):
-    payment_item = facade.get_payment_item(slug)
+    user = request.user
+    # Anonymous checkout depends only on catalog, so it is read from cache and answered conditionally
+    anonymous = not user.is_authenticated
+    payment_item = facade.get_cached_payment_item(slug) if anonymous else facade.get_payment_item(slug)
     if not facade.is_payment_config_item_available(payment_item, request):
         return redirect(reverse('django_pagarme:unavailable', kwargs={'slug': slug}))
+    if anonymous:
+        not_modified = get_conditional_response(request, etag=_page_etag(request, slug))
+        if not_modified is not None:
+            return not_modified
     open_modal = request.GET.get('open_modal', '').lower() == 'true'
     review_informations = not (request.GET.get('review_informations', '').lower() == 'false')
     customer_qs_data = {k: request.GET.get(k, '') for k in ['name', 'email', 'phone']}
     customer_qs_data = {k: v for k, v in customer_qs_data.items() if v}
-    user = request.user
     address = None
-    if user.is_authenticated:
+    if not anonymous:
         user_data = {'external_id': user.id, 'name': user.first_name, 'email': user.email}
         try:
-            payment_profile = facade.get_user_payment_profile(user)
+            checkout_profile = facade.get_user_checkout_profile(user)
         except facade.UserPaymentProfileDoesNotExist:
             customer = ChainMap(customer_qs_data, user_data)
         else:
-            customer = ChainMap(customer_qs_data, payment_profile.to_customer_dict(), user_data)
-            address = payment_profile.to_billing_address_dict()
+            customer = ChainMap(customer_qs_data, checkout_profile['customer'], user_data)
+            address = checkout_profile['address']
     else:
         customer = customer_qs_data
     ctx = {
@@ -170,9 +296,13 @@ def pagarme(request, slug):
         'django_pagarme/pagarme.html'
     ]
 
-    return render(request, templates, ctx)
+    response = render(request, templates, ctx)
+    if anonymous:
+        response['ETag'] = _page_etag(request, slug)
+    return response
 
 
+@_conditional_page
 def unavailable(request, slug):
     try:
         context = {'plan': facade.get_plan(slug)}
@@ -199,12 +329,12 @@ def subscription(request, slug):
     if user.is_authenticated:
         user_data = {'external_id': user.id, 'name': user.first_name, 'email': user.email}
         try:
-            payment_profile = facade.get_user_payment_profile(user)
+            checkout_profile = facade.get_user_checkout_profile(user)
         except facade.UserPaymentProfileDoesNotExist:
             customer = ChainMap(customer_qs_data, user_data)
         else:
-            customer = ChainMap(customer_qs_data, payment_profile.to_customer_dict(), user_data)
-            address = payment_profile.to_billing_address_dict()
+            customer = ChainMap(customer_qs_data, checkout_profile['customer'], user_data)
+            address = checkout_profile['address']
     else:
         customer = customer_qs_data
     ctx = {
@@ -243,6 +373,28 @@ def subscribe(request, slug):
     return HttpResponse(callback_url)
 
 
+async def subscribe_async(request, slug):
+    plan = await sync_to_async(facade.get_plan)(slug)
+    payload = json.loads(request.body)
+    django_user_id = await _request_user_id(request)
+    try:
+        payment = await async_facade.acreate_subscription(plan, payload, django_user_id)
+        if payment.payment_method == facade.BOLETO:
+            callback_url = reverse(
+                'django_pagarme:subscription_payment_bank_slip',
+                kwargs={'transaction_id': payment.transaction_id}
+            )
+        else:
+            callback_url = reverse('django_pagarme:thanks', kwargs={'slug': slug})
+    except Exception:
+        return HttpResponseBadRequest()
+
+    return HttpResponse(callback_url)
+
+
+subscribe_async.csrf_exempt = True
+
+
 def subscription_payment_bank_slip(request, transaction_id):
     payment = facade.find_payment_by_transaction(transaction_id)
     suffix = payment.subscription.plan.slug.replace('-', '_')
@@ -251,3 +403,46 @@ def subscription_payment_bank_slip(request, transaction_id):
         'django_pagarme/show_boleto_data.html'
     ]
     return render(request, templates, {'payment': payment})
+
+
+CATALOG_MAX_AGE = 60
+
+
+def _catalog_etag(request, *args, **kwargs):
+    return facade.get_catalog_etag()
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return facade.get_catalog_last_modified()
+
+
+def _catalog_response(data):
+    response = JsonResponse(data)
+    patch_cache_control(
+        response, public=True, max_age=getattr(settings, 'DJANGO_PAGARME_CATALOG_MAX_AGE', CATALOG_MAX_AGE)
+    )
+    return response
+
+
+@require_safe
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def catalog(request):
+    return _catalog_response(facade.get_catalog())
+
+
+@require_safe
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def catalog_item(request, slug):
+    try:
+        return _catalog_response(facade.get_catalog_item(slug))
+    except PagarmeItemConfig.DoesNotExist:
+        raise Http404(f'Item {slug} não encontrado')
+
+
+@require_safe
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def catalog_plan(request, slug):
+    try:
+        return _catalog_response(facade.get_catalog_plan(slug))
+    except Plan.DoesNotExist:
+        raise Http404(f'Plano {slug} não encontrado')
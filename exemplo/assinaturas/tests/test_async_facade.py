@@ -0,0 +1,55 @@
+import json
+
+import pytest
+import responses
+from asgiref.sync import async_to_sync
+from model_bakery import baker
+
+from assinaturas.tests.test_plan import all_plans_json  # noqa: F401
+from django_pagarme import async_facade
+from django_pagarme.models import Plan
+
+PAGE_SIZE = 2
+
+
+@pytest.fixture
+def pagarme_response(all_plans_json):  # noqa: F811
+    def plans_page(request):
+        params = json.loads(request.body)
+        start = (params['page'] - 1) * params['count']
+        return 200, {}, json.dumps(all_plans_json[start:start + params['count']])
+
+    with responses.RequestsMock() as rsps:
+        rsps.add_callback(responses.GET, 'https://api.pagar.me/1/plans', callback=plans_page)
+        yield rsps
+
+
+def test_should_sync_plans_from_all_pages(db, pagarme_response, all_plans_json):  # noqa: F811
+    async_to_sync(async_facade.asynchronize_plans)(page_size=PAGE_SIZE, concurrent_pages=2)
+    assert sorted(Plan.objects.values_list('pagarme_id', flat=True)) == sorted(str(p['id']) for p in all_plans_json)
+
+
+def test_should_fetch_pages_until_not_full_one(db, pagarme_response):
+    async_to_sync(async_facade.asynchronize_plans)(page_size=PAGE_SIZE, concurrent_pages=1)
+    assert len(pagarme_response.calls) == 2
+
+
+def test_should_remove_orphan_plans(db, pagarme_response):
+    baker.make(Plan, pagarme_id='some-inexistent-id')
+    async_to_sync(async_facade.asynchronize_plans)(page_size=PAGE_SIZE)
+    assert not Plan.objects.filter(pagarme_id='some-inexistent-id').exists()
+
+
+def test_get_plan(db):
+    plan = baker.make(Plan)
+    assert async_to_sync(async_facade.aget_plan)(plan.slug) == plan
+
+
+def test_get_plan_not_found(db):
+    with pytest.raises(Plan.DoesNotExist):
+        async_to_sync(async_facade.aget_plan)('inexistent-slug')
+
+
+def test_list_plans(db):
+    plans = baker.make(Plan, _quantity=2)
+    assert sorted(async_to_sync(async_facade.alist_plans)(), key=lambda p: p.id) == plans
@@ -90,6 +90,8 @@ DATABASES = {
     'default': config('DATABASE_URL', default=default_db_url, cast=dburl),
 }
 
+DATABASE_ROUTERS = ['django_pagarme.routers.DefaultDatabaseWriteRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
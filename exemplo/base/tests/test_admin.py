@@ -0,0 +1,89 @@
+import pytest
+from django.contrib import admin
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, set_script_prefix
+from model_bakery import baker
+
+from django_pagarme.admin import EstimatedCountPaginator
+from django_pagarme.models import (
+    ContactInfoEvent, DailyStatusAggregate, PagarmeItemConfig, PagarmeNotification, PagarmePayment, Plan, Subscription,
+    SubscriptionNotification, UserPaymentProfile,
+)
+
+
+ADMIN_MODELS = [
+    PagarmeItemConfig,
+    PagarmePayment,
+    PagarmeNotification,
+    UserPaymentProfile,
+    Plan,
+    Subscription,
+    SubscriptionNotification,
+    DailyStatusAggregate,
+    ContactInfoEvent,
+]
+
+
+@pytest.fixture
+def notifications(db):
+    return baker.make(PagarmeNotification, status='paid', _quantity=3)
+
+
+def _changelist_url(model):
+    opts = model._meta
+    return reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+
+
+def _changelist_queries(admin_client, model):
+    url = _changelist_url(model)
+    admin_client.get(url)  # warming up session and content types
+    with CaptureQueriesContext(connection) as queries:
+        resp = admin_client.get(url)
+    assert resp.status_code == 200
+    return len(queries)
+
+
+def _make_rows(model, quantity):
+    if model is Subscription:
+        subscriptions = baker.make(Subscription, _quantity=quantity)
+        for subscription in subscriptions:
+            baker.make(SubscriptionNotification, subscription=subscription, status='paid')
+        return
+    if model is PagarmePayment:
+        payments = baker.make(PagarmePayment, user=baker.make('auth.User'), _quantity=quantity)
+        for payment in payments:
+            payment.items.set([baker.make(PagarmeItemConfig)])
+        return
+    baker.make(model, _quantity=quantity)
+
+
+@pytest.mark.parametrize('model', ADMIN_MODELS)
+def test_changelist_status_code(admin_client, notifications, model):
+    resp = admin_client.get(_changelist_url(model))
+    assert resp.status_code == 200
+
+
+@pytest.mark.parametrize('model', ADMIN_MODELS)
+def test_changelist_queries_do_not_grow_with_rows(admin_client, model):
+    _make_rows(model, 1)
+    queries_for_one_row = _changelist_queries(admin_client, model)
+    _make_rows(model, 5)
+    assert _changelist_queries(admin_client, model) == queries_for_one_row
+
+
+def test_paginator_exact_count_for_small_tables(notifications):
+    paginator = EstimatedCountPaginator(PagarmeNotification.objects.all(), 2)
+    assert paginator.count == 3
+    assert paginator.num_pages == 2
+
+
+def test_item_links_follow_script_prefix(db):
+    item = baker.make(PagarmeItemConfig, slug='pytools')
+    item_admin = admin.site._registry[PagarmeItemConfig]
+    assert 'href="/checkout/pagarme/pytools"' in item_admin.checkout(item)
+    set_script_prefix('/loja/')
+    try:
+        assert 'href="/loja/checkout/pagarme/pytools"' in item_admin.checkout(item)
+    finally:
+        set_script_prefix('/')
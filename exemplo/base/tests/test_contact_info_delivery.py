@@ -0,0 +1,189 @@
+import io
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+
+from django_pagarme import async_facade, facade
+from django_pagarme.models import ContactInfoEvent
+
+
+@pytest.fixture
+def listener_mock(mocker):
+    listener = mocker.Mock()
+    facade.add_contact_info_listener(listener)
+    yield listener
+    facade._contact_info_listeners = []
+
+
+@pytest.fixture
+def batch_listener_mock(mocker):
+    listener = mocker.Mock()
+    facade.add_contact_info_batch_listener(listener)
+    yield listener
+    facade._contact_info_batch_listeners = []
+
+
+@pytest.fixture
+def worker_delivery(settings):
+    settings.DJANGO_PAGARME_CONTACT_INFO_DELIVERY = facade.CONTACT_INFO_WORKER
+
+
+def _inform(name='Foo Bar', user=None):
+    return facade.validate_and_inform_contact_info(name, 'foo@email.com', '12987654321', 'pytools', user=user)
+
+
+def test_sync_delivery_calls_batch_listener(db, batch_listener_mock):
+    _inform()
+    contact = {
+        'name': 'Foo Bar', 'email': 'foo@email.com', 'phone': '+5512987654321', 'payment_item_slug': 'pytools',
+        'user': None
+    }
+    batch_listener_mock.assert_called_once_with([contact])
+    assert not ContactInfoEvent.objects.exists()
+
+
+def test_deferred_delivery_does_not_call_listener(worker_delivery, db, listener_mock):
+    _inform()
+    assert listener_mock.call_count == 0
+    assert ContactInfoEvent.objects.filter(delivered_at__isnull=True).count() == 1
+
+
+def test_deliver_events(worker_delivery, db, listener_mock, batch_listener_mock, django_user_model):
+    user = baker.make(django_user_model)
+    _inform('Foo', user=user)
+    _inform('Bar')
+    assert facade.deliver_contact_info_events() == 2
+    assert [call.kwargs['name'] for call in listener_mock.call_args_list] == ['Foo', 'Bar']
+    assert listener_mock.call_args_list[0].kwargs['user'] == user
+    assert [contact['name'] for contact in batch_listener_mock.call_args.args[0]] == ['Foo', 'Bar']
+    assert not ContactInfoEvent.objects.filter(delivered_at__isnull=True).exists()
+
+
+def test_deliver_in_batches(worker_delivery, db, listener_mock):
+    for _ in range(3):
+        _inform()
+    assert facade.deliver_contact_info_events(batch_size=2) == 2
+    assert facade.deliver_contact_info_events(batch_size=2) == 1
+    assert facade.deliver_contact_info_events(batch_size=2) == 0
+
+
+def test_failing_event_retried(worker_delivery, db, listener_mock):
+    _inform()
+    listener_mock.side_effect = Exception()
+    assert facade.deliver_contact_info_events() == 0
+    listener_mock.side_effect = None
+    assert facade.deliver_contact_info_events() == 1
+    assert ContactInfoEvent.objects.get().attempts == 2
+
+
+def test_failing_event_given_up_after_max_attempts(worker_delivery, db, listener_mock):
+    _inform()
+    listener_mock.side_effect = Exception()
+    for _ in range(facade.CONTACT_INFO_MAX_ATTEMPTS + 1):
+        facade.deliver_contact_info_events()
+    assert listener_mock.call_count == facade.CONTACT_INFO_MAX_ATTEMPTS
+    assert facade.contact_info_metrics()['failed'] == 1
+
+
+def test_listener_called_after_claim(worker_delivery, db, listener_mock):
+    _inform()
+    claimed = []
+    listener_mock.side_effect = lambda **kwargs: claimed.append(ContactInfoEvent.objects.get())
+    facade.deliver_contact_info_events()
+    event, = claimed
+    assert event.claimed_at is not None
+    assert event.attempts == 1
+    assert event.delivered_at is None
+    assert ContactInfoEvent.objects.get().delivered_at is not None
+
+
+def test_claimed_event_not_delivered(worker_delivery, db, listener_mock):
+    _inform()
+    ContactInfoEvent.objects.update(claimed_at=timezone.now())
+    assert facade.deliver_contact_info_events() == 0
+    assert listener_mock.call_count == 0
+
+
+def test_expired_claim_delivered(worker_delivery, db, listener_mock):
+    _inform()
+    expired = timezone.now() - facade.CONTACT_INFO_CLAIM_TIMEOUT - timedelta(seconds=1)
+    ContactInfoEvent.objects.update(claimed_at=expired)
+    assert facade.deliver_contact_info_events() == 1
+
+
+def test_failing_event_released(worker_delivery, db, listener_mock):
+    _inform()
+    listener_mock.side_effect = Exception()
+    facade.deliver_contact_info_events()
+    assert ContactInfoEvent.objects.get().claimed_at is None
+
+
+@pytest.fixture
+def old_events(worker_delivery, db):
+    old = timezone.now() - timedelta(days=facade.CONTACT_INFO_RETENTION_DAYS + 1)
+    return {
+        'delivered': baker.make(ContactInfoEvent, delivered_at=old),
+        'recently_delivered': baker.make(ContactInfoEvent, delivered_at=timezone.now()),
+        'pending': baker.make(ContactInfoEvent),
+        'given_up': baker.make(ContactInfoEvent, attempts=facade.CONTACT_INFO_MAX_ATTEMPTS),
+    }
+
+
+def _set_old_creation(events):
+    ContactInfoEvent.objects.update(creation=timezone.now() - timedelta(days=facade.CONTACT_INFO_RETENTION_DAYS + 1))
+
+
+def test_purge(old_events):
+    _set_old_creation(old_events)
+    assert facade.purge_contact_info_events() == 2
+    remaining = set(ContactInfoEvent.objects.values_list('id', flat=True))
+    assert remaining == {old_events['recently_delivered'].id, old_events['pending'].id}
+
+
+def test_async_purge(old_events):
+    _set_old_creation(old_events)
+    assert async_to_sync(async_facade.apurge_contact_info_events)() == 2
+
+
+def test_purge_retention_setting(old_events, settings):
+    settings.DJANGO_PAGARME_CONTACT_INFO_RETENTION_DAYS = None
+    _set_old_creation(old_events)
+    assert facade.purge_contact_info_events() == 0
+    assert ContactInfoEvent.objects.count() == 4
+
+
+def test_on_commit_delivery_scheduled(settings, db, mocker, capture_on_commit_callbacks):
+    settings.DJANGO_PAGARME_CONTACT_INFO_DELIVERY = facade.CONTACT_INFO_ON_COMMIT
+    schedule = mocker.patch('django_pagarme.facade._schedule_contact_info_delivery')
+    with capture_on_commit_callbacks(execute=True):
+        _inform()
+    schedule.assert_called_once_with()
+
+
+def test_metrics(worker_delivery, db, listener_mock):
+    _inform()
+    _inform()
+    facade.deliver_contact_info_events(batch_size=1)
+    ContactInfoEvent.objects.update(creation=timezone.now() - timedelta(seconds=10))
+    metrics = facade.contact_info_metrics()
+    assert metrics['queue_depth'] == 1
+    assert metrics['delivered'] == 1
+    assert metrics['oldest_pending_seconds'] >= 10
+    assert metrics['average_latency_seconds'] > 0
+
+
+def test_deliver_command(worker_delivery, db, listener_mock):
+    _inform()
+    out = io.StringIO()
+    call_command('django_pagarme_deliver_contact_info', stdout=out)
+    assert '1 eventos entregues, 0 pendentes' in out.getvalue()
+
+
+def test_deliver_command_purges(old_events):
+    out = io.StringIO()
+    call_command('django_pagarme_deliver_contact_info', '--retention-days', '0', stdout=out)
+    assert '4 apagados' in out.getvalue()
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+from django_pagarme import facade
+from django_pagarme.forms import ContactForm
+
+
+def test_facade_import_does_not_load_pagarme_nor_forms():
+    code = (
+        'import sys, django; django.setup(); import django_pagarme.facade; '
+        'print("pagarme" in sys.modules, "django_pagarme.forms" in sys.modules)'
+    )
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='base.settings', PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    assert output.split() == ['False', 'False']
+
+
+def test_contact_form_on_facade_contract():
+    assert facade.ContactForm is ContactForm
@@ -0,0 +1,55 @@
+import pytest
+from model_bakery import baker
+from phonenumber_field.phonenumber import to_python
+
+from django_pagarme.forms import ContactForm
+from django_pagarme.models import UserPaymentProfile
+from django_pagarme.phone import _parse, to_phone_number
+
+PHONES = ['12987654321', '+5512987654321', '(+55) 12987654321', '(12) 98765-4321', '5512999999999', '129', 'abc']
+
+
+@pytest.mark.parametrize('phone', PHONES)
+def test_same_result_as_phonenumber_field(phone):
+    phone_number = to_phone_number(phone)
+    expected = to_python(phone)
+    assert (phone_number, phone_number.raw_input, phone_number.is_valid()) == (
+        expected, expected.raw_input, expected.is_valid()
+    )
+
+
+@pytest.mark.parametrize('phone', [None, ''])
+def test_empty_values(phone):
+    assert to_phone_number(phone) == to_python(phone)
+
+
+def test_repeated_input_parsed_once():
+    _parse.cache_clear()
+    to_phone_number('12987654321')
+    to_phone_number('12987654321')
+    assert (_parse.cache_info().hits, _parse.cache_info().misses) == (1, 1)
+
+
+def test_cached_number_not_shared():
+    phone_number = to_phone_number('12987654321')
+    phone_number.national_number = 1
+    assert to_phone_number('12987654321').national_number == 12987654321
+
+
+def test_contact_form_normalization():
+    form = ContactForm({'name': 'Foo Bar', 'email': 'foo@email.com', 'phone': '(12) 98765-4321'})
+    assert form.is_valid()
+    assert str(form.cleaned_data['phone']) == '+5512987654321'
+
+
+def test_profile_phone_stored_as_e164():
+    profile = UserPaymentProfile(phone='5512987654321')
+    prep_value = UserPaymentProfile._meta.get_field('phone').get_prep_value(profile.phone)
+    assert (type(prep_value), prep_value) == (str, '+5512987654321')
+
+
+def test_profile_phone_saved_and_loaded(db):
+    profile = baker.make(UserPaymentProfile, phone='(12) 98765-4321')
+    raw_phone, = UserPaymentProfile.objects.values_list('phone', flat=True)
+    assert str(raw_phone) == '+5512987654321'
+    assert UserPaymentProfile.objects.get(pk=profile.pk).phone == profile.phone
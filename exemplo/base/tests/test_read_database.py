@@ -0,0 +1,78 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils.connection import ConnectionDoesNotExist
+from model_bakery import baker
+
+from django_pagarme import facade
+from django_pagarme.models import PagarmeItemConfig, PagarmePayment, UserPaymentProfile
+from django_pagarme.routers import DefaultDatabaseWriteRouter
+
+
+@pytest.fixture
+def replica_settings(settings):
+    settings.DJANGO_PAGARME_READ_DATABASE = 'replica'
+    return settings
+
+
+@pytest.mark.parametrize(
+    'read_function, args',
+    [
+        (facade.get_payment_item, ['slug']),
+        (facade.find_payment_item_config, ['slug']),
+        (facade.list_payment_item_configs, []),
+        (facade.get_plan, ['slug']),
+        (facade.list_plans, []),
+        (facade.list_user_payments, [1]),
+        (facade.revenue_report, []),
+        (facade.list_daily_aggregates, []),
+    ]
+)
+def test_read_functions_use_read_database(replica_settings, read_function, args):
+    with pytest.raises(ConnectionDoesNotExist):
+        read_function(*args)
+
+
+def test_read_database_default(db):
+    assert facade._read_database() == 'default'
+
+
+def test_one_click_payload_read_from_default_database(replica_settings, db):
+    profile = baker.make(UserPaymentProfile)
+    assert facade._one_click_payload(profile.user_id)['customer']['name'] == profile.name
+
+
+def test_user_payment_profile_read_from_default_database(replica_settings, db):
+    profile = baker.make(UserPaymentProfile)
+    assert facade.get_user_payment_profile(profile.user_id) == profile
+
+
+@pytest.fixture
+def replica_item(replica_settings, db):
+    item = baker.make(PagarmeItemConfig)
+    item._state.db = 'replica'  # as if loaded from read database
+    return item
+
+
+def test_read_instance_saved_on_default_database(replica_item):
+    replica_item.name = 'Outro nome'
+    replica_item.save()
+    assert PagarmeItemConfig.objects.get().name == 'Outro nome'
+
+
+def test_read_instance_related_to_default_database_instance(replica_item):
+    payment = baker.make(PagarmePayment)
+    payment.items.add(replica_item)
+    assert list(payment.items.all()) == [replica_item]
+
+
+def test_router_leaves_other_apps_models(replica_settings):
+    router = DefaultDatabaseWriteRouter()
+    user_model = get_user_model()
+    assert router.db_for_write(user_model) is None
+    assert router.allow_relation(user_model(), user_model()) is None
+
+
+def test_router_denies_unknown_database_relation_to_next_routers(replica_item):
+    payment = PagarmePayment()
+    payment._state.db = 'other'
+    assert DefaultDatabaseWriteRouter().allow_relation(payment, replica_item) is None
@@ -0,0 +1,38 @@
+import pytest
+from django.template import Context, Template
+
+from django_pagarme.templatetags.django_pagarme import cents_to_brl, cents_to_brl_many, interest_rate
+
+
+@pytest.mark.parametrize(
+    'value,expected',
+    [
+        (0, 'R$ 0,00'),
+        (5, 'R$ 0,05'),
+        (39700, 'R$ 397,00'),
+        (123456, 'R$ 1.234,56'),
+        (100000000, 'R$ 1.000.000,00'),
+        (-1250, 'R$ -12,50'),
+        ('39700', 'R$ 397,00'),
+        ('invalid', ''),
+        (12345678901234567891, 'R$ 123.456.789.012.345.678,91'),
+    ]
+)
+def test_cents_to_brl(value, expected):
+    assert cents_to_brl(value) == expected
+
+
+def test_cents_to_brl_many():
+    assert cents_to_brl_many([39700, 123456, 39700, 'invalid']) == ['R$ 397,00', 'R$ 1.234,56', 'R$ 397,00', '']
+
+
+def test_cents_to_brl_many_on_template():
+    template = Template(
+        '{% load django_pagarme %}{% for amount in amounts|cents_to_brl_many %}{{ amount }};{% endfor %}'
+    )
+    assert template.render(Context({'amounts': [100, 250000]})) == 'R$ 1,00;R$ 2.500,00;'
+
+
+@pytest.mark.parametrize('value,expected', [(1.66, '1.66'), (0, '0.00'), ('2.5', '2.50'), ('invalid', '')])
+def test_interest_rate(value, expected):
+    assert interest_rate(value) == expected
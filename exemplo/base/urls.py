@@ -22,4 +22,5 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('admin/', admin.site.urls),
     path('checkout/', include('django_pagarme.urls')),
+    path('checkout_async/', include('django_pagarme.async_urls', namespace='django_pagarme_async')),
 ]
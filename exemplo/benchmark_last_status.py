@@ -0,0 +1,63 @@
+"""
+Benchmark of payment last status lookup as notifications table grows.
+Run from exemplo dir: python benchmark_last_status.py
+
+It uses a throwaway test database, so configured database data is not touched.
+Lookup time must stay roughly constant (index search is O(log n)) while table size grows 10x each step.
+"""
+import os
+import random
+import timeit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'base.settings')
+django.setup()
+
+from django.db import connection  # noqa
+from django.test.utils import setup_test_environment  # noqa
+
+from django_pagarme.models import PagarmeNotification, PagarmePayment  # noqa
+
+NOTIFICATIONS_PER_PAYMENT = 4
+TABLE_SIZES = (1_000, 10_000, 100_000)
+LOOKUPS = 1_000
+
+
+def _populate(payments_count, first_transaction_id):
+    payments = PagarmePayment.objects.bulk_create(
+        PagarmePayment(
+            transaction_id=str(first_transaction_id + n), amount=1000, installments=1, payment_method='credit_card'
+        )
+        for n in range(payments_count)
+    )
+    PagarmeNotification.objects.bulk_create(
+        (PagarmeNotification(payment=payment, status='paid') for payment in payments for _ in
+         range(NOTIFICATIONS_PER_PAYMENT)),
+        batch_size=5000
+    )
+
+
+def _lookup(payment_ids):
+    payment = PagarmePayment(id=random.choice(payment_ids))
+    return payment.status()
+
+
+def main():
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        populated = 0
+        for size in TABLE_SIZES:
+            payments_count = (size - populated) // NOTIFICATIONS_PER_PAYMENT
+            _populate(payments_count, populated)
+            populated = size
+            payment_ids = list(PagarmePayment.objects.values_list('id', flat=True))
+            seconds = timeit.timeit(lambda: _lookup(payment_ids), number=LOOKUPS)
+            print(f'{size:>9} notifications: {seconds / LOOKUPS * 1_000_000:8.1f} µs per last status lookup')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
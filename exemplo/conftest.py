@@ -0,0 +1,45 @@
+import pytest
+import requests
+from django.core.cache import cache
+from django.test import TestCase
+
+from django_pagarme import gateway
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Database is rolled back between tests, so cached data must go too
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def capture_on_commit_callbacks(db):
+    """
+    Same as pytest-django's django_capture_on_commit_callbacks, which is only available from pytest-django 4.4
+    """
+    return TestCase.captureOnCommitCallbacks
+
+
+def _send_through_requests(request):
+    import httpx
+
+    response = requests.request(request.method, str(request.url), data=request.content, headers=dict(request.headers))
+    return httpx.Response(
+        response.status_code, content=response.content, headers={'Content-Type': response.headers['Content-Type']}
+    )
+
+
+@pytest.fixture(autouse=True)
+def async_gateway_through_requests(mocker):
+    """
+    Send async gateway clients requests through requests, so the same responses mocks answer sync and async calls
+    """
+    try:
+        import httpx
+    except ImportError:
+        return
+    gateway._async_clients.clear()
+    transport = httpx.MockTransport(_send_through_requests)
+    mocker.patch.object(gateway.AsyncPagarmeClient, '_transport', lambda self, pool_size: transport)
@@ -0,0 +1,87 @@
+import io
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+
+from django_pagarme import facade
+from django_pagarme.models import (
+    ArchivedPagarmeNotification, ArchivedSubscriptionNotification, PagarmeNotification, PagarmePayment, Subscription,
+    SubscriptionNotification, first_payment_notification_subquery,
+)
+
+
+def _make_old_notifications(model, fk_name, instance, statuses):
+    for days_ago, status in zip(range(len(statuses), 0, -1), statuses):
+        notification = baker.make(model, status=status, **{fk_name: instance})
+        model.objects.filter(id=notification.id).update(creation=timezone.now() - timedelta(days=days_ago * 100))
+
+
+@pytest.fixture
+def paid_payment(db):
+    payment = baker.make(PagarmePayment)
+    _make_old_notifications(
+        PagarmeNotification, 'payment', payment, [facade.PROCESSING, facade.AUTHORIZED, facade.PAID]
+    )
+    return payment
+
+
+@pytest.fixture
+def waiting_payment(db):
+    payment = baker.make(PagarmePayment)
+    _make_old_notifications(PagarmeNotification, 'payment', payment, [facade.PROCESSING, facade.WAITING_PAYMENT])
+    return payment
+
+
+@pytest.fixture
+def canceled_subscription(db):
+    subscription = baker.make(Subscription)
+    _make_old_notifications(
+        SubscriptionNotification, 'subscription', subscription, [facade.TRIALING, facade.PAID, facade.CANCELED]
+    )
+    return subscription
+
+
+@pytest.fixture
+def archived(paid_payment, waiting_payment, canceled_subscription):
+    return facade.archive_notifications(days=30, batch_size=1)
+
+
+def test_archived_count(archived):
+    assert archived == 2
+
+
+def test_terminal_payment_keeps_first_and_last_notifications(archived, paid_payment):
+    statuses = paid_payment.notifications.order_by('creation').values_list('status', flat=True)
+    assert list(statuses) == [facade.PROCESSING, facade.PAID]
+    assert list(paid_payment.archived_notifications.values_list('status', flat=True)) == [facade.AUTHORIZED]
+    assert paid_payment.status() == facade.PAID
+
+
+def test_non_terminal_payment_not_archived(archived, waiting_payment):
+    assert waiting_payment.notifications.count() == 2
+    assert not ArchivedPagarmeNotification.objects.filter(payment=waiting_payment).exists()
+
+
+def test_payment_creation_date_kept(paid_payment):
+    payments = PagarmePayment.objects.annotate(created=first_payment_notification_subquery())
+    created = payments.get(id=paid_payment.id).created
+    facade.archive_notifications(days=30)
+    assert payments.get(id=paid_payment.id).created == created
+
+
+def test_terminal_subscription_keeps_first_and_last_notifications(archived, canceled_subscription):
+    assert canceled_subscription.status == facade.CANCELED
+    assert ArchivedSubscriptionNotification.objects.get().status == facade.PAID
+
+
+def test_recent_notifications_not_archived(paid_payment):
+    assert facade.archive_notifications(days=1000) == 0
+
+
+def test_archive_command(paid_payment):
+    out = io.StringIO()
+    call_command('django_pagarme_archive_notifications', '--days', '30', stdout=out)
+    assert out.getvalue() == '1 notificações arquivadas\n'
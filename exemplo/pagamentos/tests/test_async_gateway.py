@@ -0,0 +1,78 @@
+import base64
+import sys
+
+import pytest
+import responses
+from asgiref.sync import async_to_sync
+
+from django_pagarme import gateway
+
+ACCOUNT = 'loja2'
+TRANSACTION_URL = 'https://api.pagar.me/1/transactions/1234'
+
+
+@pytest.fixture(autouse=True)
+def accounts(settings):
+    settings.DJANGO_PAGARME_ACCOUNTS = {ACCOUNT: {'CHAVE_PAGARME_API_PRIVADA': 'chave_privada_loja2'}}
+
+
+@pytest.fixture
+def httpx_installed():
+    pytest.importorskip('httpx')
+
+
+@pytest.fixture
+def no_backoff(httpx_installed, mocker):
+    mocker.patch.object(gateway, 'ASYNC_GATEWAY_BACKOFF', 0)
+
+
+def _call(account, method, *args):
+    async def call():
+        return await getattr(gateway.get_async_client(account), method)(*args)
+
+    return async_to_sync(call)()
+
+
+@async_to_sync
+async def _clients(*accounts):
+    return [gateway.get_async_client(account) for account in accounts]
+
+
+def test_async_client_without_threads(httpx_installed):
+    client, same_client, default_client = _clients(ACCOUNT, ACCOUNT, gateway.DEFAULT_ACCOUNT)
+    assert isinstance(client, gateway.AsyncPagarmeClient)
+    assert client is same_client
+    assert client is not default_client
+
+
+def test_request_authenticated_with_account_key(httpx_installed):
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, TRANSACTION_URL, json={'id': 1234})
+        assert _call(ACCOUNT, 'find_transaction', '1234') == {'id': 1234}
+        authorization = rsps.calls[0].request.headers['Authorization'].split()[1]
+    assert base64.b64decode(authorization).decode() == 'chave_privada_loja2:'
+
+
+def test_get_retried_on_server_error(no_backoff):
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, TRANSACTION_URL, status=502, json={'errors': []})
+        rsps.add(responses.GET, TRANSACTION_URL, json={'id': 1234})
+        assert _call(ACCOUNT, 'find_transaction', '1234') == {'id': 1234}
+
+
+def test_post_not_retried(no_backoff):
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.POST, 'https://api.pagar.me/1/transactions', status=502, json={'errors': ['erro']})
+        with pytest.raises(Exception, match='erro'):
+            _call(ACCOUNT, 'create_transaction', {})
+        assert len(rsps.calls) == 1
+
+
+def test_threads_without_httpx(mocker):
+    mocker.patch.dict(sys.modules, {'httpx': None})
+    gateway._async_clients.clear()
+    client, = _clients(ACCOUNT)
+    assert isinstance(client, gateway._ThreadedAsyncPagarmeClient)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, TRANSACTION_URL, json={'id': 1234})
+        assert _call(ACCOUNT, 'find_transaction', '1234') == {'id': 1234}
@@ -0,0 +1,186 @@
+import asyncio
+import json
+
+import pytest
+import responses
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+from model_bakery import baker
+
+from assinaturas.tests.test_subscribe_credit_card import plan, subscription_json  # noqa: F401
+from django_assertions import assert_redirects
+from django_pagarme import async_facade, facade, views
+from django_pagarme.models import PagarmePayment, Subscription, UserPaymentProfile
+from pagamentos.tests.test_captura_credit_card import (  # noqa: F401
+    TRANSACTION_ID, captura_json, pagarme_responses, payment_config, payment_item, payment_status_listener, raw_post,
+    transaction_json, transaction_signature,
+)
+
+
+@pytest.fixture
+def resp(client, pagarme_responses, payment_status_listener, payment_item):  # noqa: F811
+    return client.get(
+        reverse('django_pagarme_async:capture', kwargs={'token': TRANSACTION_ID, 'slug': payment_item.slug})
+    )
+
+
+def test_capture_status_code(resp, payment_item):  # noqa: F811
+    assert resp.status_code == 302
+    assert resp.url == reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug})
+
+
+def test_capture_payment_saved(resp, payment_item):  # noqa: F811
+    payment = PagarmePayment.objects.get()
+    assert (payment.transaction_id, list(payment.items.all())) == (str(TRANSACTION_ID), [payment_item])
+    assert payment.status() == facade.PAID
+
+
+def test_capture_listener_executed(resp, payment_status_listener):  # noqa: F811
+    payment = facade.find_payment_by_transaction(str(TRANSACTION_ID))
+    payment_status_listener.assert_called_once_with(payment_id=payment.id)
+
+
+def test_acapture_outside_view(pagarme_responses, payment_item):  # noqa: F811
+    payment = async_to_sync(async_facade.acapture)(str(TRANSACTION_ID))
+    assert payment.status() == facade.PAID
+
+
+@pytest.fixture
+def resp_notification(client, raw_post, transaction_signature, payment_item):  # noqa: F811
+    return client.generic(
+        'POST',
+        reverse('django_pagarme_async:notification', kwargs={'slug': payment_item.slug}),
+        raw_post.encode('utf8'),
+        content_type='application/x-www-form-urlencoded',
+        HTTP_X_HUB_SIGNATURE=transaction_signature
+    )
+
+
+def test_notification_saved(resp_notification):
+    assert resp_notification.status_code == 200
+    payment = facade.find_payment_by_transaction(str(TRANSACTION_ID))
+    assert payment.status() == facade.AUTHORIZED
+
+
+def test_notification_invalid_signature(client, raw_post, payment_item):  # noqa: F811
+    resp = client.generic(
+        'POST',
+        reverse('django_pagarme_async:notification', kwargs={'slug': payment_item.slug}),
+        raw_post.encode('utf8'),
+        content_type='application/x-www-form-urlencoded',
+        HTTP_X_HUB_SIGNATURE='sha1=invalid'
+    )
+    assert resp.status_code == 400
+
+
+def test_notification_get_not_allowed(client, payment_item):  # noqa: F811
+    resp = client.get(reverse('django_pagarme_async:notification', kwargs={'slug': payment_item.slug}))
+    assert resp.status_code == 405
+
+
+@pytest.fixture
+def user_payment_profile(db):
+    return baker.make(UserPaymentProfile)
+
+
+@pytest.fixture
+def one_click_responses(transaction_json):  # noqa: F811
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.POST, 'https://api.pagar.me/1/transactions', json=transaction_json)
+        yield rsps
+
+
+def _post_one_click(client, payment_item):  # noqa: F811
+    return client.post(reverse('django_pagarme_async:one_click', kwargs={'slug': payment_item.slug}))
+
+
+def test_one_click_redirect_to_thanks(client, one_click_responses, payment_item, user_payment_profile):  # noqa: F811
+    client.force_login(user_payment_profile.user)
+    resp = _post_one_click(client, payment_item)
+    assert_redirects(resp, reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug}))
+
+
+def test_one_click_payment_saved(client, one_click_responses, payment_item, user_payment_profile):  # noqa: F811
+    client.force_login(user_payment_profile.user)
+    _post_one_click(client, payment_item)
+    payment = facade.find_payment_by_transaction(str(TRANSACTION_ID))
+    assert (payment.user_id, list(payment.items.all())) == (user_payment_profile.user_id, [payment_item])
+    assert payment.status() == facade.AUTHORIZED
+
+
+def test_one_click_requires_login(client, payment_item):  # noqa: F811
+    resp = _post_one_click(client, payment_item)
+    path = reverse('django_pagarme:pagarme', kwargs={'slug': payment_item.slug})
+    assert_redirects(resp, f'{path}?open_modal=true&review_informations=false', fetch_redirect_response=False)
+    assert not PagarmePayment.objects.exists()
+
+
+def test_one_click_get_redirect_to_payment_page(client, payment_item):  # noqa: F811
+    resp = client.get(reverse('django_pagarme_async:one_click', kwargs={'slug': payment_item.slug}))
+    assert_redirects(resp, reverse('django_pagarme:pagarme', kwargs={'slug': payment_item.slug}))
+
+
+@pytest.fixture
+def subscribe_responses(subscription_json):  # noqa: F811
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.POST, 'https://api.pagar.me/1/subscriptions', json=subscription_json)
+        yield rsps
+
+
+def _post_subscribe(client, plan):  # noqa: F811
+    data = {
+        'payment_method': 'credit_card',
+        'amount': plan.amount,
+        'customer': {'name': 'Zé', 'email': 'admin@example.com', 'document_number': '17911211019'},
+        'card_hash': 'some-card-hash==',
+    }
+    return client.post(
+        reverse('django_pagarme_async:subscribe', kwargs={'slug': plan.slug}),
+        json.dumps(data),
+        content_type='application/x-www-form-urlencoded'
+    )
+
+
+@pytest.fixture
+def logged_user(client, django_user_model):
+    user = baker.make(django_user_model)
+    client.force_login(user)
+    return user
+
+
+def test_subscribe_callback_url(client, logged_user, subscribe_responses, plan):  # noqa: F811
+    resp = _post_subscribe(client, plan)
+    assert resp.content.decode() == reverse('django_pagarme:thanks', kwargs={'slug': plan.slug})
+
+
+def test_subscribe_subscription_saved(client, logged_user, subscribe_responses, plan, subscription_json):  # noqa: F811
+    _post_subscribe(client, plan)
+    subscription = Subscription.objects.get()
+    assert (subscription.pagarme_id, subscription.plan, subscription.user) == (
+        str(subscription_json['id']), plan, logged_user
+    )
+    assert subscription.payments.get().user == logged_user
+
+
+def test_subscribe_anonymous_user_from_factory(client, subscribe_responses, plan, subscription_json):  # noqa: F811
+    _post_subscribe(client, plan)
+    assert Subscription.objects.get().user.email == subscription_json['customer']['email']
+
+
+@pytest.fixture
+def no_user_factory(transactional_db, mocker):
+    reverse('django_pagarme:thanks', kwargs={'slug': 'any'})  # loads urlconf, whose views set example user factory
+    mocker.patch.object(facade, '_user_factory', facade._default_factory)
+
+
+def test_subscribe_requires_login_without_user_factory(client, no_user_factory, subscribe_responses,
+                                                       plan):  # noqa: F811
+    resp = _post_subscribe(client, plan)
+    assert resp.status_code == 400
+    assert not Subscription.objects.exists()
+
+
+@pytest.mark.parametrize('view', [views.notification_async, views.subscribe_async])
+def test_csrf_exempt_view_still_coroutine(view):
+    assert asyncio.iscoroutinefunction(view)
+    assert view.csrf_exempt
@@ -0,0 +1,155 @@
+import re
+
+import pytest
+import responses
+from django.contrib.auth.models import Permission
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+
+from django_assertions import assert_contains
+from django_pagarme import facade
+from django_pagarme.models import DailyStatusAggregate, PagarmeNotification, PagarmePayment, PagarmePaymentItem
+from pagamentos.tests.test_captura_credit_card import (  # noqa: F401
+    captura_json, payment_config, payment_item, payment_status_listener, transaction_json,
+)
+
+TRANSACTIONS_IDS = [7656690, 7656691, 7656692]
+INVALID_TRANSACTION_ID = 7656699
+
+
+def _with_id(json_dict, transaction_id):
+    return dict(json_dict, id=transaction_id, tid=transaction_id, nsu=transaction_id)
+
+
+@pytest.fixture
+def pagarme_responses(transaction_json, captura_json):  # noqa: F811
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        for transaction_id in TRANSACTIONS_IDS:
+            url = f'https://api.pagar.me/1/transactions/{transaction_id}'
+            rsps.add(responses.GET, url, json=_with_id(transaction_json, transaction_id))
+            rsps.add(responses.POST, f'{url}/capture', json=_with_id(captura_json, transaction_id))
+        rsps.add(
+            responses.GET, f'https://api.pagar.me/1/transactions/{INVALID_TRANSACTION_ID}',
+            json={'errors': [{'message': 'Transaction not found'}]}, status=404
+        )
+        yield rsps
+
+
+@pytest.fixture
+def tokens():
+    return [str(transaction_id) for transaction_id in TRANSACTIONS_IDS]
+
+
+@pytest.fixture
+def results(pagarme_responses, payment_status_listener, tokens, capture_on_commit_callbacks):  # noqa: F811
+    with capture_on_commit_callbacks(execute=True):
+        return facade.capture_many(tokens + [str(INVALID_TRANSACTION_ID)], max_workers=2)
+
+
+def test_payments_returned_for_each_token(results, tokens):
+    assert [results[token].transaction_id for token in tokens] == tokens
+
+
+def test_error_returned_for_invalid_token(results):
+    assert isinstance(results[str(INVALID_TRANSACTION_ID)], Exception)
+
+
+def test_payments_saved_with_items(results, payment_item):  # noqa: F811
+    payments = PagarmePayment.objects.all()
+    assert len(payments) == len(TRANSACTIONS_IDS)
+    assert all(list(payment.items.all()) == [payment_item] for payment in payments)
+
+
+def test_payments_paid(results, tokens):
+    assert [facade.find_payment_by_transaction(token).status() for token in tokens] == [facade.PAID] * len(tokens)
+    assert [results[token].status() for token in tokens] == [facade.PAID] * len(tokens)
+
+
+def test_listener_called_for_each_payment(results, payment_status_listener):  # noqa: F811
+    assert payment_status_listener.call_count == len(TRANSACTIONS_IDS)
+
+
+def test_aggregate_incremented_once_per_payment(results, payment_item):  # noqa: F811
+    aggregate = DailyStatusAggregate.objects.get(status=facade.PAID)
+    assert (aggregate.count, aggregate.amount) == (len(TRANSACTIONS_IDS), len(TRANSACTIONS_IDS) * payment_item.price)
+
+
+def _count_inserts(queries, model) -> int:
+    # Table name matched as whole word, whatever quoting backend uses
+    insert = re.compile(rf'^\s*INSERT\s+INTO\s+\W?{model._meta.db_table}\b', re.IGNORECASE)
+    return sum(1 for query in queries if insert.match(query['sql']))
+
+
+def test_batched_inserts(pagarme_responses, tokens):
+    with CaptureQueriesContext(connection) as queries:
+        facade.capture_many(tokens)
+    models = [PagarmePayment, PagarmePaymentItem, PagarmeNotification]
+    assert [_count_inserts(queries, model) for model in models] == [1, 1, 1]
+
+
+def test_already_paid_payment_not_captured(pagarme_responses, tokens):
+    payment = baker.make(PagarmePayment, transaction_id=tokens[0])
+    baker.make(PagarmeNotification, payment=payment, status=facade.PAID)
+    results = facade.capture_many(tokens[:1])
+    assert results[tokens[0]] == payment
+    assert [call.request.method for call in pagarme_responses.calls] == ['GET']
+
+
+def test_admin_action(admin_client, pagarme_responses, tokens):
+    payments = [baker.make(PagarmePayment, transaction_id=token) for token in tokens]
+    for payment in payments:
+        baker.make(PagarmeNotification, payment=payment, status=facade.AUTHORIZED)
+    resp = admin_client.post(
+        reverse('admin:django_pagarme_pagarmepayment_changelist'),
+        {'action': 'capture_payments', '_selected_action': [payment.id for payment in payments], 'post': 'yes'}
+    )
+    assert resp.status_code == 302
+    assert [payment.status() for payment in payments] == [facade.PAID] * len(payments)
+
+
+def test_admin_action_asks_confirmation(admin_client, tokens):
+    payments = [baker.make(PagarmePayment, transaction_id=token, amount=1000) for token in tokens]
+    with responses.RequestsMock():
+        resp = admin_client.post(
+            reverse('admin:django_pagarme_pagarmepayment_changelist'),
+            {'action': 'capture_payments', '_selected_action': [payment.id for payment in payments]}
+        )
+    assert resp.status_code == 200
+    assert_contains(resp, f'total de R$ {len(payments) * 10},00')
+    assert_contains(resp, str(tokens[0]))
+
+
+def test_admin_action_requires_change_permission(client, django_user_model, tokens):
+    payments = [baker.make(PagarmePayment, transaction_id=token) for token in tokens]
+    user = baker.make(django_user_model, is_staff=True)
+    user.user_permissions.add(Permission.objects.get(codename='view_pagarmepayment'))
+    client.force_login(user)
+    changelist = client.get(reverse('admin:django_pagarme_pagarmepayment_changelist'))
+    assert 'capture_payments' not in dict(changelist.context['action_form'].fields['action'].choices)
+    with responses.RequestsMock() as rsps:
+        client.post(
+            reverse('admin:django_pagarme_pagarmepayment_changelist'),
+            {'action': 'capture_payments', '_selected_action': [payment.id for payment in payments], 'post': 'yes'}
+        )
+        assert len(rsps.calls) == 0
+
+
+def test_fallback_resolves_users_once(pagarme_responses, tokens, mocker):
+    user_factory = mocker.Mock(side_effect=facade.ImpossibleUserCreation)
+    mocker.patch.object(facade, '_user_factory', user_factory)
+    mocker.patch.object(PagarmePayment.objects, 'bulk_create', side_effect=IntegrityError)
+    results = facade.capture_many(tokens)
+    assert user_factory.call_count == len(tokens)
+    assert [results[token].status() for token in tokens] == [facade.PAID] * len(tokens)
+
+
+def test_bulk_created_ids_fetched_when_backend_does_not_return_them(db, tokens):
+    payments = [baker.make(PagarmePayment, transaction_id=token) for token in tokens]
+    for payment in payments:
+        payment.pk = None  # as returned by bulk_create on backends not returning rows
+    facade._set_bulk_created_ids(payments)
+    assert [payment.pk for payment in payments] == [
+        PagarmePayment.objects.get(transaction_id=token).pk for token in tokens
+    ]
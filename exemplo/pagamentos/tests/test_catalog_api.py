@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from model_bakery import baker
+
+from django_pagarme import async_facade, facade
+from django_pagarme.models import CatalogVersion, Plan
+from pagamentos.tests.test_captura_credit_card import payment_config, payment_item  # noqa: F401
+
+
+@pytest.fixture
+def plan(db):
+    return baker.make(Plan, slug='mensal', amount=1000, payment_methods='credit_card,boleto')
+
+
+@pytest.fixture
+def resp(client, payment_item, plan):  # noqa: F811
+    return client.get(reverse('django_pagarme:catalog'))
+
+
+def test_status_code(resp):
+    assert resp.status_code == 200
+
+
+def test_cache_control(resp):
+    assert resp['Cache-Control'] == 'public, max-age=60'
+
+
+def test_etag(resp):
+    assert resp['ETag'] == f'"{CatalogVersion.current().version}-0"'
+
+
+def test_items(resp, payment_item):  # noqa: F811
+    item, = resp.json()['items']
+    assert item['slug'] == payment_item.slug
+    assert item['price'] == payment_item.price
+    assert item['checkout_url'] == payment_item.get_checkout_url()
+    assert item['encryption_key'] == 'x'
+    assert item['form_config']['payments_methods'] == ['credit_card']
+    assert [plan['installments'] for plan in item['installments']] == list(range(1, 13))
+
+
+def test_plans(resp, plan):
+    dct, = resp.json()['plans']
+    assert dct['slug'] == plan.slug
+    assert dct['payment_methods'] == ['credit_card', 'boleto']
+    assert dct['subscribe_url'] == reverse('django_pagarme:subscribe', kwargs={'slug': plan.slug})
+
+
+def test_not_modified(client, resp, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        not_modified = client.get(reverse('django_pagarme:catalog'), HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert not_modified.status_code == 304
+
+
+def test_not_modified_since(client, resp):
+    last_modified = http_date(CatalogVersion.current().modified.timestamp())
+    assert resp['Last-Modified'] == last_modified
+    assert client.get(reverse('django_pagarme:catalog'), HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+
+
+def test_modified_after_item_change(client, resp, payment_item):  # noqa: F811
+    payment_item.price = 5000
+    payment_item.save()
+    modified = client.get(reverse('django_pagarme:catalog'), HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert modified.status_code == 200
+    assert modified.json()['items'][0]['price'] == 5000
+
+
+def test_catalog_version_changes_on_plan_delete(plan):
+    version = facade.get_catalog_version().version
+    plan.delete()
+    assert facade.get_catalog_version().version == version + 1
+
+
+def test_catalog_item(client, payment_item):  # noqa: F811
+    resp = client.get(reverse('django_pagarme:catalog_item', kwargs={'slug': payment_item.slug}))
+    assert resp.json()['slug'] == payment_item.slug
+
+
+def test_catalog_plan(client, plan):
+    resp = client.get(reverse('django_pagarme:catalog_plan', kwargs={'slug': plan.slug}))
+    assert resp.json()['slug'] == plan.slug
+
+
+def test_async_catalog(payment_item, plan):  # noqa: F811
+    assert async_to_sync(async_facade.aget_catalog)() == facade.get_catalog()
+    assert async_to_sync(async_facade.aget_catalog_etag)() == facade.get_catalog_etag()
+    assert async_to_sync(async_facade.aget_catalog_item)(payment_item.slug)['slug'] == payment_item.slug
+    assert async_to_sync(async_facade.aget_catalog_plan)(plan.slug)['slug'] == plan.slug
+
+
+@pytest.mark.parametrize('name', ['catalog_item', 'catalog_plan'])
+def test_not_found(client, db, name):
+    assert client.get(reverse(f'django_pagarme:{name}', kwargs={'slug': 'inexistent'})).status_code == 404
+
+
+def test_post_not_allowed(client, db):
+    assert client.post(reverse('django_pagarme:catalog')).status_code == 405
+
+
+def test_expired_entries_left_out(client, payment_item, plan):  # noqa: F811
+    payment_item.available_until = plan.available_until = timezone.now() - timedelta(days=1)
+    payment_item.save()
+    plan.save()
+    catalog = client.get(reverse('django_pagarme:catalog')).json()
+    assert catalog['items'] == []
+    assert catalog['plans'] == []
+    assert client.get(reverse('django_pagarme:catalog_item', kwargs={'slug': payment_item.slug})).status_code == 404
+
+
+def test_modified_after_expiration(client, payment_item, mocker):  # noqa: F811
+    available_until = timezone.now() + timedelta(minutes=1)
+    payment_item.available_until = available_until
+    payment_item.save()
+    resp = client.get(reverse('django_pagarme:catalog'))
+    assert len(resp.json()['items']) == 1
+    mocker.patch('django_pagarme.facade.timezone.now', return_value=available_until + timedelta(seconds=1))
+    modified = client.get(reverse('django_pagarme:catalog'), HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert modified.status_code == 200
+    assert modified.json()['items'] == []
+    assert modified['Last-Modified'] == http_date(available_until.timestamp())
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+
+from django_pagarme import facade
+from django_pagarme.models import (
+    DailyStatusAggregate, PagarmeItemConfig, PagarmePayment, PAYMENT_AGGREGATE, Plan, Subscription,
+    SUBSCRIPTION_AGGREGATE,
+)
+
+
+@pytest.fixture
+def payments(db, capture_on_commit_callbacks):
+    item = baker.make(PagarmeItemConfig, slug='pytools')
+    payments = baker.make(PagarmePayment, amount=1000, payment_method=facade.CREDIT_CARD, _quantity=2)
+    # aggregates are incremented after notifications transactions commit
+    with capture_on_commit_callbacks(execute=True):
+        for payment in payments:
+            payment.items.set([item])
+            facade._save_notification(payment.id, facade.AUTHORIZED)
+            facade._save_notification(payment.id, facade.PAID)
+    return payments
+
+
+@pytest.fixture
+def subscription(db, capture_on_commit_callbacks):
+    plan = baker.make(Plan, name='Mensal', amount=500)
+    subscription = baker.make(
+        Subscription, plan=plan, payment_method=facade.BOLETO, pagarme_id='123', initial_status=facade.TRIALING
+    )
+    with capture_on_commit_callbacks(execute=True):
+        facade._save_subscription_notification(subscription.pagarme_id, facade.PAID)
+    return subscription
+
+
+def _aggregates():
+    return {
+        (a.kind, a.day, a.item_slug, a.plan_slug, a.payment_method, a.status, a.count, a.amount)
+        for a in facade.list_daily_aggregates()
+    }
+
+
+def test_payment_aggregates_incremented(payments):
+    today = timezone.localdate()
+    assert _aggregates() == {
+        (PAYMENT_AGGREGATE, today, 'pytools', '', facade.CREDIT_CARD, facade.AUTHORIZED, 2, 2000),
+        (PAYMENT_AGGREGATE, today, 'pytools', '', facade.CREDIT_CARD, facade.PAID, 2, 2000),
+    }
+
+
+def test_subscription_aggregates_incremented(subscription):
+    assert _aggregates() == {
+        (SUBSCRIPTION_AGGREGATE, timezone.localdate(), '', 'mensal', facade.BOLETO, facade.PAID, 1, 500),
+    }
+
+
+def test_list_daily_aggregates_by_kind(payments, subscription):
+    assert {a.kind for a in facade.list_daily_aggregates(kind=SUBSCRIPTION_AGGREGATE)} == {SUBSCRIPTION_AGGREGATE}
+
+
+def test_aggregates_incremented_only_after_commit(db, capture_on_commit_callbacks):
+    payment = baker.make(PagarmePayment, amount=1000)
+    with capture_on_commit_callbacks() as callbacks:
+        facade._save_notification(payment.id, facade.PAID)
+        assert not DailyStatusAggregate.objects.exists()
+    assert len(callbacks) == 1
+
+
+def test_rebuild_matches_incremental_aggregates(payments, subscription):
+    incremental = _aggregates()
+    DailyStatusAggregate.objects.update(count=0, amount=0)
+    call_command('django_pagarme_rebuild_daily_aggregates', '--batch-size', '1', stdout=io.StringIO())
+    assert _aggregates() == incremental
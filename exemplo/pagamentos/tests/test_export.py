@@ -0,0 +1,103 @@
+import io
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+
+from django_pagarme import async_facade, facade
+from django_pagarme.models import ArchivedPagarmeNotification, PagarmeItemConfig, PagarmeNotification, PagarmePayment
+
+
+@pytest.fixture
+def payment(db):
+    payment = baker.make(PagarmePayment, transaction_id='1234', amount=3000, payment_method=facade.BOLETO)
+    payment.items.set([baker.make(PagarmeItemConfig, slug='pytools')])
+    baker.make(PagarmeNotification, payment=payment, status=facade.WAITING_PAYMENT)
+    baker.make(PagarmeNotification, payment=payment, status=facade.PAID)
+    return payment
+
+
+def test_export_payments_csv(payment):
+    lines = list(facade.export_payments())
+    assert lines[0] == ','.join(facade.PAYMENT_EXPORT_FIELDS) + '\r\n'
+    assert len(lines) == 2
+    assert ',1234,boleto,3000,' in lines[1]
+    assert ',pytools,paid,' in lines[1]
+
+
+def test_export_payments_jsonl(payment):
+    rows = [json.loads(line) for line in facade.export_payments(export_format='jsonl')]
+    assert len(rows) == 1
+    assert rows[0]['transaction_id'] == '1234'
+    assert rows[0]['item'] == 'pytools'
+    assert rows[0]['status'] == facade.PAID
+
+
+def test_export_notifications_jsonl(payment):
+    rows = [json.loads(line) for line in facade.export_notifications(export_format='jsonl')]
+    assert {row['status'] for row in rows} == {facade.WAITING_PAYMENT, facade.PAID}
+    assert {row['transaction_id'] for row in rows} == {'1234'}
+
+
+@pytest.fixture
+def archived_notification(payment):
+    return baker.make(ArchivedPagarmeNotification, payment=payment, status=facade.PROCESSING)
+
+
+def test_export_notifications_without_archived(archived_notification):
+    rows = [json.loads(line) for line in facade.export_notifications(export_format='jsonl')]
+    assert facade.PROCESSING not in {row['status'] for row in rows}
+    assert 'archived' not in rows[0]
+
+
+def test_export_notifications_include_archived(archived_notification):
+    rows = [json.loads(line) for line in facade.export_notifications(export_format='jsonl', include_archived=True)]
+    assert [(row['status'], row['archived']) for row in rows] == [
+        (facade.WAITING_PAYMENT, False), (facade.PAID, False), (facade.PROCESSING, True)
+    ]
+    assert rows[-1]['transaction_id'] == '1234'
+
+
+def test_export_selected_notifications_include_archived_of_same_payments(archived_notification):
+    baker.make(ArchivedPagarmeNotification, payment=baker.make(PagarmePayment))
+    notifications = PagarmeNotification.objects.filter(payment=archived_notification.payment, status=facade.PAID)
+    lines = list(facade.export_notifications(notifications, include_archived=True))
+    assert lines[0] == ','.join(facade.ARCHIVED_NOTIFICATION_EXPORT_FIELDS) + '\r\n'
+    assert [line.split(',')[3] for line in lines[1:]] == [facade.PAID, facade.PROCESSING]
+
+
+def test_export_command_include_archived(archived_notification):
+    out = io.StringIO()
+    call_command('django_pagarme_export', 'notifications', '--include-archived', stdout=out)
+    assert len(out.getvalue().splitlines()) == 4
+
+
+def test_async_export_payments(payment):
+    async def collect():
+        return [line async for line in async_facade.aexport_payments(export_format='jsonl')]
+
+    assert async_to_sync(collect)() == list(facade.export_payments(export_format='jsonl'))
+
+
+def test_export_invalid_format(db):
+    with pytest.raises(ValueError):
+        facade.export_payments(export_format='xml')
+
+
+def test_export_command(payment):
+    out = io.StringIO()
+    call_command('django_pagarme_export', 'notifications', stdout=out)
+    assert len(out.getvalue().splitlines()) == 3
+
+
+def test_export_admin_action(admin_client, payment):
+    resp = admin_client.post(
+        reverse('admin:django_pagarme_pagarmepayment_changelist'),
+        {'action': 'export_payments_csv', '_selected_action': [payment.id]}
+    )
+    assert resp.streaming
+    assert resp['Content-Disposition'] == 'attachment; filename="pagamentos.csv"'
+    assert len(b''.join(resp.streaming_content).splitlines()) == 2
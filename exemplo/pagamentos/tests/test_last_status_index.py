@@ -0,0 +1,55 @@
+import pytest
+from django.db import connection
+from django.utils import timezone
+from model_bakery import baker
+
+from django_pagarme.models import (
+    PagarmeNotification, PagarmePayment, SubscriptionNotification, last_payment_status_subquery,
+)
+
+only_sqlite = pytest.mark.skipif(
+    connection.vendor != 'sqlite', reason='Other databases may prefer sequential scan on small test tables'
+)
+
+
+def _index(model, name):
+    with connection.cursor() as cursor:
+        return connection.introspection.get_constraints(cursor, model._meta.db_table)[name]
+
+
+@pytest.mark.parametrize(
+    'model,name,fk_column',
+    [
+        (PagarmeNotification, 'notification_payment_last', 'payment_id'),
+        (SubscriptionNotification, 'notification_subscrip_last', 'subscription_id'),
+    ]
+)
+def test_last_status_index_exists(db, model, name, fk_column):
+    index = _index(model, name)
+    assert index['index']
+    assert index['columns'] == [fk_column, 'creation', 'id']
+    assert index['orders'] == ['ASC', 'DESC', 'DESC']
+
+
+@only_sqlite
+def test_payment_last_status_uses_index(db):
+    plan = PagarmeNotification.objects.filter(payment_id=1).order_by('-creation', '-id').values('status')[:1].explain()
+    assert 'USING INDEX notification_payment_last' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+@only_sqlite
+def test_subscription_last_status_uses_index(db):
+    notifications = SubscriptionNotification.objects.filter(subscription_id=1).order_by('-creation', '-id')
+    plan = notifications.values('status')[:1].explain()
+    assert 'USING INDEX notification_subscrip_last' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_last_status_tie_broken_by_id(db):
+    payment = baker.make(PagarmePayment)
+    for status in ['authorized', 'paid']:
+        baker.make(PagarmeNotification, payment=payment, status=status)
+    PagarmeNotification.objects.update(creation=timezone.now())
+    assert payment.status() == 'paid'
+    assert PagarmePayment.objects.annotate(last_status=last_payment_status_subquery()).get().last_status == 'paid'
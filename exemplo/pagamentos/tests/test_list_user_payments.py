@@ -0,0 +1,52 @@
+import pytest
+from model_bakery import baker
+
+from django_pagarme import facade
+from django_pagarme.models import PagarmeItemConfig, PagarmeNotification, PagarmePayment
+
+
+@pytest.fixture
+def user(django_user_model):
+    return baker.make(django_user_model)
+
+
+@pytest.fixture
+def payment_item(db):
+    return baker.make(PagarmeItemConfig)
+
+
+@pytest.fixture
+def payments(user, payment_item):
+    payments = baker.make(PagarmePayment, user=user, _quantity=5)
+    for payment in payments:
+        payment.items.set([payment_item])
+        baker.make(PagarmeNotification, payment=payment, status=facade.AUTHORIZED)
+        baker.make(PagarmeNotification, payment=payment, status=facade.PAID)
+    return payments
+
+
+@pytest.fixture
+def other_user_payment(django_user_model, payment_item):
+    payment = baker.make(PagarmePayment, user=baker.make(django_user_model))
+    baker.make(PagarmeNotification, payment=payment, status=facade.PAID)
+    return payment
+
+
+def test_only_user_payments_listed(payments, other_user_payment, user):
+    assert facade.list_user_payments(user) == sorted(payments, key=lambda p: p.id, reverse=True)
+
+
+def test_status_and_items_prefetched(payments, user, payment_item, django_assert_num_queries):
+    with django_assert_num_queries(2):
+        user_payments = facade.list_user_payments(user.id)
+        for payment in user_payments:
+            assert payment.status() == facade.PAID
+            assert list(payment.items.all()) == [payment_item]
+
+
+def test_keyset_pagination(payments, user):
+    first_page = facade.list_user_payments(user, limit=3)
+    second_page = facade.list_user_payments(user, before_id=first_page[-1].id, limit=3)
+    assert len(first_page) == 3
+    assert len(second_page) == 2
+    assert set(first_page).isdisjoint(second_page)
@@ -1,12 +1,14 @@
+import json
+
 import pytest
 import responses
+from django.db import IntegrityError
 from django.urls import reverse
 from model_bakery import baker
 
 from django_assertions import assert_redirects
-from django_pagarme.models import PagarmeFormConfig, PagarmeItemConfig, UserPaymentProfile
-
-baker.generators.add('phonenumber_field.modelfields.PhoneNumberField', lambda: '00000000000')
+from django_pagarme import facade
+from django_pagarme.models import PagarmeFormConfig, PagarmeItemConfig, PagarmePayment, UserPaymentProfile
 
 
 @pytest.fixture
@@ -41,7 +43,7 @@ def upsell(payment_config):
 
 
 @pytest.fixture
-def user_payment_profile():
+def user_payment_profile(db):
     yield baker.make(UserPaymentProfile)
 
 
@@ -71,6 +73,88 @@ def test_post_request_should_redirect_to_thank_you_page(resp, payment_item):
     assert_redirects(resp, reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug}))
 
 
+def test_transaction_created_synchronously_by_default(resp, pagarme_responses):
+    request_body = json.loads(pagarme_responses.calls[0].request.body)
+    assert request_body['async'] is False
+
+
+def test_customer_and_billing_sent_from_profile(resp, pagarme_responses, user_payment_profile):
+    request_body = json.loads(pagarme_responses.calls[0].request.body)
+    assert request_body['customer'] == user_payment_profile.to_customer_api_dict()
+    assert request_body['billing'] == user_payment_profile.to_billing_dict()
+
+
+@pytest.fixture
+def resp_async(client, pagarme_responses, payment_item, user_payment_profile, settings):
+    settings.DJANGO_PAGARME_ONE_CLICK_ASYNC = True
+    client.force_login(user_payment_profile.user)
+    return client.post(reverse('django_pagarme:one_click', kwargs={'slug': payment_item.slug}))
+
+
+def test_async_capture_redirect_to_thank_you_page(resp_async, payment_item):
+    assert_redirects(resp_async, reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug}))
+
+
+def test_async_capture_flag_sent_to_pagarme(resp_async, pagarme_responses):
+    request_body = json.loads(pagarme_responses.calls[0].request.body)
+    assert request_body['async'] is True
+
+
+def test_one_click_payload_cached(user_payment_profile, django_assert_num_queries):
+    payload = facade._one_click_payload(user_payment_profile.user_id)
+    with django_assert_num_queries(0):
+        assert payload == facade._one_click_payload(user_payment_profile.user_id)
+
+
+def test_one_click_payload_invalidated_on_profile_save(user_payment_profile):
+    facade._one_click_payload(user_payment_profile.user_id)
+    user_payment_profile.name = 'Changed Name'
+    user_payment_profile.save()
+    assert facade._one_click_payload(user_payment_profile.user_id)['customer']['name'] == 'Changed Name'
+
+
+def test_payment_saved_on_one_click(resp, user_payment_profile, payment_item):
+    payment = facade.find_payment_by_transaction(TRANSACTION_ID)
+    assert payment.user_id == user_payment_profile.user_id
+    assert payment.amount == payment_item.price
+    assert payment.card_id == user_payment_profile.card_id
+    assert list(payment.items.all()) == [payment_item]
+
+
+def test_notification_saved_on_one_click(resp):
+    payment = facade.find_payment_by_transaction(TRANSACTION_ID)
+    assert payment.status() == facade.AUTHORIZED
+
+
+def test_existing_payment_kept_when_postback_arrives_first(
+        pagarme_responses, payment_item, user_payment_profile, transaction_json):
+    existing_payment = baker.make(PagarmePayment, transaction_id=str(TRANSACTION_ID))
+    facade.one_click_buy(payment_item.slug, user_payment_profile.user)
+    assert list(PagarmePayment.objects.all()) == [existing_payment]
+
+
+def test_one_click_buy_returns_pagarme_transaction(
+        pagarme_responses, payment_item, user_payment_profile, transaction_json):
+    assert facade.one_click_buy(payment_item.slug, user_payment_profile.user) == transaction_json
+
+
+@pytest.fixture
+def failing_listener(mocker):
+    listener = mocker.Mock(side_effect=IntegrityError())
+    facade.add_payment_status_changed(listener)
+    yield listener
+    facade._payment_status_changed_listeners.remove(listener)
+
+
+def test_payment_kept_when_listener_fails(
+        pagarme_responses, payment_item, user_payment_profile, transaction_json, failing_listener):
+    with pytest.raises(IntegrityError):
+        facade.one_click_buy(payment_item.slug, user_payment_profile.user)
+    payment = facade.find_payment_by_transaction(TRANSACTION_ID)
+    failing_listener.assert_called_once_with(payment_id=payment.id)
+    assert payment.status() == facade.AUTHORIZED
+
+
 TRANSACTION_ID = 7956027
 
 
@@ -0,0 +1,154 @@
+import base64
+import hmac
+from hashlib import sha1
+
+import pytest
+import responses
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError
+from django.template import Context, Template
+from django.urls import reverse
+from model_bakery import baker
+
+from django_pagarme import facade, gateway
+from django_pagarme.models import PagarmePayment, PaymentViolation, Plan, Subscription
+from pagamentos.tests.test_captura_credit_card import (  # noqa: F401
+    TRANSACTION_ID, captura_json, payment_config, payment_item, transaction_json,
+)
+
+ACCOUNT = 'loja2'
+ACCOUNT_KEYS = {
+    'CHAVE_PAGARME_API_PRIVADA': 'chave_privada_loja2',
+    'CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA': 'chave_publica_loja2',
+}
+
+
+@pytest.fixture(autouse=True)
+def accounts(settings):
+    settings.DJANGO_PAGARME_ACCOUNTS = {ACCOUNT: ACCOUNT_KEYS}
+
+
+@pytest.fixture
+def account_item(payment_item):  # noqa: F811
+    payment_item.account = ACCOUNT
+    payment_item.save()
+    return payment_item
+
+
+def _authorization(call):
+    return base64.b64decode(call.request.headers['Authorization'].split()[1]).decode()
+
+
+def test_client_reused_per_account():
+    assert gateway.get_client(ACCOUNT) is gateway.get_client(ACCOUNT)
+    assert gateway.get_client(ACCOUNT) is not gateway.get_client()
+
+
+def test_unknown_account():
+    with pytest.raises(ImproperlyConfigured):
+        gateway.get_client('inexistent')
+
+
+def test_clients_renewed_when_accounts_change(settings):
+    client = gateway.get_client(ACCOUNT)
+    settings.DJANGO_PAGARME_ACCOUNTS = {ACCOUNT: dict(ACCOUNT_KEYS, CHAVE_PAGARME_API_PRIVADA='outra')}
+    assert gateway.get_client(ACCOUNT) is not client
+
+
+def test_find_account(account_item):
+    assert facade.find_account(account_item.slug) == ACCOUNT
+    assert facade.find_account('inexistent') == gateway.DEFAULT_ACCOUNT
+
+
+def test_capture_uses_item_account(client, account_item, transaction_json, captura_json):  # noqa: F811
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f'https://api.pagar.me/1/transactions/{TRANSACTION_ID}', json=transaction_json)
+        rsps.add(
+            responses.POST, f'https://api.pagar.me/1/transactions/{TRANSACTION_ID}/capture', json=captura_json
+        )
+        client.get(reverse('django_pagarme:capture', kwargs={'token': TRANSACTION_ID, 'slug': account_item.slug}))
+        assert [_authorization(call) for call in rsps.calls] == [f'{ACCOUNT_KEYS["CHAVE_PAGARME_API_PRIVADA"]}:'] * 2
+    assert PagarmePayment.objects.get(transaction_id=TRANSACTION_ID).account == ACCOUNT
+
+
+def _signature(key, raw_post):
+    return 'sha1=' + hmac.new(key.encode(), raw_post.encode(), sha1).hexdigest()
+
+
+@pytest.mark.parametrize(
+    'key,status_code', [(ACCOUNT_KEYS['CHAVE_PAGARME_API_PRIVADA'], 200), ('y', 400)]
+)
+def test_postback_validated_with_account_key(client, account_item, key, status_code):
+    payment = baker.make(PagarmePayment, transaction_id='1234', account=ACCOUNT)
+    payment.items.set([account_item])
+    raw_post = 'event=transaction_status_changed&current_status=paid&transaction%5Bid%5D=1234'
+    resp = client.generic(
+        'POST',
+        reverse('django_pagarme:notification', kwargs={'slug': account_item.slug}),
+        raw_post.encode('utf8'),
+        content_type='application/x-www-form-urlencoded',
+        HTTP_X_HUB_SIGNATURE=_signature(key, raw_post)
+    )
+    assert resp.status_code == status_code
+
+
+def test_postback_of_other_account_payment_rejected(client, account_item):
+    payment = baker.make(PagarmePayment, transaction_id='1234')
+    raw_post = 'event=transaction_status_changed&current_status=paid&transaction%5Bid%5D=1234'
+    resp = client.generic(
+        'POST',
+        reverse('django_pagarme:notification', kwargs={'slug': account_item.slug}),
+        raw_post.encode('utf8'),
+        content_type='application/x-www-form-urlencoded',
+        HTTP_X_HUB_SIGNATURE=_signature(ACCOUNT_KEYS['CHAVE_PAGARME_API_PRIVADA'], raw_post)
+    )
+    assert resp.status_code == 400
+    assert not payment.notifications.exists()
+
+
+def test_subscription_postback_of_other_account_rejected(db):
+    subscription = baker.make(Subscription, pagarme_id='526141', plan=baker.make(Plan))
+    raw_post = 'id=526141&current_status=paid'
+    with pytest.raises(PaymentViolation):
+        facade.handle_subscription_notification(
+            subscription.pagarme_id, 'paid', raw_post, _signature(ACCOUNT_KEYS['CHAVE_PAGARME_API_PRIVADA'], raw_post),
+            {}, ACCOUNT
+        )
+    assert not subscription.notifications.exists()
+
+
+def test_postback_key_different_from_api_key(settings):
+    settings.DJANGO_PAGARME_ACCOUNTS = {ACCOUNT: dict(ACCOUNT_KEYS, CHAVE_PAGARME_POSTBACK='chave_postback')}
+    assert gateway.get_client(ACCOUNT).validate_postback(_signature('chave_postback', 'a=1'), 'a=1')
+
+
+def test_checkout_uses_account_public_key(account_item):
+    rendered = Template('{% load django_pagarme %}{% show_pagarme payment_item %}').render(
+        Context({'payment_item': account_item})
+    )
+    assert ACCOUNT_KEYS['CHAVE_PAGARME_CRIPTOGRAFIA_PUBLICA'] in rendered
+
+
+def test_plans_synchronized_per_account(db):
+    plan_json = {
+        'amount': 1000, 'days': 30, 'name': 'Plano', 'trial_days': 0, 'payment_methods': ['boleto'],
+        'charges': None, 'invoice_reminder': None,
+    }
+    baker.make(Plan, pagarme_id='orphan', account=ACCOUNT)
+    default_plan = baker.make(Plan, pagarme_id='1')
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, 'https://api.pagar.me/1/plans', json=[dict(plan_json, id=2)])
+        facade.synchronize_plans(ACCOUNT)
+    assert list(Plan.objects.filter(account=ACCOUNT).values_list('pagarme_id', flat=True)) == ['2']
+    assert Plan.objects.filter(id=default_plan.id).exists()
+
+
+def test_capture_fallback_keeps_account(account_item, transaction_json, captura_json, mocker):  # noqa: F811
+    mocker.patch.object(PagarmePayment.objects, 'bulk_create', side_effect=IntegrityError)
+    with responses.RequestsMock() as rsps:
+        rsps.add(responses.GET, f'https://api.pagar.me/1/transactions/{TRANSACTION_ID}', json=transaction_json)
+        rsps.add(
+            responses.POST, f'https://api.pagar.me/1/transactions/{TRANSACTION_ID}/capture', json=captura_json
+        )
+        facade.capture_many([str(TRANSACTION_ID)], account=ACCOUNT)
+    assert PagarmePayment.objects.get(transaction_id=TRANSACTION_ID).account == ACCOUNT
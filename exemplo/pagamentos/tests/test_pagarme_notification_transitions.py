@@ -43,6 +43,7 @@ def test_repeated_notification_not_saved(status, pagarme_payment):
         (facade.REFUNDED, facade.WAITING_PAYMENT),
         (facade.REFUNDED, facade.AUTHORIZED),
         (facade.REFUNDED, facade.AUTHORIZED),
+        (facade.REFUNDED, facade.PENDING_REFUND),
     ]
 )
 def test_invalid_transition(status_from, status_to, pagarme_payment):
@@ -1,10 +1,12 @@
 import pytest
-from django.urls import reverse
+from django.urls import reverse, set_script_prefix
 from django.utils.http import urlencode
 from model_bakery import baker
 
 from django_assertions import assert_contains, assert_not_contains, assert_templates_used, assert_templates_not_used
+from django_pagarme import urls_cache
 from django_pagarme.models import PagarmeFormConfig, PagarmeItemConfig, UserPaymentProfile
+from django_pagarme.templatetags import django_pagarme as django_pagarme_tags
 
 
 @pytest.fixture
@@ -183,3 +185,48 @@ def test_payment_profile_precedes_logged_user(resp_logged_user_with_payment_prof
     assert_contains(resp_logged_user_with_payment_profile, payment_profile.document_number)
     assert_contains(resp_logged_user_with_payment_profile, payment_profile.document_type)
     assert_contains(resp_logged_user_with_payment_profile, payment_profile.customer_type)
+
+
+def test_capture_url(resp, payment_item: PagarmeItemConfig):
+    capture_url = reverse('django_pagarme:capture', kwargs={'slug': payment_item.slug, 'token': 'f'})
+    assert_contains(resp, f"window.location.href = '{capture_url[:-1]}' + data['token']")
+
+
+def test_postback_url(settings, resp, payment_item: PagarmeItemConfig):
+    notification_path = reverse('django_pagarme:notification', kwargs={'slug': payment_item.slug})
+    assert_contains(resp, f"postback_url: 'https://{settings.ALLOWED_HOSTS[0]}{notification_path}'")
+
+
+def test_checkout_urls_reversed_once_per_slug(client, payment_item, mocker):
+    client.get(reverse('django_pagarme:pagarme', kwargs={'slug': payment_item.slug}))
+    reverse_spy = mocker.spy(urls_cache, 'reverse')
+    client.get(reverse('django_pagarme:pagarme', kwargs={'slug': payment_item.slug}))
+    assert reverse_spy.call_count == 0
+
+
+def test_checkout_urls_follow_script_prefix(payment_item):
+    set_script_prefix('/loja/')
+    try:
+        urls = django_pagarme_tags._checkout_urls(payment_item.slug)
+    finally:
+        set_script_prefix('/')
+    assert urls['subscribe_url'].startswith('/loja/')
+    assert urls['capture_url_prefix'].startswith('/loja/')
+    assert urls['postback_url'].endswith(f'/loja/checkout/notification/{payment_item.slug}')
+
+
+def test_checkout_not_modified(client, resp, payment_item, django_assert_num_queries):
+    path = reverse('django_pagarme:pagarme', kwargs={'slug': payment_item.slug})
+    with django_assert_num_queries(0):
+        not_modified = client.get(path, HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert not_modified.status_code == 304
+
+
+def test_checkout_modified_after_csrf_secret_change(client, resp, payment_item):
+    client.cookies.clear()
+    path = reverse('django_pagarme:pagarme', kwargs={'slug': payment_item.slug})
+    assert client.get(path, HTTP_IF_NONE_MATCH=resp['ETag']).status_code == 200
+
+
+def test_checkout_without_etag_for_logged_user(resp_logged_user):
+    assert not resp_logged_user.has_header('ETag')
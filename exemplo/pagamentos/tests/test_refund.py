@@ -0,0 +1,167 @@
+import io
+import json
+
+import pytest
+import responses
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Permission
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from model_bakery import baker
+
+from django_assertions import assert_contains
+from django_pagarme import async_facade, facade
+from django_pagarme.models import PagarmeItemConfig, PagarmeNotification, PagarmePayment
+from django_pagarme.templatetags.django_pagarme import cents_to_brl
+
+TRANSACTIONS_IDS = ['1001', '1002', '1003']
+
+
+@pytest.fixture
+def payment_item(db):
+    return baker.make(PagarmeItemConfig, slug='evento-cancelado')
+
+
+@pytest.fixture
+def payments(payment_item):
+    payments = []
+    for transaction_id in TRANSACTIONS_IDS:
+        payment = baker.make(PagarmePayment, transaction_id=transaction_id, payment_method=facade.CREDIT_CARD)
+        payment.items.set([payment_item])
+        baker.make(PagarmeNotification, payment=payment, status=facade.PAID)
+        payments.append(payment)
+    return payments
+
+
+@pytest.fixture
+def pagarme_responses():
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        for transaction_id in TRANSACTIONS_IDS:
+            rsps.add(
+                responses.POST, f'https://api.pagar.me/1/transactions/{transaction_id}/refund',
+                json={'id': int(transaction_id), 'status': facade.PENDING_REFUND}
+            )
+        yield rsps
+
+
+def test_refund_saves_pending_refund(payments, pagarme_responses):
+    payment = facade.refund(TRANSACTIONS_IDS[0])
+    assert payment.status() == facade.PENDING_REFUND
+    assert facade.find_payment_by_transaction(TRANSACTIONS_IDS[0]).status() == facade.PENDING_REFUND
+
+
+def test_refund_sends_bank_account(payments, pagarme_responses):
+    bank_account = {'bank_code': '341', 'agencia': '0932'}
+    facade.refund(TRANSACTIONS_IDS[0], bank_account=bank_account)
+    assert json.loads(pagarme_responses.calls[0].request.body) == {'bank_account': bank_account}
+
+
+def test_refund_saves_refunded_when_gateway_refunds_immediately(payments):
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.POST, f'https://api.pagar.me/1/transactions/{TRANSACTIONS_IDS[0]}/refund',
+            json={'id': int(TRANSACTIONS_IDS[0]), 'status': facade.REFUNDED}
+        )
+        payment = facade.refund(TRANSACTIONS_IDS[0])
+    assert payment.status() == facade.REFUNDED
+    assert facade.find_payment_by_transaction(TRANSACTIONS_IDS[0]).status() == facade.REFUNDED
+
+
+def test_refund_not_refundable_status(payments, pagarme_responses):
+    baker.make(PagarmeNotification, payment=payments[0], status=facade.REFUNDED)
+    with pytest.raises(facade.ImpossibleRefund):
+        facade.refund(TRANSACTIONS_IDS[0])
+    assert not pagarme_responses.calls
+
+
+def test_refund_reconciled_with_postbacks(payments, pagarme_responses):
+    facade.refund(TRANSACTIONS_IDS[0])
+    payment = payments[0]
+    with pytest.raises(facade.InvalidNotificationStatusTransition):
+        facade._save_notification(payment.id, facade.PENDING_REFUND)
+    facade._save_notification(payment.id, facade.REFUNDED)
+    assert payment.status() == facade.REFUNDED
+
+
+def test_refund_many(payments, pagarme_responses):
+    results = facade.refund_many(TRANSACTIONS_IDS + ['inexistent'], max_workers=2)
+    assert [results[transaction_id].status() for transaction_id in TRANSACTIONS_IDS] == [facade.PENDING_REFUND] * 3
+    assert isinstance(results['inexistent'], PagarmePayment.DoesNotExist)
+
+
+def test_refund_payments_resumes_from_not_refunded(payments, pagarme_responses):
+    facade.refund(TRANSACTIONS_IDS[0])
+    batches = list(facade.refund_payments(batch_size=1))
+    assert [list(results) for results in batches] == [[TRANSACTIONS_IDS[1]], [TRANSACTIONS_IDS[2]]]
+
+
+def test_async_refund_payments(payments, pagarme_responses):
+    async def collect():
+        return [list(results) async for results in async_facade.arefund_payments(batch_size=2)]
+
+    assert async_to_sync(collect)() == [TRANSACTIONS_IDS[:2], TRANSACTIONS_IDS[2:]]
+
+
+def test_refund_payments_retries_errors_only_on_next_run(payments):
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.POST, f'https://api.pagar.me/1/transactions/{TRANSACTIONS_IDS[0]}/refund',
+            json={'errors': [{'message': 'Internal error'}]}, status=500
+        )
+        for transaction_id in TRANSACTIONS_IDS[1:]:
+            rsps.add(
+                responses.POST, f'https://api.pagar.me/1/transactions/{transaction_id}/refund',
+                json={'id': int(transaction_id), 'status': facade.PENDING_REFUND}
+            )
+        batches = list(facade.refund_payments(batch_size=2))
+    assert len(batches) == 2
+    assert isinstance(batches[0][TRANSACTIONS_IDS[0]], Exception)
+    assert [payment.status() for payment in payments] == [facade.PAID, facade.PENDING_REFUND, facade.PENDING_REFUND]
+
+
+def test_refund_command(payments, pagarme_responses, payment_item):
+    out = io.StringIO()
+    call_command('django_pagarme_refund', '--item', payment_item.slug, stdout=out)
+    assert '3 estornos solicitados, 0 erros' in out.getvalue()
+    assert [payment.status() for payment in payments] == [facade.PENDING_REFUND] * 3
+
+
+def test_refund_command_requires_filter(payments):
+    with pytest.raises(CommandError):
+        call_command('django_pagarme_refund')
+    assert [payment.status() for payment in payments] == [facade.PAID] * 3
+
+
+def test_refund_command_all(payments, pagarme_responses):
+    out = io.StringIO()
+    call_command('django_pagarme_refund', '--all', stdout=out)
+    assert '3 estornos solicitados, 0 erros' in out.getvalue()
+
+
+def test_admin_action(admin_client, payments, pagarme_responses):
+    resp = admin_client.post(
+        reverse('admin:django_pagarme_pagarmepayment_changelist'),
+        {'action': 'refund_payments', '_selected_action': [payment.id for payment in payments], 'post': 'yes'}
+    )
+    assert resp.status_code == 302
+    assert [payment.status() for payment in payments] == [facade.PENDING_REFUND] * 3
+
+
+def test_admin_action_asks_confirmation(admin_client, payments):
+    resp = admin_client.post(
+        reverse('admin:django_pagarme_pagarmepayment_changelist'),
+        {'action': 'refund_payments', '_selected_action': [payment.id for payment in payments]}
+    )
+    assert resp.status_code == 200
+    total = sum(payment.amount for payment in payments)
+    assert_contains(resp, f'total de {cents_to_brl(total)}')
+    assert [payment.status() for payment in payments] == [facade.PAID] * 3
+
+
+@pytest.mark.parametrize('permissions,allowed', [(['change_pagarmepayment'], False), (['refund_pagarmepayment'], True)])
+def test_admin_action_requires_refund_permission(client, django_user_model, payments, permissions, allowed):
+    user = baker.make(django_user_model, is_staff=True)
+    user.user_permissions.set(Permission.objects.filter(codename__in=['view_pagarmepayment', *permissions]))
+    client.force_login(user)
+    changelist = client.get(reverse('admin:django_pagarme_pagarmepayment_changelist'))
+    assert ('refund_payments' in dict(changelist.context['action_form'].fields['action'].choices)) is allowed
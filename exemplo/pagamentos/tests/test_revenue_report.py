@@ -0,0 +1,81 @@
+import io
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from django_pagarme import facade
+from django_pagarme.models import PagarmeItemConfig, PagarmeNotification, PagarmePayment
+
+
+@pytest.fixture
+def pytools(db):
+    return baker.make(PagarmeItemConfig, slug='pytools')
+
+
+@pytest.fixture
+def payments(pytools):
+    statuses = [facade.PAID, facade.PAID, facade.REFUSED]
+    payments = []
+    for amount, status in zip([1000, 2000, 4000], statuses):
+        payment = baker.make(PagarmePayment, amount=amount, payment_method=facade.CREDIT_CARD)
+        payment.items.set([pytools])
+        baker.make(PagarmeNotification, payment=payment, status=facade.AUTHORIZED)
+        baker.make(PagarmeNotification, payment=payment, status=status)
+        payments.append(payment)
+    return payments
+
+
+def test_report_by_status(payments, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        report = facade.revenue_report()
+    assert report == [
+        {'status': facade.PAID, 'count': 2, 'amount': 3000},
+        {'status': facade.REFUSED, 'count': 1, 'amount': 4000},
+    ]
+
+
+def test_report_by_item_and_payment_method(payments):
+    assert facade.revenue_report(['item', 'payment_method'], statuses=[facade.PAID]) == [
+        {'item': 'pytools', 'payment_method': facade.CREDIT_CARD, 'count': 2, 'amount': 3000},
+    ]
+
+
+def test_report_date_range(payments):
+    now = timezone.now()
+    assert facade.revenue_report(start=now - timedelta(days=1), end=now + timedelta(days=1)) != []
+    assert facade.revenue_report(start=now + timedelta(days=1)) == []
+
+
+def test_report_invalid_group(db):
+    with pytest.raises(ValueError):
+        facade.revenue_report(['foo'])
+
+
+def test_report_command_csv(payments):
+    out = io.StringIO()
+    call_command('django_pagarme_revenue_report', '--group-by', 'item', 'status', stdout=out)
+    assert out.getvalue().splitlines() == [
+        'item,status,count,amount',
+        'pytools,paid,2,3000',
+        'pytools,refused,1,4000',
+    ]
+
+
+def test_report_admin_view(admin_client, payments):
+    resp = admin_client.get(reverse('admin:django_pagarme_pagarmepayment_revenue_report'), {'group_by': 'item'})
+    assert resp.status_code == 200
+    assert resp.context['rows'] == [{'item': 'pytools', 'count': 3, 'amount': 7000}]
+
+
+@pytest.mark.parametrize('permissions,status_code', [([], 403), (['view_pagarmepayment'], 200)])
+def test_report_admin_view_permission(client, django_user_model, payments, permissions, status_code):
+    user = baker.make(django_user_model, is_staff=True)
+    user.user_permissions.set(Permission.objects.filter(codename__in=permissions))
+    client.force_login(user)
+    resp = client.get(reverse('admin:django_pagarme_pagarmepayment_revenue_report'))
+    assert resp.status_code == status_code
@@ -64,3 +64,29 @@ def test_thanks_with_slug_suffix_used(client, upsell):
     resp = client.get(reverse('django_pagarme:thanks', kwargs={'slug': upsell.slug}))
     assert_templates_not_used(resp, 'django_pagarme/thanks.html')
     assert_templates_used(resp, 'django_pagarme/thanks_upsell_slug.html')
+
+
+def test_thanks_not_modified(client, resp, payment_item, django_assert_num_queries):
+    path = reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug})
+    with django_assert_num_queries(0):
+        not_modified = client.get(path, HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert not_modified.status_code == 304
+
+
+def test_thanks_modified_after_item_change(client, resp, payment_item):
+    payment_item.name = 'Outro nome'
+    payment_item.save()
+    path = reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug})
+    assert client.get(path, HTTP_IF_NONE_MATCH=resp['ETag']).status_code == 200
+
+
+def test_thanks_modified_after_pages_version_change(client, resp, payment_item, settings):
+    settings.DJANGO_PAGARME_PAGES_VERSION = 'deploy-2'
+    path = reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug})
+    assert client.get(path, HTTP_IF_NONE_MATCH=resp['ETag']).status_code == 200
+
+
+def test_thanks_without_etag_for_logged_user(client, payment_item, django_user_model):
+    client.force_login(baker.make(django_user_model))
+    resp = client.get(reverse('django_pagarme:thanks', kwargs={'slug': payment_item.slug}))
+    assert not resp.has_header('ETag')
@@ -83,3 +83,32 @@ def test_strategy_called(resp_available_item_with_unavailable_strategy,
         available_payment_item_config,
         resp_available_item_with_unavailable_strategy.wsgi_request
     )
+
+
+def test_unavailable_page_not_modified(client, unavailable_payment_item_config):
+    path = reverse('django_pagarme:unavailable', kwargs={'slug': unavailable_payment_item_config.slug})
+    etag = client.get(path)['ETag']
+    assert client.get(path, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+def test_checkout_modified_after_item_becomes_unavailable(client, available_payment_item_config, mocker):
+    available_payment_item_config.available_until = timezone.now() + timedelta(hours=1)
+    available_payment_item_config.save()
+    path = reverse('django_pagarme:pagarme', kwargs={'slug': available_payment_item_config.slug})
+    etag = client.get(path)['ETag']
+    assert client.get(path, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    mocker.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(hours=2))
+    resp = client.get(path, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 302
+    assert resp['Location'] == reverse(
+        'django_pagarme:unavailable', kwargs={'slug': available_payment_item_config.slug}
+    )
+
+
+def test_checkout_modified_when_strategy_result_changes(client, available_payment_item_config,
+                                                        unavailable_strategy_mock):
+    unavailable_strategy_mock.return_value = True
+    path = reverse('django_pagarme:pagarme', kwargs={'slug': available_payment_item_config.slug})
+    etag = client.get(path)['ETag']
+    unavailable_strategy_mock.return_value = False
+    assert client.get(path, HTTP_IF_NONE_MATCH=etag).status_code == 302
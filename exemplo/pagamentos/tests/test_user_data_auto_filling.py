@@ -1,10 +1,14 @@
 import pytest
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from model_bakery import baker
 
 from django_assertions import assert_contains
-from django_pagarme.models import PagarmeFormConfig, PagarmeItemConfig, UserPaymentProfile
+from django_pagarme import facade
+from django_pagarme.models import PagarmeFormConfig, PagarmeItemConfig, UserPaymentProfile, payment_profile_cache_key
 
 
 @pytest.fixture
@@ -88,3 +92,52 @@ def test_profile_first_name_is_present(resp_with_payment_profile, payment_profil
 
 def test_profile_phone_is_present(resp_with_payment_profile, payment_profile):
     assert_contains(resp_with_payment_profile, payment_profile.phone)
+
+
+def test_checkout_profile_cached(payment_profile, django_assert_num_queries):
+    checkout_profile = facade.get_user_checkout_profile(payment_profile.user_id)
+    with django_assert_num_queries(0):
+        assert facade.get_user_checkout_profile(payment_profile.user_id) == checkout_profile
+    assert checkout_profile == {
+        'customer': payment_profile.to_customer_dict(),
+        'address': payment_profile.to_billing_address_dict(),
+    }
+
+
+def test_checkout_profile_absence_cached(logged_user, django_assert_num_queries):
+    with pytest.raises(facade.UserPaymentProfileDoesNotExist):
+        facade.get_user_checkout_profile(logged_user)
+    with django_assert_num_queries(0), pytest.raises(facade.UserPaymentProfileDoesNotExist):
+        facade.get_user_checkout_profile(logged_user)
+
+
+def test_checkout_profile_invalidated_on_profile_save(payment_profile):
+    facade.get_user_checkout_profile(payment_profile.user_id)
+    payment_profile.name = 'Changed Name'
+    payment_profile.save()
+    assert facade.get_user_checkout_profile(payment_profile.user_id)['customer']['name'] == 'Changed Name'
+
+
+def test_checkout_profile_invalidated_after_commit(payment_profile, capture_on_commit_callbacks):
+    with capture_on_commit_callbacks(execute=True):
+        payment_profile.name = 'Changed Name'
+        payment_profile.save()
+        # Simulating a concurrent request caching profile before commit
+        cache.set(payment_profile_cache_key(payment_profile.user_id), {'customer': {}, 'address': {}})
+    assert facade.get_user_checkout_profile(payment_profile.user_id)['customer']['name'] == 'Changed Name'
+
+
+def test_one_click_payload_shares_checkout_profile_cache(payment_profile, django_assert_num_queries):
+    facade.get_user_checkout_profile(payment_profile.user_id)
+    with django_assert_num_queries(0):
+        assert facade._one_click_payload(payment_profile.user_id)['card_id'] == payment_profile.card_id
+
+
+def test_checkout_page_does_not_query_profile_on_cache_hit(client_with_payment_profile, payment_item,
+                                                           payment_profile):
+    url = reverse('django_pagarme:pagarme', kwargs={'slug': payment_item.slug})
+    client_with_payment_profile.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        resp = client_with_payment_profile.get(url)
+    assert_contains(resp, payment_profile.street)
+    assert not [query for query in queries if 'userpaymentprofile' in query['sql']]
@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from django_pagarme.models import UserPaymentProfile
+
+
+@pytest.fixture
+def user(django_user_model):
+    return baker.make(django_user_model)
+
+
+def _profile(user, **kwargs):
+    data = {
+        'user_id': user.id,
+        'customer_type': 'individual',
+        'costumer_country': 'br',
+        'document_number': '29770166863',
+        'document_type': 'cpf',
+        'name': 'Foo Bar',
+        'email': 'foo@email.com',
+        'phone': '5512999999999',
+        'street': 'Rua Bahamas',
+        'complementary': '',
+        'street_number': '56',
+        'neighborhood': 'Cidade Vista Verde',
+        'city': 'São José dos Campos',
+        'state': 'SP',
+        'zipcode': '12223770',
+        'address_country': 'br',
+        'card_id': 'card_1234',
+    }
+    data.update(kwargs)
+    return UserPaymentProfile(**data)
+
+
+@pytest.fixture
+def existing_profile(user):
+    profile = _profile(user)
+    profile.save()
+    return profile
+
+
+def test_insert_when_user_has_no_profile(user):
+    assert _profile(user).upsert() is True
+    assert UserPaymentProfile.objects.get(user_id=user.id).name == 'Foo Bar'
+
+
+def test_identical_data_not_written(existing_profile, user):
+    with CaptureQueriesContext(connection) as queries:
+        assert _profile(user, phone='+5512999999999').upsert() is False
+    assert [query['sql'].split()[0] for query in queries] == ['SELECT']
+
+
+def test_only_changed_fields_updated(existing_profile, user):
+    with CaptureQueriesContext(connection) as queries:
+        assert _profile(user, name='Changed Name').upsert() is True
+    update = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+    assert len(update) == 1
+    assert '"name"' in update[0]
+    assert '"email"' not in update[0]
+    assert UserPaymentProfile.objects.get(user_id=user.id).name == 'Changed Name'
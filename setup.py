@@ -136,5 +136,8 @@ setup(
         'django-phonenumber-field[phonenumberslite]',
         'pagarme-python'
     ],
+    extras_require={
+        'async': ['httpx'],
+    },
     zip_safe=False,
 )